@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""Asyncio data-acquisition core
+
+All upstream fetches (KVV departures, Home Assistant entities) run as tasks
+on one asyncio event loop in a background thread, each with a per-source
+deadline. Finished results are handed to the display thread through a
+thread-safe queue, so a refresh takes as long as the slowest source instead
+of the sum of all sources.
+
+The KVV and Home Assistant clients are blocking urllib code; the event loop
+drives them on a bounded executor.
+"""
+
+import asyncio
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+from time import monotonic
+from typing import *
+
+# Overall per-source deadline (seconds) for one job, including connect and read. Kept above the
+# worst case of the upstream timeouts (Timeouts.worst_case), so a job is not given up while its
+# request is still running; Home Assistant jobs may need two rounds (refused bulk request, then
+# the per-entity requests).
+SOURCE_DEADLINES = {
+    'kvv': 25,
+    'home_assistant': 25,
+    'rmv': 25,
+    'ha_history': 150,
+    'tibber': 25,
+}
+DEFAULT_DEADLINE = 25
+REQUEST_ROUNDS = {'home_assistant': 2}
+
+ACQUISITION_WORKERS = 8
+
+
+class AcquisitionResult(NamedTuple):
+    key: str
+    value: Any                    # None if the job failed
+    error: Optional[BaseException]
+    elapsed: float                # Seconds
+
+
+class Job(NamedTuple):
+    source: str                   # Upstream source name, selects the deadline
+    fetch: Callable[[], Any]      # Blocking fetch function
+
+
+class AcquisitionLoop:
+    """Event loop thread that runs fetch jobs concurrently"""
+
+    def __init__(self, max_workers: int = ACQUISITION_WORKERS):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="acquire")
+        self.loop.set_default_executor(self.executor)
+        self.thread = Thread(target=self.loop.run_forever, name="acquisition", daemon=True)
+        self.thread.start()
+
+    def submit(self, jobs: Dict[str, Job], results: "queue.Queue[AcquisitionResult]" = None) -> "queue.Queue[AcquisitionResult]":
+        """Start all jobs concurrently; each result is put on the returned queue as soon as it is done"""
+        if results is None:
+            results = queue.Queue()
+        for key, job in jobs.items():
+            asyncio.run_coroutine_threadsafe(self._run_job(key, job, results), self.loop)
+        return results
+
+    def fetch(self, jobs: Dict[str, Job]) -> Dict[str, AcquisitionResult]:
+        """Run all jobs concurrently and block until every one has finished or hit its deadline"""
+        results = self.submit(jobs)
+        collected = {}
+        while len(collected) < len(jobs):
+            result = results.get()
+            collected[result.key] = result
+        return collected
+
+    async def _run_job(self, key: str, job: Job, results: "queue.Queue[AcquisitionResult]") -> None:
+        deadline = SOURCE_DEADLINES.get(job.source, DEFAULT_DEADLINE)
+        start = monotonic()
+        try:
+            value = await asyncio.wait_for(self.loop.run_in_executor(None, job.fetch), deadline)
+            results.put(AcquisitionResult(key, value, None, monotonic() - start))
+        except asyncio.TimeoutError:
+            error = TimeoutError(f"{job.source}: no result within {deadline}s")
+            results.put(AcquisitionResult(key, None, error, monotonic() - start))
+        except Exception as e:
+            results.put(AcquisitionResult(key, None, e, monotonic() - start))
+
+    def stop(self) -> None:
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.executor.shutdown(wait=False)
+
@@ -1,18 +1,39 @@
 #!/usr/bin/env python3
 
 from threading import Thread, Event
-from time import sleep
+from functools import partial
+from time import monotonic, time
+from datetime import datetime
 from gpiozero import Button
 from enum import Enum
+from typing import *
 
-from kvv_api import (
-    get_json_data, get_api_request_dep, filter_data_dep, print_to_console,
-    switch_direction, get_current_direction_info
-)
+from kvv_api import departures_to_lines, print_to_console, get_current_direction_info
+from polling import PollScheduler, tibber_interval
+from upstream import CircuitOpenError
+from snapshot import SnapshotStore
+from acquisition import AcquisitionLoop
+from sources import DataSource, SourceRegistry, board_departures, stop_sources, trip_sources
+from trips import trips_available, trips_to_lines
+from power_sampler import PowerHistory, PowerSampler, SPARKLINE_MINUTES, power_watts
+
+# Appended to the screen title while showing data that could not be refreshed
+STALE_MARKER = " *"
+
+# Minimum seconds between redraws of the energy screen for pushed Home Assistant changes
+# (current power changes every few seconds, a full e-ink refresh takes ~2 s)
+PUSH_REDRAW_INTERVAL = 30
 
 # Import Tibber functionality
 try:
-    from home_assistant_api import get_tibber_display_data_eink_optimized
+    from home_assistant_api import (
+        get_tibber_graph_data, get_tibber_stream_states, start_tibber_stream, get_current_power,
+        home_assistant_configured, HA_WEBSOCKET_ENABLED, TIBBER_ENTITIES
+    )
+    from ha_history import (
+        DailyHistory, HISTORY_CHART_DAYS, HISTORY_RETRY_INTERVAL, history_chart_data, history_ttl, refresh_history
+    )
+    from tibber_api import TIBBER_DIRECT, fetch_energy_data, tibber_source
     TIBBER_AVAILABLE = True
     print("✅ Tibber integration loaded successfully")
 except ImportError as e:
@@ -24,6 +45,8 @@ class ScreenMode(Enum):
     NORTH = "NORTH"
     SOUTH = "SOUTH"
     TIBBER = "TIBBER"
+    ENERGY_HISTORY = "ENERGY_HISTORY"
+    TRIPS = "TRIPS"
 
 
 class KVVDisplayApp:
@@ -31,11 +54,41 @@ class KVVDisplayApp:
         self.show_on_display = show_on_display
         self.display = None
         self.running = True
+        self.stopped = Event()         # Set on shutdown, ends all waits
+        self.wake = Event()            # Something the main loop is waiting for happened
         self.screen_changed = Event()  # Event to trigger immediate refresh
+        self.data_changed = Event()    # Pushed data of the current screen changed
 
         # Screen management
         self.current_screen = ScreenMode.SOUTH  # Default to South (as before)
 
+        # All upstream fetches run concurrently on the acquisition event loop; the registry
+        # starts them whenever a source's TTL (picked by the adaptive scheduler) runs out
+        self.scheduler = PollScheduler()
+        self.acquisition = AcquisitionLoop()
+        self.sources = SourceRegistry(self.acquisition, self.scheduler, wake=self.wake)
+        self.snapshot = SnapshotStore()
+
+        # Daily consumption/cost totals; only days missing from the snapshot are downloaded
+        self.energy_history = DailyHistory.from_json(self.snapshot.get_history()) if TIBBER_AVAILABLE else None
+
+        # Warm start from the last-known-good snapshot; the sources are marked stale until refreshed
+        self.register_sources()
+        self.load_snapshot()
+
+        # Power readings every few seconds for the consumption sparkline (pushed, else polled);
+        # only Home Assistant has them, also when the rest of the energy data comes from the Tibber API
+        self.ha_stream = None
+        self.power_history = PowerHistory()
+        self.power_sampler = None
+        if TIBBER_AVAILABLE and home_assistant_configured():
+            self.power_sampler = PowerSampler(self.power_history, self.read_power).start()
+
+        # Pushed Home Assistant updates keep the energy screen current without polling
+        # (started last: pushes may arrive right away and feed the power sampler)
+        if TIBBER_AVAILABLE and HA_WEBSOCKET_ENABLED and not TIBBER_DIRECT and home_assistant_configured():
+            self.ha_stream = start_tibber_stream(on_change=self.on_entities_changed)
+
         # Initialize display
         if self.show_on_display:
             # Try to use optimized display first, fall back to standard if not available
@@ -64,12 +117,16 @@ class KVVDisplayApp:
             self.south_button = Button(6, pull_up=True, bounce_time=0.2)
             # GPIO 13 = Tibber screen button
             self.tibber_button = Button(13, pull_up=True, bounce_time=0.2) if TIBBER_AVAILABLE else None
+            # GPIO 19 = Connections screen button (RMV trip planning)
+            self.trips_button = Button(19, pull_up=True, bounce_time=0.2) if trips_available() else None
 
             # Assign button functions
             self.north_button.when_pressed = self.switch_to_north
             self.south_button.when_pressed = self.switch_to_south
             if self.tibber_button:
                 self.tibber_button.when_pressed = self.switch_to_tibber
+            if self.trips_button:
+                self.trips_button.when_pressed = self.switch_to_trips
 
             print("✅ All buttons initialized:")
             print("   🔴 GPIO 5:  Switch to North direction")
@@ -78,6 +135,8 @@ class KVVDisplayApp:
                 print("   🟢 GPIO 13: Switch to Tibber overview")
             else:
                 print("   ⚠️  GPIO 13: Tibber not available (check home_assistant_api.py)")
+            if self.trips_button:
+                print("   🔵 GPIO 19: Switch to next connections")
 
         except Exception as e:
             print(f"⚠️  Warning: Could not initialize buttons: {e}")
@@ -85,20 +144,21 @@ class KVVDisplayApp:
             self.north_button = None
             self.south_button = None
             self.tibber_button = None
+            self.trips_button = None
 
     def switch_to_north(self):
         """Button handler: Switch to North direction screen"""
         print("🔴 North button pressed!")
         self.current_screen = ScreenMode.NORTH
-        switch_direction("NORTH")
         self.screen_changed.set()  # Trigger immediate refresh
+        self.wake.set()
 
     def switch_to_south(self):
         """Button handler: Switch to South direction screen"""
         print("🟡 South button pressed!")
         self.current_screen = ScreenMode.SOUTH
-        switch_direction("SOUTH")
         self.screen_changed.set()  # Trigger immediate refresh
+        self.wake.set()
 
     def switch_to_tibber(self):
         """Button handler: Switch to Tibber overview screen"""
@@ -107,145 +167,291 @@ class KVVDisplayApp:
             return
 
         print("🟢 Tibber button pressed!")
-        self.current_screen = ScreenMode.TIBBER
+        # A second press switches between the price graph and the consumption history
+        if self.current_screen == ScreenMode.TIBBER:
+            self.current_screen = ScreenMode.ENERGY_HISTORY
+        else:
+            self.current_screen = ScreenMode.TIBBER
         self.screen_changed.set()  # Trigger immediate refresh
+        self.wake.set()
+
+    def switch_to_trips(self):
+        """Button handler: Switch to next connections screen"""
+        print("🔵 Connections button pressed!")
+        self.current_screen = ScreenMode.TRIPS
+        self.screen_changed.set()  # Trigger immediate refresh
+        self.wake.set()
+
+    def on_entities_changed(self, entity_ids):
+        """Home Assistant pushed new states (called on the WebSocket thread)"""
+        power_entity = TIBBER_ENTITIES['current_power']
+        if self.power_sampler is not None and self.ha_stream is not None and power_entity in entity_ids:
+            self.power_sampler.on_state(self.ha_stream.store.get(power_entity))
+        if self.current_screen in (ScreenMode.TIBBER, ScreenMode.ENERGY_HISTORY) and not self.data_changed.is_set():
+            # The loop redraws PUSH_REDRAW_INTERVAL after the last paint; later pushes until then need no wakeup
+            self.data_changed.set()
+            self.wake.set()
+
+    def read_power(self):
+        """Current power for the sampler when nothing was pushed for a while"""
+        if self.ha_stream is not None and self.ha_stream.is_live():
+            # Pushes only come on changes: an unchanged value is still the current one
+            return power_watts(get_tibber_stream_states(self.ha_stream, ['current_power'])['current_power'])
+        return get_current_power()
 
     def start_time_update_thread(self):
         """Start the background time update thread"""
         def update_time_loop():
-            while self.running:
+            # The time is shown in minutes: sleep until the next full minute
+            while not self.stopped.wait(60 - time() % 60):
                 if self.display:
                     self.display.update_time()
-                sleep(0.1)
 
         self.time_thread = Thread(target=update_time_loop)
         self.time_thread.daemon = True
         self.time_thread.start()
 
-    def get_transit_data(self):
-        """Fetch and process transit data from KVV API for current direction"""
-        try:
-            # Get API request for current direction
-            api_url = get_api_request_dep()
-            data = get_json_data(api_url)
-            exclusion = set()  # empty in this example
-            lines = list(filter_data_dep(data, exclude_destinations=exclusion))
-
-            # Return lines without direction info (direction will be passed separately)
-            return lines
-
-        except Exception as e:
+    def register_sources(self):
+        """Declare every piece of screen data with its fetch and time-to-live"""
+        exclusion = set()  # empty in this example
+        # One source per distinct stop request; boards at the same stop (e.g. both platforms) share it
+        transit_sources, self.direction_sources = stop_sources(self.scheduler, exclusion)
+        for source in transit_sources:
+            source.on_update = partial(self.snapshot.save_transit, source.name)
+            self.sources.register(source)
+
+        if trips_available():
+            for source in trip_sources():
+                self.sources.register(source)
+
+        # Price graph and consumption history share the energy data; without a configured
+        # upstream the energy screens show placeholders instead of polling a dummy address
+        if TIBBER_AVAILABLE and (TIBBER_DIRECT or home_assistant_configured()):
+            self.sources.register(DataSource(
+                "TIBBER", tibber_source(), self.fetch_tibber_data, ttl=lambda _: tibber_interval(),
+                on_update=self.snapshot.save_tibber))
+        if TIBBER_AVAILABLE and home_assistant_configured():
+            self.sources.register(DataSource(
+                "HISTORY", 'ha_history', partial(refresh_history, self.energy_history), ttl=lambda _: history_ttl(),
+                on_update=lambda _: self.snapshot.save_history(self.energy_history.to_json()),
+                retry_interval=HISTORY_RETRY_INTERVAL))
+
+    def screen_sources(self, screen: ScreenMode) -> List[str]:
+        """Names of the data sources a screen shows"""
+        if screen == ScreenMode.TIBBER:
+            return [name for name in ("TIBBER",) if name in self.sources]
+        if screen == ScreenMode.ENERGY_HISTORY:
+            return [name for name in ("TIBBER", "HISTORY") if name in self.sources]
+        if screen == ScreenMode.TRIPS:
+            return [name for name in self.sources.sources if name.startswith("TRIPS:")]
+        return self.direction_sources[screen.value]
+
+    def is_stale(self, screen: ScreenMode) -> bool:
+        return any(self.sources[name].stale for name in self.screen_sources(screen))
+
+    def load_snapshot(self):
+        """Fill the sources from the snapshot file so the first screen needs no network"""
+        loaded = []
+        for name in self.sources.sources:
+            entry = self.snapshot.get_transit(name) if name.startswith("KVV:") else None
+            if entry:
+                self.sources.load(name, entry[1], entry[0])
+                loaded.append(name)
+
+        entry = self.snapshot.get_tibber()
+        if entry and "TIBBER" in self.sources:
+            self.sources.load("TIBBER", entry[1], entry[0])
+            loaded.append("TIBBER")
+
+        if loaded:
+            print(f"💾 Loaded snapshot for: {', '.join(loaded)}")
+
+    def get_transit_data(self, direction: str):
+        """Transit lines for a direction from the latest departures of its stop sources"""
+        names = self.direction_sources[direction]
+        departures = board_departures(self.sources, names, direction)
+        if departures is None:
+            e = next((self.sources[name].error for name in names if self.sources[name].error is not None), None)
+            if isinstance(e, CircuitOpenError):
+                return [("Err", "-", "KVV offline")]
             # Return error information
             error_msg = str(e)[:15] + "..." if len(str(e)) > 15 else str(e)
-            print(f"❌ Error getting/parsing JSON data from KVV API:\n{e}")
             return [("Err", "-", error_msg)]
 
-    def get_tibber_data(self):
-        """Get Tibber energy data for display"""
-        if not TIBBER_AVAILABLE:
-            return [("Tibber", "!", "Not Available")]
-
-        try:
-            # Try to use the new graph data format
-            from home_assistant_api import get_tibber_graph_data
+        # Recompute countdowns locally from the absolute departure times
+        walk_minutes = get_current_direction_info(direction)['walk_minutes']
+        return departures_to_lines(departures, datetime.now(), walk_minutes)
+
+    def get_trip_data(self):
+        """Best connections, re-ranked locally from the trips of all destinations"""
+        sources = [self.sources[name] for name in self.screen_sources(ScreenMode.TRIPS)]
+        lines = trips_to_lines([trip for source in sources if source.value for trip in source.value], datetime.now())
+        errors = [source.error for source in sources if source.error is not None]
+        if not lines and errors:
+            e = errors[0]
+            return [("Err", "-", str(e)[:15] + "..." if len(str(e)) > 15 else str(e))]
+        return lines
+
+    def fetch_tibber_data(self):
+        """Fetch the energy screen data (on the acquisition loop)"""
+        power = self.power_history.latest()
+        return fetch_energy_data('N/A' if power is None else power)
+
+    def update_pushed_sources(self):
+        """Build the energy data from the pushed entity states while the stream is live, without any request"""
+        if self.ha_stream is not None and self.ha_stream.is_live():
+            self.sources.put("TIBBER", get_tibber_graph_data(get_tibber_stream_states(self.ha_stream)))
 
-            # This returns the new format with graph data
-            # The display module will handle rendering it
-            return get_tibber_graph_data()
-
-        except ImportError:
-            # Fall back to the old format if new function not available
+    def get_tibber_data(self):
+        """Energy screen data of the last fetch (or push)"""
+        tibber_data = self.sources.value("TIBBER") if "TIBBER" in self.sources else None
+        return tibber_data if tibber_data is not None else get_tibber_graph_data({})
+
+    def get_energy_history_data(self):
+        """Daily consumption bars: past days from the history, today from the energy data"""
+        today_totals = self.get_tibber_data().get('today_totals', {})
+        return history_chart_data(self.energy_history, today_totals, HISTORY_CHART_DAYS)
+
+    def render_screen(self, screen: ScreenMode) -> Tuple[Any, str, str]:
+        """(lines, title, screen type) of a screen from the current source values"""
+        if screen == ScreenMode.TIBBER and TIBBER_AVAILABLE:
+            # Tibber screen mode: graph data is passed directly to the display
+            tibber_data = self.get_tibber_data()
+            lines = dict(tibber_data, stale=self.is_stale(screen),
+                         power_history=self.power_history.minute_averages(SPARKLINE_MINUTES))
+
+            print(f"\n🔋 Current screen: Tibber Energy Overview (Graph)")
+            print("===============")
             try:
-                from home_assistant_api import get_tibber_display_data_eink_optimized
-                return get_tibber_display_data_eink_optimized()
-            except Exception as e:
-                print(f"❌ Error getting Tibber data: {e}")
-                return [("Error", "!", "Tibber N/A")]
-        except Exception as e:
-            print(f"❌ Error getting Tibber data: {e}")
-            return [("Error", "!", "Tibber N/A")]
+                print(f"Current Price: {tibber_data['price_data']['current']['price']:.3f} EUR/kWh")
+                print(f"Current Power: {tibber_data['current_power']}")
+                print(f"Today's Cost: {tibber_data['today_cost']}")
+            except:
+                print("Graph data available")
+            print("===============")
+            return lines, "Tibber", "tibber_graph"
+
+        if screen == ScreenMode.ENERGY_HISTORY and TIBBER_AVAILABLE:
+            # Daily consumption of the last days as a bar chart
+            lines = self.get_energy_history_data()
+
+            print(f"\n📊 Current screen: Consumption history")
+            for day, kwh, cost in lines['days']:
+                print(f"{day}\t{kwh if kwh is not None else '-'} kWh\t{cost if cost is not None else '-'} EUR")
+            return lines, "Verbrauch", "energy_history"
+
+        if screen == ScreenMode.TRIPS:
+            # Next connections via RMV, re-ranked locally between queries
+            lines = self.get_trip_data()
+            screen_title = "Verbindungen"
+            if self.is_stale(screen):
+                screen_title += STALE_MARKER
+
+            print(f"\n🧭 Current screen: Next connections")
+            print_to_console(lines, num_entries=6)
+            return lines, screen_title, "transit"
+
+        # Transit screen modes (North or South)
+        lines = self.get_transit_data(screen.value)
+        direction_info = get_current_direction_info(screen.value)
+        screen_title = direction_info['name']
+        if self.is_stale(screen):
+            screen_title += STALE_MARKER
+
+        print(f"\n📍 Current screen: {direction_info['name']} (Platform {direction_info['platform']})")
+        print_to_console(lines)
+        return lines, screen_title, "transit"
+
+    def repaint_interval(self, screen: ScreenMode) -> float:
+        """Seconds until a screen is redrawn even if none of its sources changed"""
+        if screen in (ScreenMode.TIBBER, ScreenMode.ENERGY_HISTORY):
+            # Redrawn on every refresh of the energy data; this keeps the sparkline moving
+            return tibber_interval()
+        # Transit screens: at the next full minute (countdowns are recomputed locally)
+        return 60 - datetime.now().second
 
     def run(self):
-        """Main application loop with three-screen support"""
+        """Main application loop with three-screen support
+
+        Each round starts the fetches of all sources whose TTL ran out (in the
+        background, on the acquisition loop), applies the finished ones and
+        redraws the screen only if it changed, one of its sources was updated
+        or its countdowns moved on.
+        """
         print("🚀 Starting KVV Display App with three screens:")
         print("   🔴 GPIO 5:  North direction")
         print("   🟡 GPIO 6:  South direction")
         if TIBBER_AVAILABLE:
-            print("   🟢 GPIO 13: Tibber overview")
-        print("   All screens auto-refresh: Transit 60s, Energy 5min")
+            print("   🟢 GPIO 13: Tibber overview (press again: consumption history)")
+        if trips_available():
+            print("   🔵 GPIO 19: Next connections")
+        print("   All sources refresh in the background: Transit 60s+ (adaptive KVV polling), Energy 5min")
+
+        painted_screen = None
+        painted_at = next_paint = 0.0
 
         try:
             while self.running:
-
-                if self.current_screen == ScreenMode.TIBBER and TIBBER_AVAILABLE:
-                    # Tibber screen mode
-                    tibber_data = self.get_tibber_data()
-
-                    # Check if we got the new graph format or old format
-                    if isinstance(tibber_data, dict) and 'price_data' in tibber_data:
-                        # New graph format - pass directly to display
-                        lines = tibber_data
-                        screen_title = "Tibber"
-                        screen_type = "tibber_graph"
-
-                        print(f"\n🔋 Current screen: Tibber Energy Overview (Graph)")
-                        print("===============")
-                        try:
-                            print(f"Current Price: {tibber_data['price_data']['current']['price']:.3f} EUR/kWh")
-                            print(f"Current Power: {tibber_data['current_power']}")
-                            print(f"Today's Cost: {tibber_data['today_cost']}")
-                        except:
-                            print("Graph data available")
-                        print("===============")
-                    else:
-                        # Old text format
-                        lines = tibber_data
-                        screen_title = "Tibber"
-                        screen_type = "tibber"
-
-                        print(f"\n🔋 Current screen: Tibber Energy Overview")
-                        print("===============")
-                        for label, icon, value in lines:
-                            print(f"{label}\t{icon}\t{value}")
-                        print("===============")
-
-                else:
-                    # Transit screen modes (North or South)
-                    lines = self.get_transit_data()
-                    direction_info = get_current_direction_info()
-                    screen_title = direction_info['name']
-                    screen_type = "transit"
-
-                    print(f"\n📍 Current screen: {direction_info['name']} (Platform {direction_info['platform']})")
-                    print_to_console(lines)
-
-                # Update display with appropriate screen type
-                if self.show_on_display and self.display:
-                    self.display.set_lines_of_text(lines, screen_title, screen_type)
-
-                # Wait for appropriate interval based on screen type
-                # Transit screens: 60 seconds (data changes frequently)
-                # Energy screen: 300 seconds/5 min (prices change hourly)
-                if self.current_screen == ScreenMode.TIBBER:
-                    wait_iterations = 3000  # 300 seconds (5 minutes)
-                else:
-                    wait_iterations = 600   # 60 seconds (1 minute)
-
-                # Wait for the interval or screen change
-                for _ in range(wait_iterations):  # Check every 0.1 seconds
-                    if not self.running:
-                        break
-                    if self.screen_changed.is_set():
-                        print(f"🔄 Screen changed to: {self.current_screen.value}")
-                        self.screen_changed.clear()
-                        break
-                    sleep(0.1)
+                # Wakeups from here on are handled by this round
+                self.wake.clear()
+
+                # Button callbacks replace current_screen from other threads; read it once per round
+                screen = self.current_screen
+                visible = self.screen_sources(screen)
+
+                # First paint comes straight from the snapshot (if any), the fetches run meanwhile
+                self.update_pushed_sources()
+                self.sources.refresh()
+                updated = self.sources.collect()
+
+                pushed = self.data_changed.is_set() and monotonic() - painted_at >= PUSH_REDRAW_INTERVAL
+                if pushed:
+                    print("📡 Pushed update, redrawing")
+                waiting = self.sources.is_waiting(visible)
+                if not waiting and (
+                        screen != painted_screen or monotonic() >= next_paint or pushed
+                        or updated.intersection(visible)):
+                    lines, screen_title, screen_type = self.render_screen(screen)
+
+                    # Update display with appropriate screen type
+                    if self.show_on_display and self.display:
+                        self.display.set_lines_of_text(lines, screen_title, screen_type)
+                    painted_screen = screen
+                    painted_at = monotonic()
+                    next_paint = painted_at + self.repaint_interval(screen)
+                    self.data_changed.clear()
+
+                # Sleep until the next repaint or due source; button presses, finished
+                # fetches, pushed changes and shutdown wake the loop right away
+                deadlines = [self.sources.seconds_until_due()]
+                if not waiting:
+                    deadlines.append(next_paint - monotonic())
+                if self.data_changed.is_set() and not waiting:
+                    deadlines.append(painted_at + PUSH_REDRAW_INTERVAL - monotonic())
+                timeout = min(deadlines)
+                self.wake.wait(max(0.0, timeout) if timeout < float('inf') else None)
+
+                if self.screen_changed.is_set():
+                    print(f"🔄 Screen changed to: {self.current_screen.value}")
+                    self.screen_changed.clear()
 
         except KeyboardInterrupt:
             print("\n⏹️  Keyboard interrupt received")
         finally:
             print("🔌 Cleaning up and exiting...")
-            self.running = False
+            self.stop()
+            self.sources.print_status()
+            self.acquisition.stop()
+            if self.ha_stream is not None:
+                self.ha_stream.stop()
+            if self.power_sampler is not None:
+                self.power_sampler.stop()
+
+    def stop(self):
+        """End the main loop and the time update thread"""
+        self.running = False
+        self.stopped.set()
+        self.wake.set()
 
     def __del__(self):
         """Cleanup when object is destroyed"""
@@ -254,8 +460,8 @@ class KVVDisplayApp:
 
 def main(show_on_display: bool = True):
     """Main entry point"""
-    # Uncomment the next line if you need to wait for network connection
-    # sleep(30)  # wait for the internet connection to be established
+    # No need to wait for the network connection: the first screen is rendered
+    # from the last snapshot and refreshed as soon as the upstream APIs respond
     
     app = KVVDisplayApp(show_on_display=show_on_display)
     app.run()
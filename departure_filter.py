@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+"""Departure filter compiled once from the station configuration
+
+A stop's filter rules (platform, transport modes, line allow/deny lists,
+destination pattern, walk time) are turned into a short list of checks on
+the raw EFA departureList elements. Only the configured rules become checks,
+and they run cheapest and most selective first, so most elements are
+rejected before any time conversion or Departure record is built.
+"""
+
+import json
+import re
+from typing import *
+
+
+class DepartureFilter:
+    """Accept/reject raw EFA departure elements according to a stop's rules
+
+    Rules (all optional):
+      platform:           only this platform (None = all platforms)
+      means:              EFA transport modes (motType) to keep, e.g. [1, 4]
+      show_lines:         line numbers to keep, e.g. ["S1", "S11"]
+      hide_lines:         line numbers to drop
+      hide_destinations:  exact destination names to drop
+      destination_filter: regex, destinations matching it are dropped
+      walk_minutes:       drop departures leaving sooner than this
+    """
+
+    __slots__ = ('checks',)
+
+    def __init__(self, platform: str = None, means: Iterable[int] = None,
+                 show_lines: Iterable[str] = None, hide_lines: Iterable[str] = None,
+                 hide_destinations: Iterable[str] = (), destination_filter: str = None,
+                 walk_minutes: int = 0):
+        checks = []
+
+        # Plain string compares on top-level fields first
+        if platform is not None:
+            checks.append(lambda element: element['platform'] == platform)
+
+        # Set lookups on servingLine fields
+        if means is not None:
+            mot_types = frozenset(str(mean) for mean in means)
+            checks.append(lambda element: element['servingLine']['motType'] in mot_types)
+        if show_lines is not None:
+            shown = frozenset(show_lines)
+            checks.append(lambda element: element['servingLine']['number'] in shown)
+        if hide_lines:
+            hidden = frozenset(hide_lines)
+            checks.append(lambda element: element['servingLine']['number'] not in hidden)
+        if hide_destinations:
+            hidden_destinations = frozenset(hide_destinations)
+            checks.append(lambda element: element['servingLine']['direction'] not in hidden_destinations)
+
+        # Regex and int conversion last
+        if destination_filter:
+            search = re.compile(destination_filter).search
+            checks.append(lambda element: search(element['servingLine']['direction']) is None)
+        if walk_minutes > 0:
+            checks.append(lambda element: int(element['countdown']) >= walk_minutes)
+
+        self.checks = tuple(checks)
+
+    @classmethod
+    def from_stop(cls, stop: dict, exclude_destinations: Iterable[str] = ()) -> "DepartureFilter":
+        """Compile the filter of a STATION_CONFIG entry (or one of its "sources")"""
+        return cls(platform=stop.get("platform"),
+                   means=stop.get("means"),
+                   show_lines=stop.get("show_lines"),
+                   hide_lines=stop.get("hide_lines"),
+                   hide_destinations=set(stop.get("hide_destinations", ())) | set(exclude_destinations),
+                   destination_filter=stop.get("destination_filter"),
+                   walk_minutes=stop.get("walk_minutes", 0))
+
+    def accepts(self, element: dict) -> bool:
+        for check in self.checks:
+            if not check(element):
+                return False
+        return True
+
+    def select(self, elements: Iterable[dict]) -> Iterator[dict]:
+        """Yield the accepted elements"""
+        checks = self.checks
+        for element in elements:
+            for check in checks:
+                if not check(element):
+                    break
+            else:
+                yield element
+
+
+_compiled_filters: Dict[Tuple[str, FrozenSet[str]], DepartureFilter] = {}
+
+
+def get_departure_filter(stop: dict, exclude_destinations: Iterable[str] = ()) -> DepartureFilter:
+    """Compiled filter of a stop, compiled only once per distinct configuration"""
+    key = (json.dumps(stop, sort_keys=True, default=str), frozenset(exclude_destinations))
+    departure_filter = _compiled_filters.get(key)
+    if departure_filter is None:
+        departure_filter = _compiled_filters[key] = DepartureFilter.from_stop(stop, exclude_destinations)
+    return departure_filter
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 
 import time
+from datetime import date
 from threading import RLock
 from typing import *
 
@@ -65,6 +66,9 @@ class Display2in7Optimized:
             if screen_type == "tibber_graph" and isinstance(data, dict):
                 # New graph format with price data
                 self._draw_tibber_with_graph(data)
+            elif screen_type == "energy_history" and isinstance(data, dict):
+                # Daily consumption bar chart
+                self._draw_energy_history(data)
             elif screen_type == "tibber":
                 # Old text format or fallback
                 self._draw_tibber_screen_optimized(data, screen_title)
@@ -264,7 +268,8 @@ class Display2in7Optimized:
 
         # === Header Line: Title + Time ===
         Y_HEADER = 0
-        self.draw.text((0, Y_HEADER), "ENERGIE", font=self.font, fill=Display2in7Optimized.PIXEL_SET)
+        title = "ENERGIE *" if data.get('stale') else "ENERGIE"  # '*' = data could not be refreshed
+        self.draw.text((0, Y_HEADER), title, font=self.font, fill=Display2in7Optimized.PIXEL_SET)
         self.draw.text((195, Y_HEADER + 1), time.strftime('%H:%M'),
                       font=self.font_large, fill=Display2in7Optimized.PIXEL_SET)
 
@@ -301,24 +306,88 @@ class Display2in7Optimized:
         # Separator before graph
         self.draw.line(((0, 62), (self.WIDTH, 62)), fill=Display2in7Optimized.PIXEL_SET, width=1)
 
+        # Cheapest start times for appliances, e.g. "Günstig: 2h 13:00  3h 12:30"
+        graph_top = 68
+        windows = price_data.get('windows') or []
+        if windows:
+            starts = "  ".join(f"{hours:g}h {time.strftime('%H:%M', time.localtime(start))}"
+                               for hours, start, _ in windows)
+            self.draw.text((0, 63), f"Günstig: {starts}", font=self.font_tiny, fill=Display2in7Optimized.PIXEL_SET)
+            graph_top = 80
+
+        # Consumption of the last hours (1-minute averages) next to it
+        power_history = data.get('power_history') or []
+        if any(value is not None for value in power_history):
+            self._draw_sparkline(power_history, x=190, y=65, width=72, height=12)
+            graph_top = 80
+
         # === Price Graph Section ===
         self._draw_price_graph(
             price_data=price_data,
             x=5,  # Left margin
-            y=68,  # Start below the data section
+            y=graph_top,  # Start below the data section
             width=254,  # Use most of display width
-            height=103  # Use remaining height
+            height=171 - graph_top  # Use remaining height
         )
 
+    def _draw_energy_history(self, data: dict):
+        """Draw the daily consumption of the last days as a bar chart, today (still counting) hollow"""
+        WEEKDAYS = ["Mo", "Di", "Mi", "Do", "Fr", "Sa", "So"]
+        days = data.get('days', [])
+
+        # === Header Line: Title + Time ===
+        self.draw.text((0, 0), "VERBRAUCH", font=self.font, fill=Display2in7Optimized.PIXEL_SET)
+        self.draw.text((195, 1), time.strftime('%H:%M'), font=self.font_large, fill=Display2in7Optimized.PIXEL_SET)
+        self.draw.line(((0, 22), (self.WIDTH, 22)), fill=Display2in7Optimized.PIXEL_SET, width=1)
+
+        summary = f"{len(days)} Tage: {data.get('total_kwh', 0):.1f} kWh, {data.get('total_cost', 0):.2f} €"
+        self.draw.text((0, 26), summary, font=self.font_small, fill=Display2in7Optimized.PIXEL_SET)
+
+        values = [kwh for _, kwh, _ in days if kwh is not None]
+        if not values:
+            self.draw.text((80, 95), "Keine Daten", font=self.font, fill=Display2in7Optimized.PIXEL_SET)
+            return
+
+        # Bars from y=62 (tallest, value label above) down to the base line at y=154
+        chart_x, chart_width = 5, 254
+        top, base = 62, 154
+        slot = chart_width / len(days)
+        gap = 2 if slot > 6 else 1
+        highest = max(values) or 1.0
+
+        for i, (day, kwh, _) in enumerate(days):
+            left = chart_x + int(i * slot)
+            right = chart_x + int((i + 1) * slot) - gap
+            weekday = date.fromisoformat(day).weekday()
+
+            if kwh is not None:
+                bar_top = base - int(kwh / highest * (base - top))
+                is_today = i == len(days) - 1
+                self.draw.rectangle(((left, bar_top), (right, base)), outline=Display2in7Optimized.PIXEL_SET,
+                                    fill=Display2in7Optimized.PIXEL_CLEAR if is_today else Display2in7Optimized.PIXEL_SET)
+                if len(days) <= 10:
+                    self.draw.text((left, bar_top - 15), f"{kwh:.1f}", font=self.font_tiny,
+                                   fill=Display2in7Optimized.PIXEL_SET)
+
+            # Weekday labels for a week, Mondays only for longer ranges
+            if len(days) <= 10:
+                label = WEEKDAYS[weekday]
+            elif weekday == 0:
+                label = date.fromisoformat(day).strftime('%d.')
+            else:
+                continue
+            self.draw.text((left, base + 3), label, font=self.font_tiny, fill=Display2in7Optimized.PIXEL_SET)
+
+        self.draw.line(((chart_x, base), (chart_x + chart_width, base)), fill=Display2in7Optimized.PIXEL_SET, width=1)
+
     def _draw_price_graph(self, price_data: dict, x: int, y: int, width: int, height: int):
         """Draw a price graph on the e-ink display"""
 
-        today_prices = price_data.get('today', [])
-        tomorrow_prices = price_data.get('tomorrow', [])
-        current_hour = price_data.get('current', {}).get('hour', 0)
-        stats = price_data.get('stats', {})
+        today = price_data.get('today')
+        tomorrow = price_data.get('tomorrow')
+        current_time = price_data.get('current', {}).get('time') or time.time()
 
-        if not today_prices:
+        if not today:
             # No data to display
             self.draw.text((x + width//2 - 40, y + height//2), "Keine Daten",
                           font=self.font, fill=Display2in7Optimized.PIXEL_SET)
@@ -331,16 +400,15 @@ class Display2in7Optimized:
         graph_height = height - 25  # Leave space for X-axis labels
 
         # Combine today and tomorrow data if tomorrow is available
-        all_prices = today_prices.copy()
-        if tomorrow_prices:
-            # Add tomorrow's prices with adjusted hours (24-47)
-            for tp in tomorrow_prices:
-                all_prices.append({'hour': tp['hour'] + 24, 'price': tp['price']})
+        try:
+            series = today.concat(tomorrow) if tomorrow else today
+        except ValueError:
+            series = today
+        has_tomorrow = len(series) > len(today)
 
         # Calculate price range for scaling
-        all_values = [p['price'] for p in all_prices]
-        min_price = min(all_values)
-        max_price = max(all_values)
+        min_price = series.min
+        max_price = series.max
         price_range = max_price - min_price
 
         # Add some padding to the range
@@ -376,84 +444,83 @@ class Display2in7Optimized:
                        (graph_x + graph_width, graph_y + graph_height)),
                       fill=Display2in7Optimized.PIXEL_SET, width=1)
 
-        # Calculate points for the price line
-        points = []
-        max_hour = max(p['hour'] for p in all_prices)
+        # X position of an interval index, Y position of a price (inverted because y increases downward)
+        last_index = max(1, len(series) - 1)
 
-        for price_point in sorted(all_prices, key=lambda x: x['hour']):
-            hour = price_point['hour']
-            price = price_point['price']
+        def x_at(index: float) -> int:
+            return graph_x + int(index / last_index * graph_width)
 
-            # Calculate x position
-            x_pos = graph_x + int((hour / max_hour) * graph_width) if max_hour > 0 else graph_x
+        def y_at(price: float) -> int:
+            return graph_y + graph_height - int((price - min_price) / price_range * graph_height)
 
-            # Calculate y position (inverted because y increases downward)
-            y_normalized = (price - min_price) / price_range if price_range > 0 else 0.5
-            y_pos = graph_y + graph_height - int(y_normalized * graph_height)
-
-            points.append((x_pos, y_pos))
+        points = [(x_at(i), y_at(price)) for i, price in enumerate(series.prices)]
 
         # Draw the price line
-        if len(points) > 1:
-            for i in range(len(points) - 1):
-                # Use different line style for tomorrow's prices
-                if i >= 23 and tomorrow_prices:
-                    # Dashed line for tomorrow (simple approximation)
-                    if i % 2 == 0:
-                        self.draw.line((points[i], points[i+1]),
-                                     fill=Display2in7Optimized.PIXEL_SET, width=2)
-                else:
-                    # Solid line for today
+        per_hour = max(1, 3600 // series.resolution)
+        for i in range(len(points) - 1):
+            # Use different line style for tomorrow's prices
+            if i >= len(today) - 1 and has_tomorrow:
+                # Dashed line for tomorrow (every other hour)
+                if (i // per_hour) % 2 == 0:
                     self.draw.line((points[i], points[i+1]),
                                  fill=Display2in7Optimized.PIXEL_SET, width=2)
+            else:
+                # Solid line for today
+                self.draw.line((points[i], points[i+1]),
+                             fill=Display2in7Optimized.PIXEL_SET, width=2)
 
-        # Highlight current hour with vertical line
-        if current_hour < 24:  # Only if we're still in today
-            current_x = graph_x + int((current_hour / max_hour) * graph_width) if max_hour > 0 else graph_x
+        # Highlight current interval with vertical line (only if we're still in today)
+        current_index = today.index_at(current_time)
+        if current_index >= 0:
+            current_x = x_at(current_index)
 
-            # Draw vertical line at current hour
+            # Draw vertical line at current interval
             self.draw.line(((current_x, graph_y - 2), (current_x, graph_y + graph_height + 2)),
                           fill=Display2in7Optimized.PIXEL_SET, width=2)
 
-            # Add "JETZT" label below
-            #self.draw.text((current_x - 15, graph_y + graph_height + 5), "JETZT",
-            #              font=self.font_tiny, fill=Display2in7Optimized.PIXEL_SET)
-
         # Draw X-axis labels (every 6 hours)
-        x_labels = [0, 6, 12, 18]
-        if tomorrow_prices:
-            x_labels.extend([24, 30, 36, 42])
-
-        for hour_label in x_labels:
-            if hour_label <= max_hour:
-                label_x = graph_x + int((hour_label / max_hour) * graph_width) if max_hour > 0 else graph_x
-                label_text = str(hour_label % 24)  # Show 0-23 format
+        for i in range(len(series)):
+            start = time.localtime(series.time_at(i))
+            if start.tm_min != 0 or start.tm_hour % 6 != 0:
+                continue
+            label_text = str(start.tm_hour)
 
-                # Add day indicator for tomorrow
-                if hour_label >= 24:
-                    label_text = f"{label_text}+"
+            # Add day indicator for tomorrow
+            if i >= len(today):
+                label_text = f"{label_text}+"
 
-                self.draw.text((label_x - 5, graph_y + graph_height + 5), label_text,
-                             font=self.font_tiny, fill=Display2in7Optimized.PIXEL_SET)
+            self.draw.text((x_at(i) - 5, graph_y + graph_height + 5), label_text,
+                         font=self.font_tiny, fill=Display2in7Optimized.PIXEL_SET)
 
         # Add min/max indicators with horizontal dotted lines
-        if len(all_values) > 0:
-            min_idx = all_values.index(min(all_values))
-            max_idx = all_values.index(max(all_values))
-
-            # Draw dotted lines at min and max levels
-            min_y = graph_y + graph_height - int(((min(all_values) - min_price) / price_range) * graph_height)
-            max_y = graph_y + graph_height - int(((max(all_values) - min_price) / price_range) * graph_height)
-
-            # Dotted line for min (draw short segments)
-            for dx in range(graph_x, graph_x + graph_width, 6):
-                self.draw.line(((dx, min_y), (dx + 3, min_y)),
-                             fill=Display2in7Optimized.PIXEL_SET, width=1)
-
-            # Dotted line for max
-            for dx in range(graph_x, graph_x + graph_width, 6):
-                self.draw.line(((dx, max_y), (dx + 3, max_y)),
-                             fill=Display2in7Optimized.PIXEL_SET, width=1)
+        min_y = y_at(series.min)
+        max_y = y_at(series.max)
+
+        # Dotted line for min (draw short segments)
+        for dx in range(graph_x, graph_x + graph_width, 6):
+            self.draw.line(((dx, min_y), (dx + 3, min_y)),
+                         fill=Display2in7Optimized.PIXEL_SET, width=1)
+
+        # Dotted line for max
+        for dx in range(graph_x, graph_x + graph_width, 6):
+            self.draw.line(((dx, max_y), (dx + 3, max_y)),
+                         fill=Display2in7Optimized.PIXEL_SET, width=1)
+
+    def _draw_sparkline(self, values: List[Optional[float]], x: int, y: int, width: int, height: int):
+        """Draw a small line chart of values, leaving gaps where a value is None"""
+        present = [value for value in values if value is not None]
+        low, high = min(present), max(present)
+        value_range = (high - low) or 1.0
+        last_index = max(1, len(values) - 1)
+
+        previous = None
+        for i, value in enumerate(values):
+            if value is None:
+                previous = None
+                continue
+            point = (x + int(i / last_index * width), y + height - int((value - low) / value_range * height))
+            self.draw.line((previous or point, point), fill=Display2in7Optimized.PIXEL_SET, width=1)
+            previous = point
 
     def _convert_trend_icon(self, icon: str) -> str:
         """Convert trend icons to text for e-ink display"""
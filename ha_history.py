@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+
+"""Daily consumption and cost history from Home Assistant
+
+The Tibber Pulse sensors for today's consumption and cost count up during
+the day and reset at midnight, so the largest value of a day is that day's
+total. The missing days are fetched from /api/history/period with a single
+request for all entities and folded into per-day values while the response
+streams in; the raw states are never held in memory. Days that are complete
+are never fetched again (the aggregates are kept in the snapshot).
+"""
+
+import codecs
+import json
+import urllib.parse
+import urllib.request
+from datetime import date, datetime, time, timedelta
+from typing import *
+
+from home_assistant_api import HomeAssistantAPI, TIBBER_ENTITIES, get_api
+from upstream import open_url
+
+HISTORY_KEYS = ['today_consumption', 'today_cost']  # Cumulative per-day TIBBER_ENTITIES
+HISTORY_DAYS = 30        # Days kept (Home Assistant itself keeps 10 by default)
+HISTORY_CHART_DAYS = 7   # Bars on the consumption screen (7 or 30)
+HISTORY_RETRY_INTERVAL = 300  # Seconds until a failed import is retried
+HISTORY_DAY_OFFSET = 60  # Seconds after midnight before the finished day is fetched
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def iter_history_states(stream: BinaryIO, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[Tuple[str, dict]]:
+    """Incrementally yield (entity_id, state) from a /api/history/period response stream
+
+    The response holds one list of states per entity; with minimal_response
+    only the first state of each list carries the entity_id. Each state is
+    decoded on its own as soon as it is complete.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    pos = 0
+    depth = 0
+    entity_id = None
+    eof = False
+
+    while True:
+        # Skip the list structure between states
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n,[]':
+            if buffer[pos] == '[':
+                depth += 1
+                entity_id = None
+            elif buffer[pos] == ']':
+                depth -= 1
+            pos += 1
+
+        if pos < len(buffer):
+            if depth != 2:
+                raise ValueError(f"unexpected history response near {buffer[pos:pos + 20]!r}")
+            try:
+                state, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                entity_id = state.get('entity_id', entity_id)
+                yield entity_id, state
+                pos = end
+                continue
+        elif eof:
+            return
+
+        chunk = stream.read(chunk_size)
+        buffer = buffer[pos:] + text_decoder.decode(chunk, final=not chunk)
+        pos = 0
+        eof = not chunk
+
+
+class DailyHistory:
+    """Per-day totals of the HISTORY_KEYS sensors"""
+
+    def __init__(self, keep_days: int = HISTORY_DAYS):
+        self.keep_days = keep_days
+        self.days: Dict[str, Dict[str, float]] = {}   # ISO date -> key -> total
+        self.complete_until: Optional[str] = None      # Last day whose totals are final (ISO date)
+
+    def add(self, key: str, day: str, value: float) -> None:
+        totals = self.days.setdefault(day, {})
+        if value > totals.get(key, float('-inf')):
+            totals[key] = value
+
+    def missing_range(self, today: date) -> Optional[Tuple[date, date]]:
+        """[first, today) days that still have to be fetched, None if all complete days are known"""
+        first = today - timedelta(days=self.keep_days)
+        if self.complete_until is not None:
+            first = max(first, date.fromisoformat(self.complete_until) + timedelta(days=1))
+        return (first, today) if first < today else None
+
+    def mark_complete(self, until: date, today: date) -> None:
+        """All days up to until are final; forget days older than keep_days"""
+        self.complete_until = until.isoformat()
+        oldest = (today - timedelta(days=self.keep_days)).isoformat()
+        for day in [day for day in self.days if day < oldest]:
+            del self.days[day]
+
+    def totals(self, key: str, count: int, today: date) -> List[Tuple[str, Optional[float]]]:
+        """(ISO date, total) of the count days before today, None where nothing is known"""
+        days = [(today - timedelta(days=offset)).isoformat() for offset in range(count, 0, -1)]
+        return [(day, self.days.get(day, {}).get(key)) for day in days]
+
+    def to_json(self) -> dict:
+        return {'days': self.days, 'complete_until': self.complete_until}
+
+    @classmethod
+    def from_json(cls, data: Optional[dict], keep_days: int = HISTORY_DAYS) -> 'DailyHistory':
+        history = cls(keep_days)
+        if data:
+            history.days = data.get('days', {})
+            history.complete_until = data.get('complete_until')
+        return history
+
+
+def _local_midnight(day: date) -> datetime:
+    return datetime.combine(day, time()).astimezone()
+
+
+def history_request(api: HomeAssistantAPI, start: datetime, end: datetime, entity_ids: List[str]) -> urllib.request.Request:
+    """History request for all entities at once, states only"""
+    query = urllib.parse.urlencode({'filter_entity_id': ','.join(entity_ids), 'end_time': end.isoformat()})
+    url = (f"{api.url}/api/history/period/{urllib.parse.quote(start.isoformat())}"
+           f"?{query}&minimal_response&no_attributes&skip_initial_state")
+    return urllib.request.Request(url, headers=api.headers)
+
+
+def refresh_history(history: DailyHistory, api: HomeAssistantAPI = None, now: datetime = None) -> bool:
+    """Fetch the days missing from history; returns False if there was nothing to fetch"""
+    today = (now or datetime.now()).date()
+    missing = history.missing_range(today)
+    if missing is None:
+        return False
+
+    api = api or get_api()
+    keys = {TIBBER_ENTITIES[key]: key for key in HISTORY_KEYS}
+    start, end = _local_midnight(missing[0]), _local_midnight(missing[1])
+    states = 0
+    last_day = None  # Last day Home Assistant returned a value for
+    with open_url(history_request(api, start, end, list(keys)), 'ha_history', context=api.ssl_context) as response:
+        for entity_id, state in iter_history_states(response):
+            states += 1
+            if entity_id not in keys:
+                continue
+            try:
+                value = float(state['state'])
+            except (KeyError, ValueError):
+                continue  # unavailable/unknown
+            day = datetime.fromisoformat(state['last_changed']).astimezone().date().isoformat()
+            history.add(keys[entity_id], day, value)
+            last_day = max(last_day or day, day)
+
+    # Days without any state after the last day with data may still arrive (e.g. recorder lagging or
+    # Home Assistant down): only days up to the last day with data are final. Days before it without
+    # data were never recorded (e.g. beyond the recorder's retention) and cannot be fetched later either.
+    if last_day is not None:
+        history.mark_complete(date.fromisoformat(last_day), today)
+    print(f"📚 Home Assistant history {missing[0]}..{missing[1] - timedelta(days=1)}: {states} states, "
+          f"complete until {history.complete_until}")
+    return True
+
+
+def history_ttl(now: datetime = None) -> float:
+    """Seconds until the current day is complete and can be imported"""
+    now = now or datetime.now()
+    return (_local_midnight(now.date() + timedelta(days=1)) - now.astimezone()).total_seconds() + HISTORY_DAY_OFFSET
+
+
+def history_chart_data(history: DailyHistory, today_totals: Dict[str, Any], days: int = HISTORY_CHART_DAYS,
+                       now: datetime = None) -> Dict[str, Any]:
+    """Display data of the consumption chart: past days from the history, today from the live sensors
+
+    today_totals maps HISTORY_KEYS to today's raw sensor values (see build_tibber_graph_data).
+    """
+    today = (now or datetime.now()).date()
+    consumption = history.totals('today_consumption', days - 1, today)
+    cost = dict(history.totals('today_cost', days - 1, today))
+
+    def live(key: str) -> Optional[float]:
+        try:
+            return float(today_totals.get(key))
+        except (TypeError, ValueError):
+            return None
+
+    bars = [[day, kwh, cost[day]] for day, kwh in consumption]
+    bars.append([today.isoformat(), live('today_consumption'), live('today_cost')])
+    return {
+        'days': bars,
+        'total_kwh': sum(kwh for _, kwh, _ in bars if kwh is not None),
+        'total_cost': sum(eur for _, _, eur in bars if eur is not None),
+    }
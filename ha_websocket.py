@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+
+"""Push updates from Home Assistant over its WebSocket API
+
+A background thread keeps a subscribe_entities subscription open and mirrors
+the pushed states into an EntityStore, so the Tibber screen renders without
+any request latency and can be redrawn when a value changes instead of on a
+timer. The WebSocket client is a minimal RFC 6455 implementation on top of
+the standard library (text frames, fragmentation, ping/pong, close).
+"""
+
+import base64
+import hashlib
+import json
+import os
+import socket
+import ssl
+import struct
+import urllib.parse
+from datetime import datetime, timezone
+from threading import Event, Lock, Thread
+from typing import *
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+OPCODE_CONTINUATION = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+PING_INTERVAL = 30      # Seconds without a message before a heartbeat ping is sent
+CONNECT_TIMEOUT = 10
+RECONNECT_MIN = 5       # Seconds before the first reconnect, doubled on every failure
+RECONNECT_MAX = 300
+
+
+def websocket_accept(key: str) -> str:
+    """Sec-WebSocket-Accept value for a Sec-WebSocket-Key"""
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+
+
+def encode_frame(opcode: int, payload: bytes, mask: bool = True) -> bytes:
+    """One unfragmented frame; clients must mask, servers must not"""
+    header = bytes([0x80 | opcode])
+    mask_bit = 0x80 if mask else 0
+    length = len(payload)
+    if length < 126:
+        header += bytes([mask_bit | length])
+    elif length < 1 << 16:
+        header += bytes([mask_bit | 126]) + struct.pack('!H', length)
+    else:
+        header += bytes([mask_bit | 127]) + struct.pack('!Q', length)
+
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + _apply_mask(payload, key)
+
+
+def _apply_mask(payload: bytes, key: bytes) -> bytes:
+    if not payload:
+        return payload
+    repeated = (key * (len(payload) // 4 + 1))[:len(payload)]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(repeated, 'big')).to_bytes(len(payload), 'big')
+
+
+def parse_frame(buffer: bytes) -> Optional[Tuple[bool, int, bytes, int]]:
+    """(fin, opcode, payload, consumed bytes) of the first frame in buffer, None if incomplete"""
+    if len(buffer) < 2:
+        return None
+    fin = bool(buffer[0] & 0x80)
+    opcode = buffer[0] & 0x0F
+    masked = bool(buffer[1] & 0x80)
+    length = buffer[1] & 0x7F
+    pos = 2
+    if length == 126:
+        if len(buffer) < 4:
+            return None
+        length = struct.unpack('!H', buffer[2:4])[0]
+        pos = 4
+    elif length == 127:
+        if len(buffer) < 10:
+            return None
+        length = struct.unpack('!Q', buffer[2:10])[0]
+        pos = 10
+
+    key = b''
+    if masked:
+        if len(buffer) < pos + 4:
+            return None
+        key = buffer[pos:pos + 4]
+        pos += 4
+    if len(buffer) < pos + length:
+        return None
+
+    payload = buffer[pos:pos + length]
+    if masked:
+        payload = _apply_mask(payload, key)
+    return fin, opcode, payload, pos + length
+
+
+class WebSocket:
+    """Blocking WebSocket client connection (text messages only)"""
+
+    def __init__(self, url: str, timeout: float = CONNECT_TIMEOUT, ssl_context: ssl.SSLContext = None):
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme in ('wss', 'https')
+        port = parts.port or (443 if secure else 80)
+
+        sock = socket.create_connection((parts.hostname, port), timeout=timeout)
+        if secure:
+            sock = (ssl_context or ssl.create_default_context()).wrap_socket(sock, server_hostname=parts.hostname)
+        self.sock = sock
+        self.buffer = b''
+        self.closed = False
+        self._handshake(parts.netloc, parts.path or '/')
+
+    def _handshake(self, host: str, path: str) -> None:
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.sock.sendall((f"GET {path} HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\n"
+                           f"Connection: Upgrade\r\nSec-WebSocket-Key: {key}\r\n"
+                           f"Sec-WebSocket-Version: 13\r\n\r\n").encode())
+
+        while b'\r\n\r\n' not in self.buffer:
+            self._receive()
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        lines = head.decode('latin-1').split('\r\n')
+        if ' 101 ' not in lines[0] + ' ':
+            raise ConnectionError(f"WebSocket upgrade refused: {lines[0]}")
+        headers = {name.strip().lower(): value.strip()
+                   for name, _, value in (line.partition(':') for line in lines[1:])}
+        if headers.get('sec-websocket-accept') != websocket_accept(key):
+            raise ConnectionError("WebSocket upgrade: bad Sec-WebSocket-Accept")
+
+    def _receive(self) -> None:
+        data = self.sock.recv(65536)
+        if not data:
+            raise ConnectionError("WebSocket connection closed by peer")
+        self.buffer += data
+
+    def settimeout(self, timeout: Optional[float]) -> None:
+        self.sock.settimeout(timeout)
+
+    def send_text(self, text: str) -> None:
+        self.sock.sendall(encode_frame(OPCODE_TEXT, text.encode('utf-8')))
+
+    def send_json(self, message: dict) -> None:
+        self.send_text(json.dumps(message))
+
+    def receive_text(self) -> str:
+        """Next complete text message; answers pings on the way
+
+        Raises socket.timeout if nothing arrives within the socket timeout;
+        partially received data is kept for the next call.
+        """
+        fragments = []
+        while True:
+            frame = parse_frame(self.buffer)
+            if frame is None:
+                self._receive()
+                continue
+            fin, opcode, payload, consumed = frame
+            self.buffer = self.buffer[consumed:]
+
+            if opcode == OPCODE_PING:
+                self.sock.sendall(encode_frame(OPCODE_PONG, payload))
+            elif opcode == OPCODE_CLOSE:
+                self.close()
+                raise ConnectionError("WebSocket closed by server")
+            elif opcode in (OPCODE_TEXT, OPCODE_BINARY, OPCODE_CONTINUATION):
+                fragments.append(payload)
+                if fin:
+                    return b''.join(fragments).decode('utf-8')
+
+    def receive_json(self) -> dict:
+        return json.loads(self.receive_text())
+
+    def close(self) -> None:
+        if not self.closed:
+            self.closed = True
+            try:
+                self.sock.sendall(encode_frame(OPCODE_CLOSE, struct.pack('!H', 1000)))
+            except OSError:
+                pass
+            self.sock.close()
+
+
+def _iso_timestamp(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class EntityStore:
+    """Thread-safe mirror of Home Assistant entity states in REST API format"""
+
+    def __init__(self):
+        self.lock = Lock()
+        self.states: Dict[str, dict] = {}
+
+    def get(self, entity_id: str) -> Optional[dict]:
+        with self.lock:
+            return self.states.get(entity_id)
+
+    def get_states(self, entity_ids: Iterable[str]) -> Dict[str, dict]:
+        with self.lock:
+            return {entity_id: self.states[entity_id] for entity_id in entity_ids if entity_id in self.states}
+
+    def has_all(self, entity_ids: Iterable[str]) -> bool:
+        with self.lock:
+            return all(entity_id in self.states for entity_id in entity_ids)
+
+    def apply_event(self, event: dict) -> Set[str]:
+        """Apply a compressed subscribe_entities event ("a" added, "c" changed, "r" removed)
+
+        Returns the ids of the entities that changed. States are replaced, not
+        mutated, so dicts handed out earlier stay consistent.
+        """
+        changed = set()
+        with self.lock:
+            for entity_id, compressed in event.get('a', {}).items():
+                last_changed = compressed.get('lc', 0)
+                self.states[entity_id] = {
+                    'entity_id': entity_id,
+                    'state': compressed.get('s'),
+                    'attributes': compressed.get('a', {}),
+                    'last_changed': _iso_timestamp(last_changed),
+                    'last_updated': _iso_timestamp(compressed.get('lu', last_changed)),
+                }
+                changed.add(entity_id)
+
+            for entity_id, diff in event.get('c', {}).items():
+                old = self.states.get(entity_id)
+                if old is None:
+                    continue
+                state = dict(old)
+                additions = diff.get('+', {})
+                if 's' in additions:
+                    state['state'] = additions['s']
+                if 'a' in additions or 'a' in diff.get('-', {}):
+                    attributes = dict(old['attributes'])
+                    attributes.update(additions.get('a', {}))
+                    for name in diff.get('-', {}).get('a', []):
+                        attributes.pop(name, None)
+                    state['attributes'] = attributes
+                if 'lc' in additions:
+                    state['last_changed'] = _iso_timestamp(additions['lc'])
+                    state['last_updated'] = state['last_changed']
+                if 'lu' in additions:
+                    state['last_updated'] = _iso_timestamp(additions['lu'])
+                self.states[entity_id] = state
+                changed.add(entity_id)
+
+            for entity_id in event.get('r', []):
+                if self.states.pop(entity_id, None) is not None:
+                    changed.add(entity_id)
+        return changed
+
+
+def websocket_url(http_url: str) -> str:
+    """ws(s):// URL of the WebSocket API for a Home Assistant base URL"""
+    parts = urllib.parse.urlsplit(http_url)
+    scheme = 'wss' if parts.scheme == 'https' else 'ws'
+    return f"{scheme}://{parts.netloc}/api/websocket"
+
+
+class HomeAssistantStream:
+    """Background subscription to entity state changes, reconnecting with backoff"""
+
+    def __init__(self, url: str, token: str, entity_ids: Iterable[str], store: EntityStore = None,
+                 on_change: Callable[[Set[str]], None] = None, ssl_context: ssl.SSLContext = None):
+        self.url = websocket_url(url)
+        self.token = token
+        self.entity_ids = list(entity_ids)
+        self.store = store or EntityStore()
+        self.on_change = on_change
+        self.ssl_context = ssl_context
+        self.connected = Event()   # Set while subscribed and the initial states have arrived
+        self.stopped = Event()
+        self.websocket: Optional[WebSocket] = None
+        self.thread = None
+
+    def start(self) -> "HomeAssistantStream":
+        self.thread = Thread(target=self._run, name="ha-websocket", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.websocket is not None:
+            self.websocket.close()
+
+    def is_live(self) -> bool:
+        """True if the store holds pushed, current states of all subscribed entities"""
+        return self.connected.is_set() and self.store.has_all(self.entity_ids)
+
+    def _run(self) -> None:
+        delay = RECONNECT_MIN
+        while not self.stopped.is_set():
+            try:
+                self._connect()
+                delay = RECONNECT_MIN
+                self._listen()
+            except Exception as e:
+                if self.stopped.is_set():
+                    break
+                print(f"⚠️  Home Assistant WebSocket: {e}, reconnecting in {delay}s")
+            finally:
+                self.connected.clear()
+                if self.websocket is not None:
+                    self.websocket.close()
+            self.stopped.wait(delay)
+            delay = min(RECONNECT_MAX, delay * 2)
+
+    def _connect(self) -> None:
+        self.websocket = websocket = WebSocket(self.url, ssl_context=self.ssl_context)
+        message = websocket.receive_json()
+        if message.get('type') != 'auth_required':
+            raise ConnectionError(f"unexpected message {message.get('type')}")
+        websocket.send_json({'type': 'auth', 'access_token': self.token})
+        message = websocket.receive_json()
+        if message.get('type') != 'auth_ok':
+            raise ConnectionError(f"authentication failed: {message.get('message', message.get('type'))}")
+
+        websocket.send_json({'id': 1, 'type': 'subscribe_entities', 'entity_ids': self.entity_ids})
+        print("✅ Home Assistant WebSocket subscribed")
+
+    def _listen(self) -> None:
+        websocket = self.websocket
+        websocket.settimeout(PING_INTERVAL)
+        next_id = 2
+        awaiting_pong = False
+
+        while not self.stopped.is_set():
+            try:
+                message = websocket.receive_json()
+            except socket.timeout:
+                if awaiting_pong:
+                    raise ConnectionError("no answer to heartbeat")
+                websocket.send_json({'id': next_id, 'type': 'ping'})
+                next_id += 1
+                awaiting_pong = True
+                continue
+
+            awaiting_pong = False
+            if message.get('type') == 'result' and not message.get('success', True):
+                raise ConnectionError(f"subscription failed: {message.get('error')}")
+            if message.get('type') == 'event' and message.get('id') == 1:
+                changed = self.store.apply_event(message['event'])
+                self.connected.set()
+                if changed and self.on_change is not None:
+                    self.on_change(changed)
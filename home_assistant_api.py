@@ -1,16 +1,28 @@
 #!/usr/bin/env python3
 
+import urllib.error
 import urllib.request
 import json
 import ssl
 import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import *
 from datetime import datetime
+from threading import Lock
+
+from upstream import fetch_bytes, get_breaker, CircuitOpenError
+from timeparse import iso_datetime, iso_hour
+from price_series import PriceSeries
+from ha_websocket import HomeAssistantStream
+from power_sampler import power_watts
 
 # Home Assistant Configuration - UPDATE THESE VALUES!
 HOME_ASSISTANT_URL = "http://your-ip:8123"
 HOME_ASSISTANT_TOKEN = os.getenv("HA_TOKEN")
 
+# Receive entity changes pushed over the WebSocket API instead of polling (HA_WEBSOCKET=0 to disable)
+HA_WEBSOCKET_ENABLED = os.getenv("HA_WEBSOCKET", "1") != "0"
+
 # Your specific Tibber entity IDs
 TIBBER_ENTITIES = {
     'current_price': 'sensor.change_this_strompreis',                    # Current price (0.332 EUR/kWh)
@@ -22,6 +34,20 @@ TIBBER_ENTITIES = {
     'priceinfo_raw': 'sensor.tibber_priceinfo_raw',                         # Raw price prediction data
 }
 
+# Last successfully fetched state per entity, served while Home Assistant is unreachable
+_last_known_states: Dict[str, dict] = {}
+
+# Set to False once /api/states is refused (e.g. by a restricted token); entities are then fetched one by one
+_bulk_supported = True
+# Responses that refuse the bulk endpoint itself; other errors (e.g. 502/503 during a restart) are failed fetches
+BULK_REFUSED_CODES = {401, 403, 404, 405}
+FALLBACK_WORKERS = 4
+
+UNAVAILABLE_STATE = {'state': 'unavailable', 'attributes': {}}
+
+# Appliance run times (hours) whose cheapest start time is shown on the energy screen
+CHEAPEST_WINDOW_HOURS = [2, 3]
+
 
 class HomeAssistantAPI:
     def __init__(self, url: str = HOME_ASSISTANT_URL, token: str = HOME_ASSISTANT_TOKEN):
@@ -32,32 +58,102 @@ class HomeAssistantAPI:
             'Content-Type': 'application/json'
         }
 
-    def get_entity_state(self, entity_id: str) -> dict:
-        """Get the current state of a Home Assistant entity"""
-        try:
-            api_url = f"{self.url}/api/states/{entity_id}"
+        # Handle SSL context for self-signed certificates
+        self.ssl_context = ssl.create_default_context()
+        self.ssl_context.check_hostname = False
+        self.ssl_context.verify_mode = ssl.CERT_NONE
 
-            request = urllib.request.Request(api_url, headers=self.headers)
+    def _get_json(self, path: str) -> Any:
+        request = urllib.request.Request(f"{self.url}{path}", headers=self.headers)
+        return json.loads(fetch_bytes(request, 'home_assistant', context=self.ssl_context).decode())
 
-            # Handle SSL context for self-signed certificates
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
+    def fetch_entity_state(self, entity_id: str) -> dict:
+        """Get the current state of a Home Assistant entity; raises if Home Assistant could not be asked"""
+        data = self._get_json(f"/api/states/{entity_id}")
+        _last_known_states[entity_id] = data
+        return data
 
-            with urllib.request.urlopen(request, context=ssl_context) as response:
-                data = json.loads(response.read().decode())
-                return data
+    def get_entity_state(self, entity_id: str) -> dict:
+        """Get the current state of a Home Assistant entity (the last known state if unreachable)"""
+        try:
+            return self.fetch_entity_state(entity_id)
 
+        except CircuitOpenError as e:
+            if entity_id not in _last_known_states:
+                print(f"❌ Error fetching entity {entity_id}: {e}")
         except Exception as e:
             print(f"❌ Error fetching entity {entity_id}: {e}")
-            return {'state': 'unavailable', 'attributes': {}}
+
+        # Serve the last known state (if any) while Home Assistant is down
+        return _last_known_states.get(entity_id, UNAVAILABLE_STATE)
+
+    def fetch_states(self, entity_ids: Iterable[str]) -> Dict[str, dict]:
+        """Get the states of several entities with a single /api/states request
+
+        Falls back to parallel per-entity requests only if Home Assistant
+        refuses the bulk endpoint. Raises if Home Assistant could not be
+        asked; entities it does not know are left out.
+        """
+        global _bulk_supported
+        entity_ids = list(entity_ids)
+        if _bulk_supported:
+            wanted = set(entity_ids)
+            try:
+                states = {state['entity_id']: state for state in self._get_json("/api/states")
+                          if state.get('entity_id') in wanted}
+            except urllib.error.HTTPError as e:
+                if e.code not in BULK_REFUSED_CODES:
+                    raise
+                print(f"⚠️  Bulk fetch refused ({e.code}), fetching entities one by one")
+                _bulk_supported = False
+            else:
+                _last_known_states.update(states)
+                return states
+
+        with ThreadPoolExecutor(max_workers=FALLBACK_WORKERS, thread_name_prefix="ha-fetch") as pool:
+            futures = {entity_id: pool.submit(self.fetch_entity_state, entity_id) for entity_id in entity_ids}
+        states = {}
+        for entity_id, future in futures.items():
+            try:
+                states[entity_id] = future.result()
+            except urllib.error.HTTPError as e:
+                if e.code != 404:
+                    raise
+        return states
+
+    def get_states(self, entity_ids: Iterable[str]) -> Dict[str, dict]:
+        """Get the states of several entities (see fetch_states); the last known states while unreachable"""
+        entity_ids = list(entity_ids)
+        try:
+            states = self.fetch_states(entity_ids)
+        except CircuitOpenError as e:
+            if not set(entity_ids) <= _last_known_states.keys():
+                print(f"❌ Error fetching entities: {e}")
+            states = {}
+        except Exception as e:
+            print(f"❌ Error fetching entities: {e}")
+            states = {}
+
+        return {entity_id: states.get(entity_id) or _last_known_states.get(entity_id, UNAVAILABLE_STATE)
+                for entity_id in entity_ids}
 
     def get_multiple_entities(self, entity_ids: List[str]) -> Dict[str, dict]:
-        """Get states of multiple entities"""
-        results = {}
-        for entity_id in entity_ids:
-            results[entity_id] = self.get_entity_state(entity_id)
-        return results
+        """Get states of multiple entities (one round-trip, see get_states)"""
+        return self.get_states(entity_ids)
+
+
+# Shared client: one SSL context for all requests (the power sampler asks every few seconds)
+_api = HomeAssistantAPI()
+
+
+def get_api() -> HomeAssistantAPI:
+    """Get the shared Home Assistant client (one SSL context for all requests)"""
+    return _api
+
+
+def home_assistant_configured() -> bool:
+    """True once HOME_ASSISTANT_URL and HA_TOKEN are set"""
+    return "your-ip" not in HOME_ASSISTANT_URL and bool(HOME_ASSISTANT_TOKEN)
 
 
 def _analyze_price_data(current_price: str, attributes: dict) -> dict:
@@ -174,142 +270,255 @@ def get_tibber_display_data_eink_optimized() -> List[tuple]:
         return [("Error", "!", "Keine Daten")]
 
 
-def parse_tibber_price_data(raw_data: dict) -> Dict[str, Any]:
-    """Parse raw Tibber price prediction data into a structured format"""
+class PriceSeriesCache:
+    """Parsed price series per delivery day
+
+    Each day's today/tomorrow array is parsed once and reused while its
+    start times and prices are unchanged, so a correction of a published
+    day is picked up. If the price entity's last_updated is unchanged, the
+    arrays are not even looked at. Used from the acquisition worker and the
+    main thread, hence the lock.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.clear()
+
+    def clear(self) -> None:
+        """Forget all parsed series (e.g. between tests)"""
+        with self.lock:
+            self.days: Dict[str, Tuple[tuple, PriceSeries]] = {}  # Day -> (start times and prices, series)
+            self.last_updated = None
+            self.last_result = None
+
+    def series(self, raw_data: dict, last_updated: str = None) -> Tuple[PriceSeries, PriceSeries, PriceSeries]:
+        """(today, tomorrow, today + tomorrow) series of a priceinfo attribute dict"""
+        with self.lock:
+            return self._series(raw_data, last_updated)
+
+    def _series(self, raw_data: dict, last_updated: str = None) -> Tuple[PriceSeries, PriceSeries, PriceSeries]:
+        if last_updated is not None and last_updated == self.last_updated:
+            return self.last_result
+
+        current_day, today = self._day(raw_data.get('today', []))
+        _, tomorrow = self._day(raw_data.get('tomorrow', []))
+
+        # Forget delivery days before today
+        if current_day is not None:
+            for day in [day for day in self.days if day < current_day]:
+                del self.days[day]
+
+        # Reuse the combined series while neither day changed, so its window cache survives
+        if self.last_result is None or self.last_result[0] is not today or self.last_result[1] is not tomorrow:
+            try:
+                combined = today.concat(tomorrow)
+            except ValueError:
+                combined = today
+            self.last_result = (today, tomorrow, combined)
+        self.last_updated = last_updated
+        return self.last_result
+
+    def _day(self, points: List[dict]) -> Tuple[Optional[str], PriceSeries]:
+        """(delivery day, series) of one day's price points"""
+        starts = [point for point in points if point.get('startsAt')]
+        if not starts:
+            return None, PriceSeries(0.0)
+
+        day = starts[0]['startsAt'][:10]
+        key = tuple((point['startsAt'], point.get('total')) for point in starts)
+        cached = self.days.get(day)
+        if cached is not None and cached[0] == key:
+            return day, cached[1]
+
+        series = PriceSeries.from_points(starts)
+        self.days[day] = (key, series)
+        return day, series
+
+
+_price_series_cache = PriceSeriesCache()
+
+
+def _empty_price_data() -> Dict[str, Any]:
+    return {
+        'current': {'price': 0, 'hour': 0, 'time': 0},
+        'today': PriceSeries(0.0),
+        'tomorrow': PriceSeries(0.0),
+        'windows': [],
+        'stats': {'min': 0, 'max': 0, 'avg': 0, 'current_rank': 0, 'total_hours': 0}
+    }
+
+
+def parse_tibber_price_data(raw_data: dict, last_updated: str = None, strict: bool = False) -> Dict[str, Any]:
+    """Parse raw Tibber price prediction data into a structured format
+
+    The today/tomorrow PriceSeries come from the day-keyed cache; only the
+    current price, interval, rank and cheapest windows (cached on the series
+    per start interval) are looked up on every call. Pass the
+    entity's last_updated to skip even the cache lookup while the data is
+    unchanged. With strict, data without prices raises instead of giving
+    empty price data.
+    """
     try:
+        if strict and not raw_data.get('today'):
+            raise ValueError("no prices for today")
+
         # Extract current price info
         current_data = raw_data.get('current', {})
         current_price = current_data.get('total', 0)
         current_starts = current_data.get('startsAt', '')
 
-        # Extract hour from ISO timestamp
-        from datetime import datetime
+        # Start of the current price interval
         if current_starts:
-            dt = datetime.fromisoformat(current_starts.replace('Z', '+00:00'))
-            current_hour = dt.hour
+            current_time = iso_datetime(current_starts).timestamp()
+            current_hour = iso_hour(current_starts)
         else:
+            current_time = datetime.now().timestamp()
             current_hour = datetime.now().hour
 
-        # Parse today's prices
-        today_raw = raw_data.get('today', [])
-        today_prices = []
-        for price_point in today_raw:
-            price = price_point.get('total', 0)
-            starts_at = price_point.get('startsAt', '')
-            if starts_at:
-                dt = datetime.fromisoformat(starts_at.replace('Z', '+00:00'))
-                hour = dt.hour
-                today_prices.append({'hour': hour, 'price': price})
-
-        # Parse tomorrow's prices (if available)
-        tomorrow_raw = raw_data.get('tomorrow', [])
-        tomorrow_prices = []
-        for price_point in tomorrow_raw:
-            price = price_point.get('total', 0)
-            starts_at = price_point.get('startsAt', '')
-            if starts_at:
-                dt = datetime.fromisoformat(starts_at.replace('Z', '+00:00'))
-                hour = dt.hour
-                tomorrow_prices.append({'hour': hour, 'price': price})
-
-        # Calculate statistics
-        all_today_prices = [p['price'] for p in today_prices]
-        min_price_today = min(all_today_prices) if all_today_prices else 0
-        max_price_today = max(all_today_prices) if all_today_prices else 0
-        avg_price_today = sum(all_today_prices) / len(all_today_prices) if all_today_prices else 0
-
-        # Find current price ranking
-        sorted_prices = sorted(all_today_prices)
-        current_rank = sorted_prices.index(current_price) + 1 if current_price in sorted_prices else len(sorted_prices) // 2
+        # Parse today's and tomorrow's prices (tomorrow's are available after 1-3 PM)
+        today, tomorrow, combined = _price_series_cache.series(raw_data, last_updated)
+
+        # Cheapest start times for appliances, from the current interval on
+        windows = combined.cheapest_windows([hours * 3600 for hours in CHEAPEST_WINDOW_HOURS], current_time)
 
         return {
             'current': {
                 'price': current_price,
-                'hour': current_hour
+                'hour': current_hour,
+                'time': current_time
             },
-            'today': today_prices,
-            'tomorrow': tomorrow_prices,
+            'today': today,
+            'tomorrow': tomorrow,
+            'windows': [[duration / 3600, start, price] for duration, (start, price) in windows.items()],
             'stats': {
-                'min': min_price_today,
-                'max': max_price_today,
-                'avg': avg_price_today,
-                'current_rank': current_rank,
-                'total_hours': len(today_prices)
+                'min': today.min,
+                'max': today.max,
+                'avg': today.avg,
+                'current_rank': today.rank(current_price) if today else 0,
+                'total_hours': len(today)  # Intervals, i.e. 96 with 15-minute prices
             }
         }
     except Exception as e:
+        if strict:
+            raise
         print(f"Error parsing price data: {e}")
-        return {
-            'current': {'price': 0, 'hour': 0},
-            'today': [],
-            'tomorrow': [],
-            'stats': {'min': 0, 'max': 0, 'avg': 0, 'current_rank': 0, 'total_hours': 0}
-        }
+        return _empty_price_data()
+
+
+TIBBER_GRAPH_ENTITIES = ['priceinfo_raw', 'current_price', 'current_power', 'today_cost', 'today_consumption']
+
 
+def get_tibber_entity_states(keys: Iterable[str] = TIBBER_GRAPH_ENTITIES) -> Dict[str, dict]:
+    """States of the given TIBBER_ENTITIES keys, fetched in a single round-trip"""
+    states = _api.get_states(TIBBER_ENTITIES[key] for key in keys)
+    return {key: states[TIBBER_ENTITIES[key]] for key in keys}
+
+
+def fetch_tibber_entity_states(keys: Iterable[str] = TIBBER_GRAPH_ENTITIES) -> Dict[str, dict]:
+    """States of the given TIBBER_ENTITIES keys in a single round-trip
+
+    Raises if Home Assistant could not be asked or does not know one of the entities.
+    """
+    keys = list(keys)
+    states = _api.fetch_states(TIBBER_ENTITIES[key] for key in keys)
+    missing = [TIBBER_ENTITIES[key] for key in keys if TIBBER_ENTITIES[key] not in states]
+    if missing:
+        raise KeyError(f"unknown entities: {', '.join(missing)}")
+    return {key: states[TIBBER_ENTITIES[key]] for key in keys}
+
+
+def start_tibber_stream(keys: Iterable[str] = TIBBER_GRAPH_ENTITIES,
+                        on_change: Callable[[Set[str]], None] = None) -> HomeAssistantStream:
+    """Subscribe to pushed state changes of the given TIBBER_ENTITIES keys"""
+    api = _api
+    return HomeAssistantStream(api.url, api.token, [TIBBER_ENTITIES[key] for key in keys],
+                               on_change=on_change, ssl_context=api.ssl_context).start()
+
+
+def get_tibber_stream_states(stream: HomeAssistantStream, keys: Iterable[str] = TIBBER_GRAPH_ENTITIES) -> Dict[str, dict]:
+    """States of the given TIBBER_ENTITIES keys from the pushed entity store"""
+    return {key: stream.store.get(TIBBER_ENTITIES[key]) or UNAVAILABLE_STATE for key in keys}
+
+
+def get_current_power() -> Optional[float]:
+    """Current Tibber Pulse power in W, None if Home Assistant could not be asked"""
+    if get_breaker('home_assistant').seconds_until_retry() > 0:
+        return None  # Backing off; don't log an error every few seconds
+    try:
+        return power_watts(_api.fetch_entity_state(TIBBER_ENTITIES['current_power']))
+    except Exception as e:
+        print(f"❌ Error fetching current power: {e}")
+        return None
+
+
+def build_tibber_graph_data(price_data: Dict[str, Any], price_level: str, current_power: Any,
+                            today_cost: Any, today_consumption: Any) -> Dict[str, Any]:
+    """Display data of the Tibber graph screen from parsed prices and raw power/cost/consumption values"""
+    # Format power, cost, consumption
+    try:
+        power_formatted = f"{int(float(current_power))} W"
+    except:
+        power_formatted = f"{current_power} W"
 
-def get_tibber_graph_data() -> Dict[str, Any]:
-    """Fetch and prepare Tibber data for graph display"""
     try:
-        ha_api = HomeAssistantAPI()
+        cost_formatted = f"{float(today_cost):.2f} €"
+    except:
+        cost_formatted = f"{today_cost} €"
+
+    try:
+        consumption_formatted = f"{float(today_consumption):.2f} kWh"
+    except:
+        consumption_formatted = f"{today_consumption} kWh"
+
+    return {
+        'price_data': price_data,
+        'price_level': price_level,
+        'current_power': power_formatted,
+        'today_cost': cost_formatted,
+        'today_consumption': consumption_formatted,
+        # Raw values for the consumption history screen
+        'today_totals': {'today_consumption': today_consumption, 'today_cost': today_cost},
+    }
+
+
+def get_tibber_graph_data(entity_states: Dict[str, dict] = None, strict: bool = False) -> Dict[str, Any]:
+    """Fetch and prepare Tibber data for graph display
+
+    entity_states maps TIBBER_GRAPH_ENTITIES keys to entity states that were
+    already fetched; if omitted, they are fetched here in one request. With
+    strict, fetch and parse errors raise instead of giving placeholder data.
+    """
+    try:
+        if entity_states is None:
+            fetch = fetch_tibber_entity_states if strict else get_tibber_entity_states
+            entity_states = fetch(TIBBER_GRAPH_ENTITIES)
 
         # Get the raw price prediction data
-        priceinfo_entity = ha_api.get_entity_state(TIBBER_ENTITIES.get('priceinfo_raw', 'sensor.tibber_priceinfo_raw'))
+        priceinfo_entity = entity_states['priceinfo_raw']
 
         # Get the structured attributes
         attributes = priceinfo_entity.get('attributes', {})
 
-        # Parse the price prediction data
-        price_data = parse_tibber_price_data(attributes)
+        # Parse the price prediction data (series are cached per delivery day)
+        price_data = parse_tibber_price_data(attributes, priceinfo_entity.get('last_updated'), strict)
         
         # Get the current price entity to fetch price_level
-        price_entity = ha_api.get_entity_state(TIBBER_ENTITIES['current_price'])
+        price_entity = entity_states['current_price']
         price_attributes = price_entity.get('attributes', {})
         price_level = price_attributes.get('price_level', 'NORMAL')
 
         # Get current consumption and cost data (same as before)
-        power_entity = ha_api.get_entity_state(TIBBER_ENTITIES['current_power'])
-        cost_entity = ha_api.get_entity_state(TIBBER_ENTITIES['today_cost'])
-        consumption_entity = ha_api.get_entity_state(TIBBER_ENTITIES['today_consumption'])
-
-        # Format power, cost, consumption
-        current_power = power_entity.get('state', 'N/A')
-        try:
-            power_formatted = f"{int(float(current_power))} W"
-        except:
-            power_formatted = f"{current_power} W"
-
-        today_cost = cost_entity.get('state', 'N/A')
-        try:
-            cost_formatted = f"{float(today_cost):.2f} €"
-        except:
-            cost_formatted = f"{today_cost} €"
-
-        today_consumption = consumption_entity.get('state', 'N/A')
-        try:
-            consumption_formatted = f"{float(today_consumption):.2f} kWh"
-        except:
-            consumption_formatted = f"{today_consumption} kWh"
-
-        # Combine everything
-        result = {
-            'price_data': price_data,
-            'price_level': price_level,  # Add price level
-            'current_power': power_formatted,
-            'today_cost': cost_formatted,
-            'today_consumption': consumption_formatted
-        }
-
-        return result
+        return build_tibber_graph_data(price_data, price_level,
+                                       entity_states['current_power'].get('state', 'N/A'),
+                                       entity_states['today_cost'].get('state', 'N/A'),
+                                       entity_states['today_consumption'].get('state', 'N/A'))
 
     except Exception as e:
+        if strict:
+            raise
         print(f"Error getting Tibber graph data: {e}")
         return {
-            'price_data': {
-                'current': {'price': 0, 'hour': 0},
-                'today': [],
-                'tomorrow': [],
-                'stats': {'min': 0, 'max': 0, 'avg': 0, 'current_rank': 0, 'total_hours': 0}
-            },
+            'price_data': _empty_price_data(),
             'price_level': 'NORMAL',  # Add default price level
             'current_power': '0 W',
             'today_cost': '0.00 EUR',
@@ -320,7 +529,7 @@ def get_tibber_graph_data() -> Dict[str, Any]:
 def get_tibber_data() -> Dict[str, Any]:
     """Fetch and format Tibber data from Home Assistant"""
     try:
-        ha_api = HomeAssistantAPI()
+        ha_api = _api
 
         # Get all Tibber entities
         entity_states = ha_api.get_multiple_entities(list(TIBBER_ENTITIES.values()))
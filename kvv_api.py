@@ -1,17 +1,39 @@
 #!/usr/bin/env python3
 
+import os
 import urllib.request
+import urllib.parse
 import json
+import codecs
+from itertools import chain
 from typing import *
-from dateutil import parser
 from datetime import datetime
 from time import sleep
 
+from upstream import open_url, fetch_bytes
+from departure_filter import get_departure_filter
+from timeparse import efa_timestamp, rmv_datetime
+
 
 API_TOKEN: str = "TODO"  # like "xxxxxxxx-xxxx-xxxx-xxxx-xxxxxxxxxxxx" (hex)
 ORIGIN_ID: str = "TODO" # like: "0000000" (dec)
 
+# EFA endpoint; point it at replay_server.py (e.g. http://127.0.0.1:8080) to work offline
+KVV_BASE_URL: str = os.getenv("KVV_BASE_URL", "https://projekte.kvv-efa.de/sl3-alone")
+# RMV HAFAS endpoint for trip planning (see trips.py)
+RMV_BASE_URL: str = os.getenv("RMV_BASE_URL", "https://www.rmv.de/hapi")
+
 # Station configuration for North and South directions
+# Optional per direction (sent to the EFA server to keep the response small):
+#   "means": EFA transport modes (motType) to include, e.g. [1, 4] for S-Bahn and tram
+#   "lines": EFA line ids ('stateless' in the response) to include, e.g. ["kvv:22311:E:H:s22"]
+#   "sources": several stops merged into one board, each a dict with "id", "platform"
+#              (None = all platforms) and optional "means"/"lines", e.g.
+#              [{"id": "7001105", "platform": "2"}, {"id": "7000801", "platform": None, "means": [5]}]
+# Optional local filters (per direction or per source, see departure_filter.py):
+#   "show_lines"/"hide_lines": line numbers to keep/drop, e.g. ["S1", "S11"]
+#   "hide_destinations": destinations to drop; "destination_filter": regex of destinations to drop
+#   "walk_minutes": hide departures that leave before you can reach the platform
 STATION_CONFIG = {
     "NORTH": {
         "id": "7001105",  # Same station ID, different platform
@@ -25,37 +47,96 @@ STATION_CONFIG = {
     }
 }
 
+# EFA transport modes (motType), used to build the excludedMeans filter
+EFA_MEANS = range(12)  # 0 Zug, 1 S-Bahn, 2 U-Bahn, 3 Stadtbahn, 4 Tram, 5 Bus, ... 11 Sonstige
+
 # Default direction (currently South as in your original code)
+# Only used when a function is called without an explicit direction; the app
+# always passes the direction of the screen it is rendering.
 current_direction = "SOUTH"
 
-def get_api_request_dep(direction: str = None) -> str:
-    """Generate API request URL for the specified direction"""
-    global current_direction
-    if direction:
-        current_direction = direction
-    
-    station_id = STATION_CONFIG[current_direction]["id"]
-    return f"https://projekte.kvv-efa.de/sl3-alone/XSLT_DM_REQUEST?outputFormat=JSON&coordOutputFormat=WGS84[dd.ddddd]&depType=stopEvents&locationServerActive=1&mode=direct&name_dm={station_id}&type_dm=stop&useOnlyStops=1&useRealtime=1"
-
-def get_api_request_trip(direction: str = None) -> str:
-    """Generate API request URL for trip planning"""
-    global current_direction
-    if direction:
-        current_direction = direction
-    
-    destination_id = STATION_CONFIG[current_direction]["id"]
-    return f"https://www.rmv.de/hapi/trip?originId={ORIGIN_ID}&destId={destination_id}&accessId={API_TOKEN}&format=json"
-
-# Maintain backward compatibility
-API_REQUEST_DEP: str = get_api_request_dep()
+# Departures kept per direction: the board shows 6, the rest keeps the local countdown filled between polls
+DEPARTURE_LIMIT = 12
+
+# Parse the departure monitor response incrementally while reading it from the socket
+STREAMING_PARSE = True
+STREAM_CHUNK_SIZE = 8192
+
+
+def get_direction_sources(direction: str) -> List[dict]:
+    """Stops (id, platform, filters) whose departures make up the board of a direction"""
+    config = STATION_CONFIG[direction]
+    return config.get("sources") or [config]
+
+
+def stop_request_key(stop: dict) -> str:
+    """Identifies the EFA request of a stop; stops with the same key share one request"""
+    key = stop["id"]
+    if stop.get("means"):
+        key += "/means=" + ",".join(str(mean) for mean in sorted(stop["means"]))
+    if stop.get("lines"):
+        key += "/lines=" + ",".join(sorted(stop["lines"]))
+    return key
+
+
+def get_stop_requests() -> Dict[str, List[Tuple[str, dict]]]:
+    """Distinct EFA requests of all boards: request key -> (direction, stop) of every board it feeds
+
+    EFA cannot filter by platform, so e.g. both platforms of one station are
+    served by a single request and split locally.
+    """
+    requests = {}
+    for direction in STATION_CONFIG:
+        for stop in get_direction_sources(direction):
+            requests.setdefault(stop_request_key(stop), []).append((direction, stop))
+    return requests
+
+
+def get_api_request_dep(direction: str = None, limit: int = None, when: datetime = None) -> str:
+    """Generate API request URL for the specified direction
+
+    The server-side limit, start time and mode/line filters are derived from
+    STATION_CONFIG so that EFA sends the smallest list that still fills the board.
+    """
+    return get_api_request_stop(get_direction_sources(direction or current_direction)[0], limit, when)
+
+
+def get_api_request_stop(stop: dict, limit: int = None, when: datetime = None) -> str:
+    """Generate API request URL for a single stop of a direction"""
+    station_id = stop["id"]
+    if limit is None:
+        # EFA cannot filter by platform, so every board served by this stop shares the list
+        shared = sum(1 for direction in STATION_CONFIG
+                     for source in get_direction_sources(direction) if source["id"] == station_id)
+        limit = DEPARTURE_LIMIT * shared
+    if when is None:
+        when = datetime.now()
+
+    url = (f"{KVV_BASE_URL}/XSLT_DM_REQUEST?outputFormat=JSON&coordOutputFormat=WGS84[dd.ddddd]"
+           f"&depType=stopEvents&locationServerActive=1&mode=direct&name_dm={station_id}&type_dm=stop&useOnlyStops=1"
+           f"&useRealtime=1&limit={limit}&itdDateTimeDepArr=dep&itdDate={when:%Y%m%d}&itdTime={when:%H%M}")
+
+    if stop.get("means"):
+        url += "&excludedMeans=checkbox" + "".join(
+            f"&exclMOT_{mot}=1" for mot in EFA_MEANS if mot not in stop["means"])
+    for line in stop.get("lines", []):
+        url += f"&line={urllib.parse.quote(line)}"
+    return url
+
+def get_api_request_trip(direction: str = None, destination_id: str = None) -> str:
+    """Generate API request URL for trip planning (to destination_id, default: the direction's station)"""
+    if destination_id is None:
+        destination_id = STATION_CONFIG[direction or current_direction]["id"]
+    return f"{RMV_BASE_URL}/trip?originId={ORIGIN_ID}&destId={destination_id}&accessId={API_TOKEN}&format=json"
+
+# Maintain backward compatibility (departure requests carry the current time: use get_api_request_dep())
 API_REQUEST_TRIP: str = get_api_request_trip()
 
 
 def get_json_data(source_url: str):
-    with urllib.request.urlopen(source_url) as url:
-        data: str = url.read().decode()
+    data: str = fetch_bytes(source_url, 'kvv').decode()
 
-    #f = open('mockdata.json')
+    # Offline: serve mockdata.json with replay_server.py and set KVV_BASE_URL
 
     # returns JSON object as
     # a dictionary
@@ -78,24 +159,235 @@ def filter_data_trip(data, exclude_destinations: Set[str] = []) -> Iterable[Tupl
             yield time, line_name, destination
 
 
-def filter_data_dep(data, exclude_destinations: Set[str] = []) -> Iterable[Tuple[str, str, str]]:
-    """Filter departure data based on current direction (platform)"""
-    target_platform = STATION_CONFIG[current_direction]["platform"]
-    
-    for element in data['departureList']:
-        if int(element['countdown']) < 15:
-            if int(element['countdown']) == 0:
-                time = "jetzt"
+class Departure:
+    """A single departure, reduced to the fields the display needs"""
+
+    __slots__ = ('line', 'destination', 'platform', 'planned_time', 'real_time', 'delay', 'is_realtime',
+                 'walk_minutes')
+
+    def __init__(self, line: str, destination: str, platform: str, planned_time: float,
+                 real_time: float = None, delay: int = 0, is_realtime: bool = False, walk_minutes: int = 0):
+        self.line = line
+        self.destination = destination
+        self.platform = platform
+        self.planned_time = planned_time  # Timetable departure, epoch seconds (EFA 'dateTime')
+        self.real_time = planned_time if real_time is None else real_time  # Expected departure (EFA 'realDateTime')
+        self.delay = delay                # Minutes
+        self.is_realtime = is_realtime    # True if real-time data was available
+        self.walk_minutes = walk_minutes  # Walk time to the stop; not reachable when leaving sooner
+
+    @property
+    def planned(self) -> datetime:
+        return datetime.fromtimestamp(self.planned_time)
+
+    @property
+    def realtime(self) -> datetime:
+        return datetime.fromtimestamp(self.real_time)
+
+    def __eq__(self, other):
+        if not isinstance(other, Departure):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in Departure.__slots__)
+
+    def __repr__(self):
+        return (f"Departure({self.line!r}, {self.destination!r}, platform={self.platform!r}, "
+                f"planned={self.planned:%H:%M}, delay={self.delay})")
+
+
+# Countdowns below this many minutes are shown as "N min", later ones as clock time
+COUNTDOWN_WINDOW_MINUTES = 15
+
+
+def _departure_from_element(element: dict, platform: str, walk_minutes: int = 0) -> Departure:
+    """Copy the displayed fields out of a single EFA departureList element"""
+    serving_line = element['servingLine']
+    planned_time = efa_timestamp(element['dateTime'])
+    if 'realDateTime' in element:
+        real_time = efa_timestamp(element['realDateTime'])
+        return Departure(serving_line['number'], serving_line['direction'], platform, planned_time,
+                         real_time, int((real_time - planned_time) // 60), True, walk_minutes)
+    return Departure(serving_line['number'], serving_line['direction'], platform, planned_time,
+                     walk_minutes=walk_minutes)
+
+
+def _stop_config(direction: Optional[str], stop: Optional[dict]) -> dict:
+    """Filter rules to apply: the stop's if given, else the direction's"""
+    return stop or STATION_CONFIG[direction or current_direction]
+
+
+def parse_departures(data, exclude_destinations: Set[str] = [], stop: dict = None,
+                     direction: str = None) -> List[Departure]:
+    """Parse the departure list of a direction (or the given stop) into Departure records
+
+    Only the displayed fields are copied out of each element, so the raw JSON
+    can be released as soon as this returns.
+    """
+    config = _stop_config(direction, stop)
+    departure_filter = get_departure_filter(config, exclude_destinations)
+    walk_minutes = config.get("walk_minutes", 0)
+    return [_departure_from_element(element, element['platform'], walk_minutes)
+            for element in departure_filter.select(data['departureList'])]
+
+
+def iter_departure_elements(stream: BinaryIO, chunk_size: int = STREAM_CHUNK_SIZE) -> Iterator[dict]:
+    """Incrementally yield the elements of the 'departureList' array from a DM response stream
+
+    Everything before the array ('parameters', 'dm', 'servingLines', ...) is
+    skipped without being decoded. Each element is decoded on its own as soon
+    as it is complete, so only one element is held in memory at a time.
+    """
+    key = b'"departureList"'
+    decoder = json.JSONDecoder()
+
+    # Phase 1: skip raw bytes up to the departureList key
+    pending = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        pending += chunk
+        index = pending.find(key)
+        if index >= 0:
+            pending = pending[index + len(key):]
+            break
+        pending = pending[-(len(key) - 1):]
+
+    # Phase 2: decode the array elements one by one
+    text_decoder = codecs.getincrementaldecoder('utf-8')()
+    buffer = text_decoder.decode(pending)
+    pos = 0
+    in_array = False
+    eof = False
+
+    while True:
+        # Skip separators; the key is followed by ':' and '[', elements by ','
+        while pos < len(buffer) and buffer[pos] in ' \t\r\n:,[':
+            in_array = in_array or buffer[pos] == '['
+            pos += 1
+
+        if pos < len(buffer):
+            if not in_array or buffer[pos] == ']':
+                return  # empty or exhausted list (or departureList is not an array)
+            try:
+                element, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
             else:
-                time = f"{element['countdown']} min"
+                yield element
+                buffer = buffer[end:]
+                pos = 0
+                continue
+        elif eof:
+            return
+
+        chunk = stream.read(chunk_size)
+        if chunk:
+            buffer += text_decoder.decode(chunk)
         else:
-            time = f"{element['dateTime']['hour']}:{int(element['dateTime']['minute']):02d}"
+            buffer += text_decoder.decode(b'', final=True)
+            eof = True
 
-        line_name = element['servingLine']['number']
-        destination = element['servingLine']['direction']
 
-        if destination not in exclude_destinations and element['platform'] == target_platform:
-            yield time, line_name, destination
+def parse_departure_stream(stream: BinaryIO, exclude_destinations: Set[str] = [],
+                           limit: int = DEPARTURE_LIMIT, stop: dict = None,
+                           direction: str = None) -> List[Departure]:
+    """Parse departures of a direction (or the given stop) from a response stream
+
+    Reading stops as soon as limit departures have been collected.
+    """
+    config = _stop_config(direction, stop)
+    departure_filter = get_departure_filter(config, exclude_destinations)
+    walk_minutes = config.get("walk_minutes", 0)
+
+    departures = []
+    for element in departure_filter.select(iter_departure_elements(stream)):
+        departures.append(_departure_from_element(element, element['platform'], walk_minutes))
+        if len(departures) >= limit:
+            break
+    return departures
+
+
+def split_boards(elements: Iterable[dict], boards: List[Tuple[str, dict]], exclude_destinations: Set[str] = [],
+                 limit: int = DEPARTURE_LIMIT) -> Dict[str, List[Departure]]:
+    """Departures per direction from the elements of a request shared by several boards
+
+    Each element goes to every direction with a stop whose filter accepts it.
+    Reading stops as soon as every direction has limit departures.
+    """
+    filters = [(direction, get_departure_filter(stop, exclude_destinations), stop.get("walk_minutes", 0))
+               for direction, stop in boards]
+    departures = {direction: [] for direction, _ in boards}
+    for element in elements:
+        taken = set()
+        for direction, departure_filter, walk_minutes in filters:
+            board = departures[direction]
+            if direction in taken or len(board) >= limit or not departure_filter.accepts(element):
+                continue
+            board.append(_departure_from_element(element, element['platform'], walk_minutes))
+            taken.add(direction)
+        if all(len(board) >= limit for board in departures.values()):
+            break
+    return departures
+
+
+def fetch_stop_departures(boards: List[Tuple[str, dict]], exclude_destinations: Set[str] = []) -> Dict[str, List[Departure]]:
+    """Fetch the shared request of boards (see get_stop_requests) once; returns direction -> departures"""
+    source_url = get_api_request_stop(boards[0][1])
+    if STREAMING_PARSE:
+        with open_url(source_url, 'kvv') as response:
+            return split_boards(iter_departure_elements(response), boards, exclude_destinations)
+    return split_boards(get_json_data(source_url)['departureList'], boards, exclude_destinations)
+
+
+def merge_departures(boards: Iterable[List[Departure]]) -> List[Departure]:
+    """Departures of several stops on one board, by departure time"""
+    # Each stop's list is in planned order, delays can reorder it: sort by real time once
+    return sorted(chain(*boards), key=lambda d: d.real_time)[:DEPARTURE_LIMIT]
+
+
+def format_departure_time(departure: Departure, now: datetime = None) -> Optional[str]:
+    """Format the countdown of a departure relative to now, or None if it has already left"""
+    if now is None:
+        now = datetime.now()
+    now_time = now.replace(second=0, microsecond=0).timestamp()
+
+    countdown = int((departure.real_time - now_time) // 60)
+    if countdown < 0:
+        return None
+    if countdown == 0:
+        return "jetzt"
+    if countdown < COUNTDOWN_WINDOW_MINUTES:
+        return f"{countdown} min"
+    planned = departure.planned
+    return f"{planned.hour}:{planned.minute:02d}"
+
+
+def departures_to_lines(departures: Iterable[Departure], now: datetime = None,
+                        walk_minutes: int = 0) -> List[Tuple[str, str, str]]:
+    """Recompute the (time, line, destination) display rows from cached departures
+
+    Departures that leave within walk_minutes, or within the walk time of
+    their own stop, are no longer reachable and dropped.
+    """
+    if now is None:
+        now = datetime.now()
+    now_time = now.timestamp()
+
+    lines = []
+    for departure in departures:
+        walk = max(walk_minutes, departure.walk_minutes)
+        if walk and departure.real_time < now_time + walk * 60:
+            continue
+        time = format_departure_time(departure, now)
+        if time is not None:
+            lines.append((time, departure.line, departure.destination))
+    return lines
+
+
+def filter_data_dep(data, exclude_destinations: Set[str] = [], direction: str = None) -> Iterable[Tuple[str, str, str]]:
+    """Filter departure data based on the direction (platform)"""
+    yield from departures_to_lines(parse_departures(data, exclude_destinations, direction=direction))
 
 
 def switch_direction(new_direction: str) -> str:
@@ -107,19 +399,20 @@ def switch_direction(new_direction: str) -> str:
     return current_direction
 
 
-def get_current_direction_info() -> dict:
-    """Get current direction configuration"""
+def get_current_direction_info(direction: str = None) -> dict:
+    """Get configuration of the given (default: current) direction"""
+    direction = direction or current_direction
     return {
-        "direction": current_direction,
-        "name": STATION_CONFIG[current_direction]["name"],
-        "platform": STATION_CONFIG[current_direction]["platform"],
-        "station_id": STATION_CONFIG[current_direction]["id"]
+        "direction": direction,
+        "name": STATION_CONFIG[direction]["name"],
+        "platform": STATION_CONFIG[direction]["platform"],
+        "station_id": STATION_CONFIG[direction]["id"],
+        "walk_minutes": STATION_CONFIG[direction].get("walk_minutes", 0)
     }
 
 
 def time_converter(rmv_date: str, rmv_time: str) -> float:
-    rmv_date_time = f"{rmv_date} {rmv_time}"
-    time_offset = parser.parse(rmv_date_time) - datetime.now()
+    time_offset = rmv_datetime(rmv_date, rmv_time) - datetime.now()
     if time_offset.days < 0:
         raise ValueError('Given time is in the past')
     else:
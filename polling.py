@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+"""Adaptive poll scheduling: picks the next fetch time per data source from the data itself"""
+
+from collections import deque
+from datetime import datetime, timedelta
+from typing import *
+
+from kvv_api import Departure, COUNTDOWN_WINDOW_MINUTES
+
+# Transit polling bounds (seconds)
+TRANSIT_MIN_INTERVAL = 60        # Never poll more often than the countdown resolution
+TRANSIT_VOLATILE_INTERVAL = 120  # Departures in the countdown window and delays are moving
+TRANSIT_STABLE_INTERVAL = 300    # Departures in the countdown window, delays are stable
+TRANSIT_MAX_INTERVAL = 900       # Upper bound during service hours
+TRANSIT_NIGHT_INTERVAL = 3600    # Upper bound during the night service gap
+TRANSIT_ERROR_INTERVAL = 60      # Retry after a failed fetch
+
+# Delay changes (minutes) between two polls above this count as volatile
+VOLATILE_DELAY_MINUTES = 1
+DELAY_HISTORY_LENGTH = 3
+
+# Hours with (almost) no trains; polling relaxes to TRANSIT_NIGHT_INTERVAL
+NIGHT_HOURS = range(1, 5)
+
+# Tibber polling: every 5 minutes, but refetch right after the hourly price change
+TIBBER_INTERVAL = 300
+TIBBER_HOUR_OFFSET = 5
+
+
+def tibber_interval(now: datetime = None) -> float:
+    """Seconds until the next Tibber fetch, aligned to the hourly price change"""
+    now = now or datetime.now()
+    next_hour = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+    until_price_change = (next_hour - now).total_seconds() + TIBBER_HOUR_OFFSET
+    return min(TIBBER_INTERVAL, until_price_change)
+
+
+class PollScheduler:
+    """Tracks the next fetch deadline of each data source"""
+
+    def __init__(self):
+        self._deadlines: Dict[str, datetime] = {}
+        self._last_realtimes: Dict[str, Dict[tuple, float]] = {}
+        self._delay_changes: Dict[str, Deque[float]] = {}
+
+    def is_due(self, source: str, now: datetime = None) -> bool:
+        """True if the source has never been fetched or its deadline has passed"""
+        return self.seconds_until_due(source, now) <= 0
+
+    def seconds_until_due(self, source: str, now: datetime = None) -> float:
+        """Seconds until the next fetch of the source is due (0 if overdue)"""
+        deadline = self._deadlines.get(source)
+        if deadline is None:
+            return 0
+        now = now or datetime.now()
+        return max(0.0, (deadline - now).total_seconds())
+
+    def schedule_after(self, source: str, delay: float, now: datetime = None) -> float:
+        """Schedule the next fetch of the source in delay seconds"""
+        now = now or datetime.now()
+        self._deadlines[source] = now + timedelta(seconds=delay)
+        return delay
+
+    def transit_ttl(self, source: str, departures: List[Departure], now: datetime = None) -> float:
+        """Record the delays of the departures just fetched and return the seconds until the next fetch"""
+        now = now or datetime.now()
+        self._record_delay_changes(source, departures)
+        return self.transit_interval(source, departures, now)
+
+    def transit_interval(self, source: str, departures: List[Departure], now: datetime) -> float:
+        """Seconds to wait before the next transit fetch"""
+        upper = TRANSIT_NIGHT_INTERVAL if now.hour in NIGHT_HOURS else TRANSIT_MAX_INTERVAL
+
+        now_time = now.timestamp()
+        upcoming = [d.real_time for d in departures if d.real_time >= now_time - 60]
+        if not upcoming:
+            # Nothing known: look again soon during the day, rarely at night
+            return upper if now.hour in NIGHT_HOURS else TRANSIT_STABLE_INTERVAL
+
+        window = COUNTDOWN_WINDOW_MINUTES * 60
+        until_next = min(upcoming) - now_time
+        if until_next > window:
+            # Clock times are shown until the first departure enters the countdown window
+            return min(upper, max(TRANSIT_MIN_INTERVAL, until_next - window))
+
+        if self.delay_volatility(source) > VOLATILE_DELAY_MINUTES:
+            return TRANSIT_VOLATILE_INTERVAL
+        return TRANSIT_STABLE_INTERVAL
+
+    def delay_volatility(self, source: str) -> float:
+        """Largest real-time change (minutes) of a known departure over the recent polls"""
+        changes = self._delay_changes.get(source)
+        return max(changes) if changes else 0.0
+
+    def _record_delay_changes(self, source: str, departures: List[Departure]) -> None:
+        realtimes = {(d.line, d.destination, d.planned_time): d.real_time for d in departures}
+        previous = self._last_realtimes.get(source, {})
+
+        change = 0.0
+        for key, real_time in realtimes.items():
+            if key in previous:
+                change = max(change, abs(real_time - previous[key]) / 60)
+
+        self._delay_changes.setdefault(source, deque(maxlen=DELAY_HISTORY_LENGTH)).append(change)
+        self._last_realtimes[source] = realtimes
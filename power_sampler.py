@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+
+"""Tibber Pulse power history in constant memory
+
+Power readings arrive from Home Assistant push events (every few seconds
+while the Pulse reports changes) or, when no push came in for
+POLL_INTERVAL seconds, from polling. They are kept in fixed-size
+array('d') ring buffers at two resolutions: raw samples for the last
+10 minutes and 1-minute averages for the last 24 hours.
+"""
+
+from array import array
+from math import isnan, nan
+from threading import Event, Lock, Thread
+from time import monotonic, time
+from typing import *
+
+RAW_SECONDS = 600          # Raw samples are kept for 10 minutes
+RAW_CAPACITY = 600         # ... at most one per second
+MINUTE_BUCKETS = 24 * 60   # 1-minute averages for 24 hours
+POLL_INTERVAL = 5          # Seconds without a pushed reading before the sampler polls
+SPARKLINE_MINUTES = 120    # Minutes shown in the energy screen sparkline
+
+
+def power_watts(state: Optional[dict]) -> Optional[float]:
+    """Power in W of a Home Assistant entity state, None if unavailable"""
+    try:
+        return float(state['state'])
+    except (TypeError, KeyError, ValueError):
+        return None
+
+
+class RingBuffer:
+    """Fixed-size array('d'); the oldest value is overwritten once it is full"""
+
+    __slots__ = ('data', 'head', 'count')
+
+    def __init__(self, size: int):
+        self.data = array('d', [nan]) * size
+        self.head = 0   # Index of the next write
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self, value: float) -> None:
+        self.data[self.head] = value
+        self.head = (self.head + 1) % len(self.data)
+        self.count = min(self.count + 1, len(self.data))
+
+    def last(self, n: int = None) -> array:
+        """The newest n values (all if None), oldest first"""
+        n = self.count if n is None else min(n, self.count)
+        start = (self.head - n) % len(self.data)
+        if start + n <= len(self.data):
+            return self.data[start:start + n]
+        return self.data[start:] + self.data[:self.head]
+
+    def newest(self) -> Optional[float]:
+        return self.data[self.head - 1] if self.count else None
+
+
+class PowerHistory:
+    """Raw power samples for RAW_SECONDS and 1-minute averages for MINUTE_BUCKETS minutes"""
+
+    def __init__(self, raw_capacity: int = RAW_CAPACITY, minute_buckets: int = MINUTE_BUCKETS):
+        self.lock = Lock()
+        self.raw_times = RingBuffer(raw_capacity)
+        self.raw_watts = RingBuffer(raw_capacity)
+        self.minutes = RingBuffer(minute_buckets)  # Closed minutes; NaN = no samples
+        self.minute = None                         # Open minute (epoch // 60)
+        self.minute_sum = 0.0
+        self.minute_count = 0
+
+    def add(self, watts: float, timestamp: float = None) -> bool:
+        """Record a reading; readings older than the newest one are dropped"""
+        if timestamp is None:
+            timestamp = time()
+        with self.lock:
+            newest = self.raw_times.newest()
+            if newest is not None and timestamp < newest:
+                return False
+            self.raw_times.append(timestamp)
+            self.raw_watts.append(watts)
+
+            self._advance(int(timestamp // 60))
+            self.minute_sum += watts
+            self.minute_count += 1
+        return True
+
+    def _advance(self, minute: int) -> None:
+        """Close the open minute (and any minutes without samples) up to minute"""
+        if self.minute is None:
+            self.minute = minute
+            return
+        if minute <= self.minute:
+            return
+        self.minutes.append(self.minute_sum / self.minute_count if self.minute_count else nan)
+        for _ in range(min(minute - self.minute - 1, len(self.minutes.data))):
+            self.minutes.append(nan)
+        self.minute = minute
+        self.minute_sum = 0.0
+        self.minute_count = 0
+
+    def latest(self, max_age: float = 60, now: float = None) -> Optional[float]:
+        """Newest reading if it is at most max_age seconds old"""
+        if now is None:
+            now = time()
+        with self.lock:
+            newest = self.raw_times.newest()
+            if newest is None or now - newest > max_age:
+                return None
+            return self.raw_watts.newest()
+
+    def recent(self, seconds: float = RAW_SECONDS, now: float = None) -> List[Tuple[float, float]]:
+        """(timestamp, watts) raw samples of the last seconds"""
+        if now is None:
+            now = time()
+        with self.lock:
+            samples = zip(self.raw_times.last(), self.raw_watts.last())
+            return [(t, watts) for t, watts in samples if t >= now - seconds]
+
+    def minute_averages(self, count: int = SPARKLINE_MINUTES, now: float = None) -> List[Optional[float]]:
+        """Averages of the last count minutes up to the current (partial) one, None where nothing was read"""
+        if now is None:
+            now = time()
+        with self.lock:
+            if self.minute is None:
+                return [None] * count
+            self._advance(int(now // 60))
+            current = self.minute_sum / self.minute_count if self.minute_count else nan
+            values = list(self.minutes.last(count - 1)) + [current]
+        return [None] * (count - len(values)) + [None if isnan(value) else value for value in values]
+
+
+class PowerSampler:
+    """Feeds a PowerHistory from pushed states and polls while no pushes arrive"""
+
+    def __init__(self, history: PowerHistory, read_power: Callable[[], Optional[float]],
+                 interval: float = POLL_INTERVAL):
+        self.history = history
+        self.read_power = read_power
+        self.interval = interval
+        self.last_reading = 0.0  # monotonic() of the last recorded reading
+        self.stopped = Event()
+        self.thread = None
+
+    def on_state(self, state: Optional[dict]) -> None:
+        """Record a pushed power entity state (called on the WebSocket thread)"""
+        watts = power_watts(state)
+        if watts is not None and self.history.add(watts):
+            self.last_reading = monotonic()
+
+    def poll(self) -> None:
+        try:
+            watts = self.read_power()
+        except Exception as e:
+            print(f"❌ Error reading power: {e}")
+            return
+        if watts is not None and self.history.add(watts):
+            self.last_reading = monotonic()
+
+    def start(self) -> "PowerSampler":
+        self.thread = Thread(target=self._run, name="power-sampler", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.stopped.set()
+
+    def _run(self) -> None:
+        wait = 0.0
+        while not self.stopped.wait(wait):
+            since = monotonic() - self.last_reading
+            if since >= self.interval:
+                self.poll()
+                wait = self.interval
+            else:
+                wait = self.interval - since  # Pushed readings keep arriving
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+
+"""Evenly spaced electricity price series
+
+A PriceSeries is a start time, an interval length (3600 s for hourly
+prices, 900 s for 15-minute prices) and a flat array('d') of prices. The
+statistics are computed once when the series is built, so min/max/avg are
+attribute reads and the rank of a price is a binary search. A series never
+changes, so cheapest-window results are cached on the series itself.
+"""
+
+from array import array
+from bisect import bisect_left
+from typing import *
+
+from timeparse import iso_datetime
+
+HOURLY = 3600
+QUARTER_HOURLY = 900
+
+
+class PriceSeries:
+    """Prices of consecutive intervals starting at start (epoch seconds)"""
+
+    __slots__ = ('start', 'resolution', 'prices', 'min', 'max', 'avg', '_sorted', '_windows')
+
+    def __init__(self, start: float, resolution: int = HOURLY, prices: Iterable[float] = ()):
+        self.start = start
+        self.resolution = resolution
+        self.prices = prices if isinstance(prices, array) else array('d', prices)
+        self._sorted = array('d', sorted(self.prices))
+        self._windows: Dict[Tuple[int, int], Optional[Tuple[float, float]]] = {}
+        if self.prices:
+            self.min = self._sorted[0]
+            self.max = self._sorted[-1]
+            self.avg = sum(self.prices) / len(self.prices)
+        else:
+            self.min = self.max = self.avg = 0.0
+
+    @classmethod
+    def from_points(cls, points: List[dict]) -> 'PriceSeries':
+        """Series of Tibber price points ({'startsAt': ISO timestamp, 'total': price}, in order)"""
+        points = [point for point in points if point.get('startsAt')]
+        if not points:
+            return cls(0.0)
+        start = iso_datetime(points[0]['startsAt']).timestamp()
+        resolution = HOURLY
+        if len(points) > 1:
+            resolution = int(iso_datetime(points[1]['startsAt']).timestamp() - start)
+        return cls(start, resolution, (point.get('total', 0) for point in points))
+
+    @property
+    def end(self) -> float:
+        """End of the last interval"""
+        return self.start + len(self.prices) * self.resolution
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def __eq__(self, other) -> bool:
+        return (isinstance(other, PriceSeries) and self.start == other.start
+                and self.resolution == other.resolution and self.prices == other.prices)
+
+    def __repr__(self):
+        return f"PriceSeries(start={self.start}, resolution={self.resolution}, {len(self.prices)} prices)"
+
+    def time_at(self, index: int) -> float:
+        """Start of the index-th interval"""
+        return self.start + index * self.resolution
+
+    def index_at(self, timestamp: float) -> int:
+        """Index of the interval containing timestamp, -1 if outside the series"""
+        if not self.prices or timestamp < self.start or timestamp >= self.end:
+            return -1
+        return int((timestamp - self.start) // self.resolution)
+
+    def price_at(self, timestamp: float) -> Optional[float]:
+        index = self.index_at(timestamp)
+        return self.prices[index] if index >= 0 else None
+
+    def rank(self, price: float) -> int:
+        """1-based position of price among the series' prices, cheapest first"""
+        return bisect_left(self._sorted, price) + 1
+
+    def cheapest_window(self, duration: float, after: float = None) -> Optional[Tuple[float, float]]:
+        """(start, average price) of the cheapest contiguous window of duration seconds
+
+        Only windows starting in or after the interval containing `after` and
+        ending within the series count; None if there is no such window.
+        """
+        count = max(1, -int(-duration // self.resolution))
+        first = 0 if after is None else max(0, int((after - self.start) // self.resolution))
+        key = (count, first)
+        if key not in self._windows:
+            self._windows[key] = self._find_window(count, first)
+        return self._windows[key]
+
+    def cheapest_windows(self, durations: Iterable[float], after: float = None) -> Dict[float, Tuple[float, float]]:
+        """cheapest_window for several durations; durations without a window are left out"""
+        windows = {}
+        for duration in durations:
+            window = self.cheapest_window(duration, after)
+            if window is not None:
+                windows[duration] = window
+        return windows
+
+    def _find_window(self, count: int, first: int) -> Optional[Tuple[float, float]]:
+        """Sliding-window sum over prices[first:], O(n)"""
+        prices = self.prices
+        if first + count > len(prices):
+            return None
+        total = best = sum(prices[first:first + count])
+        best_start = first
+        for i in range(first + count, len(prices)):
+            total += prices[i] - prices[i - count]
+            if total < best - 1e-12:
+                best, best_start = total, i - count + 1
+        return self.time_at(best_start), best / count
+
+    def slice(self, start: float, end: float) -> 'PriceSeries':
+        """Intervals overlapping [start, end)"""
+        first = max(0, int((start - self.start) // self.resolution))
+        last = min(len(self.prices), -int(-(end - self.start) // self.resolution))
+        if last <= first:
+            return PriceSeries(self.time_at(first), self.resolution)
+        return PriceSeries(self.time_at(first), self.resolution, self.prices[first:last])
+
+    def concat(self, other: 'PriceSeries') -> 'PriceSeries':
+        """This series followed by a directly adjoining one (e.g. today + tomorrow)"""
+        if not other:
+            return self
+        if not self:
+            return other
+        if other.resolution != self.resolution or other.start != self.end:
+            raise ValueError(f"{other!r} does not continue {self!r}")
+        return PriceSeries(self.start, self.resolution, self.prices + other.prices)
+
+    def to_json(self) -> dict:
+        return {'start': self.start, 'resolution': self.resolution, 'prices': self.prices.tolist()}
+
+    @classmethod
+    def from_json(cls, data: dict) -> 'PriceSeries':
+        return cls(data['start'], data['resolution'], data['prices'])
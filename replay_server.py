@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+
+"""Local stand-in for the KVV EFA departure monitor
+
+Serves recorded DM responses (by default mockdata.json) over HTTP so that
+development, load and latency tests run without the live endpoint. Latency,
+jitter and error rate are configurable, and the recorded departure times can
+be shifted so that the countdowns are relative to the current time.
+
+Usage:
+    python replay_server.py --port 8080 --latency 0.3 --jitter 0.1 --error-rate 0.05
+    KVV_BASE_URL=http://127.0.0.1:8080 python app.py
+"""
+
+import argparse
+import json
+import os
+import random
+import urllib.parse
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import sleep
+from typing import *
+
+DEFAULT_RECORDING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mockdata.json")
+
+
+def _efa_datetime(fields: dict) -> datetime:
+    return datetime(int(fields['year']), int(fields['month']), int(fields['day']),
+                    int(fields['hour']), int(fields['minute']))
+
+
+def _set_efa_datetime(fields: dict, value: datetime) -> None:
+    fields.update(year=str(value.year), month=str(value.month), day=str(value.day),
+                  hour=str(value.hour), minute=str(value.minute), weekday=str(value.isoweekday() % 7 + 1))
+
+
+def time_shift_response(data: dict, now: datetime) -> dict:
+    """Move all departure times of a recorded response so that it looks recorded at now
+
+    Countdowns are recomputed from the (real-time) departure relative to now.
+    The recording is modified in place.
+    """
+    now = now.replace(second=0, microsecond=0)
+    shift = now - _efa_datetime(data['dateTime'])
+    _set_efa_datetime(data['dateTime'], now)
+
+    for element in data.get('departureList') or []:
+        for key in ('dateTime', 'realDateTime'):
+            if key in element:
+                _set_efa_datetime(element[key], _efa_datetime(element[key]) + shift)
+        departure = _efa_datetime(element.get('realDateTime', element['dateTime']))
+        element['countdown'] = str(max(0, int((departure - now).total_seconds() // 60)))
+    return data
+
+
+class ReplayConfig:
+    """Behaviour of the stand-in server, may be changed while it is running"""
+
+    def __init__(self, recordings: Dict[str, str] = None, default_recording: str = DEFAULT_RECORDING,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 time_shift: bool = True, seed: int = None):
+        self.recordings = recordings or {}     # Stop id (name_dm) -> recorded response file
+        self.default_recording = default_recording
+        self.latency = latency                 # Seconds before the response is sent
+        self.jitter = jitter                   # Uniform +- seconds added to the latency
+        self.error_rate = error_rate           # Share of requests answered with HTTP 503
+        self.time_shift = time_shift           # Shift recorded departures to the current time
+        self.random = random.Random(seed)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """Answers every GET with the recording of the requested stop"""
+
+    def do_GET(self):
+        server: "ReplayServer" = self.server.replay
+        config = server.config
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+
+        with server.lock:
+            server.requests += 1
+            delay = max(0.0, config.latency + config.random.uniform(-config.jitter, config.jitter))
+            failed = config.random.random() < config.error_rate
+        sleep(delay)
+
+        if failed:
+            with server.lock:
+                server.errors += 1
+            self.send_error(503, "Replay server: simulated error")
+            return
+
+        stop_id = query.get('name_dm', [None])[0]
+        limit = query.get('limit', [None])[0]
+        body = server.response_body(stop_id, int(limit) if limit else None)
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer:
+    """Threaded HTTP server serving recorded EFA DM responses"""
+
+    def __init__(self, config: ReplayConfig = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or ReplayConfig()
+        self.lock = Lock()
+        self.requests = 0
+        self.errors = 0
+        self._recordings: Dict[str, bytes] = {}
+        self.httpd = ThreadingHTTPServer((host, port), ReplayHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        self.thread = None
+
+    @property
+    def base_url(self) -> str:
+        """Value for KVV_BASE_URL"""
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _recording(self, stop_id: Optional[str]) -> bytes:
+        path = self.config.recordings.get(stop_id, self.config.default_recording)
+        with self.lock:
+            if path not in self._recordings:
+                with open(path, 'rb') as f:
+                    self._recordings[path] = f.read()
+            return self._recordings[path]
+
+    def response_body(self, stop_id: Optional[str], limit: Optional[int] = None) -> bytes:
+        """Recorded response of a stop, time-shifted and cut to the requested limit"""
+        raw = self._recording(stop_id)
+        if not self.config.time_shift and limit is None:
+            return raw
+
+        data = json.loads(raw)
+        if self.config.time_shift:
+            time_shift_response(data, datetime.now())
+        if limit is not None and data.get('departureList'):
+            data['departureList'] = data['departureList'][:limit]
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def start(self) -> "ReplayServer":
+        self.thread = Thread(target=self.httpd.serve_forever, name="replay-server", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the KVV EFA departure monitor")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--recording', default=DEFAULT_RECORDING, help="Recorded DM response (JSON)")
+    parser.add_argument('--stop', action='append', default=[], metavar='ID=FILE',
+                        help="Recording for a specific stop id, may be given several times")
+    parser.add_argument('--latency', type=float, default=0.0, help="Response delay in seconds")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Random +- seconds on the delay")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Share of requests failing with 503")
+    parser.add_argument('--no-time-shift', action='store_true', help="Serve the recorded times unchanged")
+    args = parser.parse_args()
+
+    config = ReplayConfig(recordings=dict(entry.split('=', 1) for entry in args.stop),
+                          default_recording=args.recording, latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, time_shift=not args.no_time_shift)
+    server = ReplayServer(config, args.host, args.port)
+    print(f"🚏 KVV replay server on {server.base_url}")
+    print(f"   Start the app with KVV_BASE_URL={server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {server.requests} requests, {server.errors} simulated errors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""Last-known-good snapshot of KVV and Tibber data on disk
+
+Every successful fetch is written atomically to a compact JSON file. At
+startup (and while upstream sources are down) the app renders from this
+snapshot instead of waiting for the network.
+"""
+
+import json
+import os
+import tempfile
+from threading import Lock
+from time import time
+from typing import *
+
+from kvv_api import Departure
+from price_series import PriceSeries
+
+SNAPSHOT_PATH = os.getenv("KVV_SNAPSHOT_PATH",
+                          os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot.json"))
+SNAPSHOT_VERSION = 3
+
+
+def _departure_to_row(departure: Departure) -> list:
+    return [departure.line, departure.destination, departure.platform, departure.planned_time,
+            departure.real_time, departure.delay, departure.is_realtime, departure.walk_minutes]
+
+
+def _departure_from_row(row: list) -> Departure:
+    return Departure(*row)
+
+
+def _encode(value: Any) -> dict:
+    """JSON encoding of the non-JSON types in the Tibber data"""
+    if isinstance(value, PriceSeries):
+        return {'__price_series__': value.to_json()}
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _decode(obj: dict) -> Any:
+    if '__price_series__' in obj:
+        return PriceSeries.from_json(obj['__price_series__'])
+    return obj
+
+
+class SnapshotStore:
+    """Keeps the snapshot in memory and rewrites the file atomically on every update"""
+
+    def __init__(self, path: str = SNAPSHOT_PATH):
+        self.path = path
+        self.lock = Lock()
+        self.data = {'version': SNAPSHOT_VERSION, 'transit': {}, 'tibber': None}
+        self.load()
+
+    def load(self) -> None:
+        """Load the snapshot file; a missing or corrupt file leaves the snapshot empty"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f, object_hook=_decode)
+            if data.get('version') == SNAPSHOT_VERSION:
+                self.data = data
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Ignoring unreadable snapshot {self.path}: {e}")
+
+    def get_transit(self, source: str) -> Optional[Tuple[float, Dict[str, List[Departure]]]]:
+        """(saved_at, direction -> departures) of a stop request source, or None"""
+        entry = self.data['transit'].get(source)
+        if not entry:
+            return None
+        return entry['saved_at'], {direction: [_departure_from_row(row) for row in rows]
+                                   for direction, rows in entry['boards'].items()}
+
+    def get_tibber(self) -> Optional[Tuple[float, Any]]:
+        """(saved_at, tibber display data), or None"""
+        entry = self.data['tibber']
+        if not entry:
+            return None
+        return entry['saved_at'], entry['data']
+
+    def get_history(self) -> Optional[dict]:
+        """Daily energy history (DailyHistory.to_json), or None"""
+        return self.data.get('history')
+
+    def save_history(self, history: dict) -> None:
+        with self.lock:
+            self.data['history'] = history
+            self._write()
+
+    def save_transit(self, source: str, boards: Dict[str, List[Departure]]) -> None:
+        with self.lock:
+            self.data['transit'][source] = {
+                'saved_at': time(),
+                'boards': {direction: [_departure_to_row(d) for d in departures]
+                           for direction, departures in boards.items()},
+            }
+            self._write()
+
+    def save_tibber(self, tibber_data: Any) -> None:
+        with self.lock:
+            self.data['tibber'] = {'saved_at': time(), 'data': tibber_data}
+            self._write()
+
+    def _write(self) -> None:
+        """Write to a temporary file in the same directory, then rename it over the snapshot"""
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix='.snapshot-', dir=directory)
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self.data, f, ensure_ascii=False, separators=(',', ':'), default=_encode)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError as e:
+            print(f"⚠️  Could not write snapshot {self.path}: {e}")
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+"""Data-source registry with a central TTL scheduler
+
+Every piece of screen data (the departures of a direction, the energy data,
+the RMV trips per destination, the daily consumption history) is a
+DataSource with a blocking fetch function and a time-to-live picked from
+the data just fetched. The SourceRegistry starts the fetches of all sources
+whose TTL ran out on the acquisition loop, whether their screen is visible
+or not, and never refetches a source that is still fresh. The screens only
+read the shared values, so a screen switch shows current data at once.
+"""
+
+import queue
+from datetime import datetime
+from functools import partial
+from itertools import chain
+from threading import Event
+from time import time
+from typing import *
+
+from acquisition import AcquisitionLoop, AcquisitionResult, Job
+from kvv_api import STATION_CONFIG, Departure, fetch_stop_departures, get_stop_requests, merge_departures
+from polling import PollScheduler, TRANSIT_ERROR_INTERVAL
+from trips import TRIP_DESTINATIONS, TRIP_MIN_TTL, fetch_trips, trip_ttl
+from upstream import CircuitOpenError
+
+DEFAULT_RETRY_INTERVAL = 60  # Seconds until a failed source is fetched again
+
+
+class DataSource:
+    """A fetchable piece of screen data with its time-to-live and fetch statistics"""
+
+    def __init__(self, name: str, upstream: str, fetch: Callable[[], Any], ttl: Callable[[Any], float],
+                 on_update: Callable[[Any], None] = None, retry_interval: float = DEFAULT_RETRY_INTERVAL):
+        self.name = name
+        self.upstream = upstream      # Upstream source name, selects deadline and circuit breaker
+        self.fetch = fetch            # Blocking fetch, runs on the acquisition loop
+        self.ttl = ttl                # Seconds a freshly fetched value stays fresh
+        self.on_update = on_update    # Called with every new value (e.g. to write the snapshot)
+        self.retry_interval = retry_interval
+
+        self.value: Any = None
+        self.updated_at: Optional[float] = None      # Wall-clock time the value was fetched
+        self.error: Optional[BaseException] = None   # Error of the last fetch, None if it succeeded
+        self.stale = False            # Value is from the snapshot or its refresh failed
+        self.pending = False          # Fetch in flight
+
+        self.fetches = 0
+        self.failures = 0
+        self.fetch_seconds = 0.0      # Total time spent in fetches
+        self.last_elapsed: Optional[float] = None
+
+
+class SourceStatus(NamedTuple):
+    name: str
+    age: Optional[float]           # Seconds since the value was fetched, None without a value
+    due_in: float                  # Seconds until the next fetch (0 if due or in flight)
+    stale: bool
+    fetches: int
+    failures: int
+    last_elapsed: Optional[float]  # Seconds of the last fetch
+    mean_elapsed: Optional[float]
+
+
+class _WakingQueue(queue.Queue):
+    """Result queue that sets an event on every result, so a waiting loop wakes up right away"""
+
+    def __init__(self, wake: Event):
+        super().__init__()
+        self.wake = wake
+
+    def put(self, item, block=True, timeout=None):
+        super().put(item, block, timeout)
+        self.wake.set()
+
+
+class SourceRegistry:
+    """All data sources of the app; refreshes exactly the ones whose TTL ran out
+
+    If wake is given, it is set whenever a fetch finished (see collect).
+    clock (epoch seconds) is the wall clock, replaced by a virtual one in replays.
+    """
+
+    def __init__(self, acquisition: AcquisitionLoop, scheduler: PollScheduler = None, wake: Event = None,
+                 clock: Callable[[], float] = time):
+        self.acquisition = acquisition
+        self.scheduler = scheduler or PollScheduler()
+        self.clock = clock
+        self.sources: Dict[str, DataSource] = {}
+        self.results: "queue.Queue[AcquisitionResult]" = queue.Queue() if wake is None else _WakingQueue(wake)
+
+    def register(self, source: DataSource) -> DataSource:
+        self.sources[source.name] = source
+        return source
+
+    def __getitem__(self, name: str) -> DataSource:
+        return self.sources[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.sources
+
+    def value(self, name: str) -> Any:
+        return self.sources[name].value
+
+    def load(self, name: str, value: Any, saved_at: float) -> None:
+        """Warm start: show a snapshot value (marked stale) until the first fetch"""
+        source = self.sources[name]
+        source.value = value
+        source.updated_at = saved_at
+        source.stale = True
+
+    def put(self, name: str, value: Any) -> None:
+        """Store a value that arrived without a fetch (pushed)
+
+        A pushed value keeps the source fresh; on_update runs only when the
+        TTL ran out, so e.g. the snapshot is not rewritten on every push.
+        """
+        source = self.sources[name]
+        source.value = value
+        source.updated_at = self.clock()
+        source.error = None
+        source.stale = False
+        if self.is_due(name):
+            self._updated(source, value)
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.clock())
+
+    def is_due(self, name: str) -> bool:
+        return not self.sources[name].pending and self.scheduler.is_due(name, self.now())
+
+    def seconds_until_due(self) -> float:
+        """Seconds until the next source is due (inf if none is waiting for its TTL)"""
+        now = self.now()
+        waiting = [self.scheduler.seconds_until_due(name, now) for name, source in self.sources.items()
+                   if not source.pending]
+        return min(waiting, default=float('inf'))
+
+    def refresh(self, names: Iterable[str] = None) -> List[str]:
+        """Start the fetches of all due sources (of names) concurrently; returns the sources started"""
+        due = [name for name in (self.sources if names is None else names) if self.is_due(name)]
+        for name in due:
+            self.sources[name].pending = True
+        if due:
+            self.acquisition.submit({name: Job(self.sources[name].upstream, self.sources[name].fetch)
+                                     for name in due}, self.results)
+        return due
+
+    def collect(self, timeout: float = 0) -> Set[str]:
+        """Apply all finished fetches, waiting up to timeout for the first; returns the sources updated"""
+        updated = set()
+        try:
+            result = self.results.get(timeout=timeout) if timeout > 0 else self.results.get_nowait()
+            while True:
+                self._apply(result)
+                updated.add(result.key)
+                result = self.results.get_nowait()
+        except queue.Empty:
+            return updated
+
+    def fetch(self, names: Iterable[str] = None) -> Set[str]:
+        """Refresh the due sources (of names) and block until their fetches finished"""
+        started = set(self.refresh(names))
+        updated = set()
+        while not started <= updated:
+            updated |= self.collect(timeout=1)
+        return updated
+
+    def is_waiting(self, names: Iterable[str]) -> bool:
+        """True while a source of names has nothing to show and its first fetch is in flight"""
+        return any(self.sources[name].value is None and self.sources[name].pending for name in names)
+
+    def _apply(self, result: AcquisitionResult) -> None:
+        source = self.sources[result.key]
+        source.pending = False
+        source.fetches += 1
+        source.fetch_seconds += result.elapsed
+        source.last_elapsed = result.elapsed
+
+        if result.error is None:
+            source.value = result.value
+            source.updated_at = self.clock()
+            source.error = None
+            source.stale = False
+            delay = self._updated(source, result.value)
+            print(f"⏲️  {source.name}: fetched in {result.elapsed:.1f}s, next fetch in {int(delay)}s")
+            return
+
+        source.failures += 1
+        source.error = result.error
+        source.stale = True
+        if isinstance(result.error, CircuitOpenError):
+            # Upstream is down: keep serving the old value until the breaker lets a retry through
+            print(f"⚠️  {result.error}")
+            delay = result.error.retry_in
+        else:
+            print(f"❌ Error fetching {source.name} from {source.upstream}: {result.error}")
+            delay = source.retry_interval
+        self.scheduler.schedule_after(source.name, delay, self.now())
+
+    def _updated(self, source: DataSource, value: Any) -> float:
+        delay = self.scheduler.schedule_after(source.name, source.ttl(value), self.now())
+        if source.on_update is not None:
+            source.on_update(value)
+        return delay
+
+    def status(self) -> List[SourceStatus]:
+        """Freshness and fetch cost of every source"""
+        now = self.clock()
+        return [SourceStatus(
+            name=source.name,
+            age=None if source.updated_at is None else now - source.updated_at,
+            due_in=0.0 if source.pending else self.scheduler.seconds_until_due(source.name, self.now()),
+            stale=source.stale,
+            fetches=source.fetches,
+            failures=source.failures,
+            last_elapsed=source.last_elapsed,
+            mean_elapsed=source.fetch_seconds / source.fetches if source.fetches else None,
+        ) for source in self.sources.values()]
+
+    def print_status(self) -> None:
+        print("📊 Data sources (age / next fetch / fetches / failures / mean fetch time):")
+        for status in self.status():
+            age = "-" if status.age is None else f"{int(status.age)}s"
+            mean = "-" if status.mean_elapsed is None else f"{status.mean_elapsed:.2f}s"
+            marker = " (stale)" if status.stale else ""
+            print(f"   {status.name:<16} {age:>7} {int(status.due_in):>6}s {status.fetches:>5} "
+                  f"{status.failures:>4} {mean:>7}{marker}")
+
+
+def stop_sources(scheduler: PollScheduler, exclude_destinations: Set[str] = set(),
+                 clock: Callable[[], float] = time) -> Tuple[List[DataSource], Dict[str, List[str]]]:
+    """One KVV source per distinct stop request, and the names of the sources of each direction board
+
+    Boards at the same stop (e.g. both platforms) share a source; its value
+    maps each direction to its departures (see fetch_stop_departures).
+    """
+    sources = []
+    direction_sources: Dict[str, List[str]] = {direction: [] for direction in STATION_CONFIG}
+    for key, boards in get_stop_requests().items():
+        name = f"KVV:{key}"
+        sources.append(DataSource(
+            name, 'kvv', partial(fetch_stop_departures, boards, exclude_destinations),
+            ttl=partial(_stop_ttl, scheduler, name, clock), retry_interval=TRANSIT_ERROR_INTERVAL))
+        for direction in dict(boards):
+            direction_sources[direction].append(name)
+    return sources, direction_sources
+
+
+def _stop_ttl(scheduler: PollScheduler, name: str, clock: Callable[[], float],
+              boards: Dict[str, List[Departure]]) -> float:
+    return scheduler.transit_ttl(name, list(chain(*boards.values())), datetime.fromtimestamp(clock()))
+
+
+def trip_sources(destinations: List[dict] = None, clock: Callable[[], float] = time) -> List[DataSource]:
+    """One RMV source per destination of the connections screen, fresh until its first connection leaves"""
+    if destinations is None:
+        destinations = TRIP_DESTINATIONS
+    return [DataSource(f"TRIPS:{destination['id']}", 'rmv', partial(fetch_trips, destination),
+                       ttl=lambda trips: trip_ttl(trips, clock()), retry_interval=TRIP_MIN_TTL)
+            for destination in destinations]
+
+
+def board_departures(registry: SourceRegistry, names: Iterable[str], direction: str) -> Optional[List[Departure]]:
+    """Departures of a direction board merged from its stop sources, None while none of them has any
+
+    A stop that failed is left out as long as another stop of the board has departures.
+    """
+    boards = [registry.value(name)[direction] for name in names if direction in (registry.value(name) or {})]
+    return merge_departures(boards) if boards else None
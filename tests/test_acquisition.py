@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+"""Test script for the asyncio data-acquisition layer"""
+
+import time
+from functools import partial
+
+import acquisition
+import upstream
+from acquisition import AcquisitionLoop, Job
+
+
+def slow_source(delay: float, value: str) -> str:
+    time.sleep(delay)
+    return value
+
+
+def failing_source():
+    raise ConnectionError("upstream down")
+
+
+def test_concurrent_fetch():
+    """Test that a refresh takes max(source) instead of sum(sources)"""
+    print("🧪 Testing concurrent acquisition...")
+    loop = AcquisitionLoop()
+    try:
+        jobs = {
+            'kvv': Job('kvv', partial(slow_source, 0.3, 'departures')),
+            'price': Job('home_assistant', partial(slow_source, 0.3, 'price')),
+            'power': Job('home_assistant', partial(slow_source, 0.2, 'power')),
+            'cost': Job('home_assistant', failing_source),
+        }
+        start = time.monotonic()
+        results = loop.fetch(jobs)
+        elapsed = time.monotonic() - start
+
+        print(f"  4 sources (0.8 s sequential) done in {elapsed:.2f}s")
+        assert elapsed < 0.6
+        assert results['kvv'].value == 'departures'
+        assert results['power'].value == 'power'
+        assert isinstance(results['cost'].error, ConnectionError)
+    finally:
+        loop.stop()
+
+
+def test_source_deadline():
+    """Test that a hanging source is cut off at its deadline"""
+    print("\n⏱️  Testing per-source deadline...")
+    acquisition.SOURCE_DEADLINES['test-hang'] = 0.2
+    loop = AcquisitionLoop()
+    try:
+        start = time.monotonic()
+        result = loop.fetch({'hang': Job('test-hang', partial(slow_source, 2, 'late'))})['hang']
+        elapsed = time.monotonic() - start
+
+        print(f"  Gave up after {elapsed:.2f}s: {result.error}")
+        assert isinstance(result.error, TimeoutError)
+        assert elapsed < 0.5
+    finally:
+        loop.stop()
+        del acquisition.SOURCE_DEADLINES['test-hang']
+
+
+def test_deadlines_cover_upstream_timeouts():
+    """Test that no job is given up while its upstream requests may still be running"""
+    print("\n⏳ Testing deadlines against the upstream timeouts...")
+    for source, timeouts in upstream.SOURCE_TIMEOUTS.items():
+        worst_case = timeouts.worst_case * acquisition.REQUEST_ROUNDS.get(source, 1)
+        print(f"  {source}: {worst_case:g}s worst case, {acquisition.SOURCE_DEADLINES[source]}s deadline")
+        assert acquisition.SOURCE_DEADLINES[source] > worst_case
+    assert acquisition.DEFAULT_DEADLINE > upstream.DEFAULT_TIMEOUTS.worst_case
+
+
+def main():
+    print("🚀 Acquisition Test Suite")
+    print("=" * 60)
+    test_concurrent_fetch()
+    test_source_deadline()
+    test_deadlines_cover_upstream_timeouts()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
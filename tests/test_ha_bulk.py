@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+
+"""Test script for the single-request Home Assistant entity fetch"""
+
+import json
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import home_assistant_api
+from home_assistant_api import (
+    HomeAssistantAPI, TIBBER_ENTITIES, TIBBER_GRAPH_ENTITIES, get_current_power, get_tibber_graph_data
+)
+from upstream import get_breaker
+
+STATES = [{'entity_id': entity_id, 'state': str(i), 'attributes': {}}
+          for i, entity_id in enumerate(TIBBER_ENTITIES.values())]
+STATES += [{'entity_id': f"sensor.other_{i}", 'state': 'on', 'attributes': {}} for i in range(200)]
+
+
+class StatesHandler(BaseHTTPRequestHandler):
+    paths = []
+    bulk_status = 200
+
+    def do_GET(self):
+        StatesHandler.paths.append(self.path)
+        if self.path == '/api/states':
+            if StatesHandler.bulk_status != 200:
+                self.send_error(StatesHandler.bulk_status)
+                return
+            body = STATES
+        else:
+            entity_id = self.path.rsplit('/', 1)[-1]
+            body = next(state for state in STATES if state['entity_id'] == entity_id)
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StatesHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    StatesHandler.paths = []
+    StatesHandler.bulk_status = 200
+    home_assistant_api._bulk_supported = True
+    get_breaker('home_assistant').record_success()  # Other test files may have opened it
+    return server
+
+
+def test_bulk_fetch():
+    """Test that all Tibber entities come from one /api/states request"""
+    print("🧪 Testing bulk entity fetch...")
+    server = start_server()
+    try:
+        api = HomeAssistantAPI(f"http://127.0.0.1:{server.server_port}", "token")
+        states = api.get_multiple_entities(list(TIBBER_ENTITIES.values()))
+        print(f"  {len(states)} entities in {len(StatesHandler.paths)} request(s)")
+        assert StatesHandler.paths == ['/api/states']
+        assert [states[entity_id]['state'] for entity_id in TIBBER_ENTITIES.values()] == \
+            [str(i) for i in range(len(TIBBER_ENTITIES))]
+    finally:
+        server.shutdown()
+
+
+def test_parallel_fallback():
+    """Test the per-entity fallback when the bulk endpoint is refused"""
+    print("\n🔀 Testing per-entity fallback...")
+    server = start_server()
+    StatesHandler.bulk_status = 403
+    try:
+        api = HomeAssistantAPI(f"http://127.0.0.1:{server.server_port}", "token")
+        entity_ids = [TIBBER_ENTITIES[key] for key in TIBBER_GRAPH_ENTITIES]
+        states = api.get_states(entity_ids)
+        assert all(states[entity_id]['state'] != 'unavailable' for entity_id in entity_ids)
+
+        # The refusal is remembered: no further bulk attempts
+        StatesHandler.paths = []
+        api.get_states(entity_ids)
+        print(f"  {len(entity_ids)} entities in {len(StatesHandler.paths)} requests")
+        assert '/api/states' not in StatesHandler.paths
+        assert len(StatesHandler.paths) == len(entity_ids)
+    finally:
+        server.shutdown()
+        StatesHandler.bulk_status = 200
+        home_assistant_api._bulk_supported = True
+
+
+def test_transient_error_keeps_bulk():
+    """Test that a 503 (e.g. Home Assistant restarting) fails the fetch but keeps using the bulk endpoint"""
+    print("\n🔁 Testing transient bulk errors...")
+    server = start_server()
+    StatesHandler.bulk_status = 503
+    try:
+        api = HomeAssistantAPI(f"http://127.0.0.1:{server.server_port}", "token")
+        api.get_states([TIBBER_ENTITIES['current_power']])
+        assert home_assistant_api._bulk_supported
+        assert StatesHandler.paths == ['/api/states']
+
+        StatesHandler.bulk_status = 200
+        StatesHandler.paths = []
+        api.get_states([TIBBER_ENTITIES['current_power']])
+        assert StatesHandler.paths == ['/api/states']
+    finally:
+        server.shutdown()
+        StatesHandler.bulk_status = 200
+        get_breaker('home_assistant').record_success()
+
+
+def test_current_power_is_never_a_stale_reading():
+    """Test that a failed power request gives None instead of the last known state"""
+    print("\n⚡ Testing current power reads...")
+    server = start_server()
+    saved = home_assistant_api._api
+    home_assistant_api._api = HomeAssistantAPI(f"http://127.0.0.1:{server.server_port}", "token")
+    try:
+        watts = get_current_power()
+        expected = list(TIBBER_ENTITIES).index('current_power')
+        assert watts == expected and StatesHandler.paths == [f"/api/states/{TIBBER_ENTITIES['current_power']}"]
+
+        server.shutdown()
+        server.server_close()
+        assert get_current_power() is None
+    finally:
+        home_assistant_api._api = saved
+        get_breaker('home_assistant').record_success()
+
+
+def test_strict_graph_data_raises():
+    """Test that the strict energy fetch raises on errors, where the lenient one gives placeholder data"""
+    print("\n🚫 Testing strict energy fetches...")
+    server = start_server()
+    saved = home_assistant_api._api
+    home_assistant_api._api = HomeAssistantAPI(f"http://127.0.0.1:{server.server_port}", "token")
+    try:
+        assert 'sensor.unknown' not in home_assistant_api._api.fetch_states(['sensor.unknown'])
+        try:
+            get_tibber_graph_data(strict=True)  # The test states carry no prices
+            assert False, "no error without prices"
+        except ValueError:
+            pass
+        assert get_tibber_graph_data()['price_data']['stats']['total_hours'] == 0  # Lenient: empty prices
+
+        StatesHandler.bulk_status = 503
+        try:
+            get_tibber_graph_data(strict=True)
+            assert False, "no error on a 503"
+        except OSError:
+            pass
+        assert home_assistant_api._bulk_supported
+    finally:
+        server.shutdown()
+        StatesHandler.bulk_status = 200
+        home_assistant_api._api = saved
+        get_breaker('home_assistant').record_success()
+
+
+def main():
+    print("🚀 Home Assistant Bulk Fetch Test Suite")
+    print("=" * 60)
+    test_bulk_fetch()
+    test_parallel_fallback()
+    test_transient_error_keeps_bulk()
+    test_current_power_is_never_a_stale_reading()
+    test_strict_graph_data_raises()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
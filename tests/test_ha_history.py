@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""Test script for the daily Home Assistant history import"""
+
+import io
+import json
+import urllib.parse
+from datetime import date, datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+from ha_history import (DailyHistory, HISTORY_DAY_OFFSET, history_chart_data, history_ttl, iter_history_states,
+                        refresh_history)
+from home_assistant_api import HomeAssistantAPI, TIBBER_ENTITIES
+
+CONSUMPTION = TIBBER_ENTITIES['today_consumption']
+COST = TIBBER_ENTITIES['today_cost']
+
+
+def day_states(day: date, entity_id: str, step: float) -> list:
+    """Counter over a day in 10-minute steps, reset at local midnight"""
+    midnight = datetime.combine(day, datetime.min.time()).astimezone()
+    states = [{'state': f"{i * step:.3f}", 'last_changed': (midnight + timedelta(minutes=10 * i))
+               .astimezone(timezone.utc).isoformat()} for i in range(1, 144)]
+    states[0]['entity_id'] = entity_id
+    states.insert(1, {'state': 'unavailable', 'last_changed': states[0]['last_changed']})
+    return states
+
+
+class HistoryHandler(BaseHTTPRequestHandler):
+    paths = []
+    recorded_until = date.max  # Days after this have no states (recorder down)
+
+    def do_GET(self):
+        HistoryHandler.paths.append(self.path)
+        url = urllib.parse.urlsplit(self.path)
+        query = urllib.parse.parse_qs(url.query)
+        start = datetime.fromisoformat(urllib.parse.unquote(url.path.rsplit('/', 1)[-1])).date()
+        end = datetime.fromisoformat(query['end_time'][0]).date()
+        days = [start + timedelta(days=i) for i in range((end - start).days)
+                if start + timedelta(days=i) <= HistoryHandler.recorded_until]
+
+        body = []
+        for entity_id in query['filter_entity_id'][0].split(','):
+            states = []
+            for day in days:
+                states += day_states(day, entity_id, 0.1 if entity_id == CONSUMPTION else 0.03)
+            for state in states[1:]:
+                state.pop('entity_id', None)
+            body.append(states)
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_stream_parser():
+    """Test that states are decoded across chunk boundaries and assigned to their entity"""
+    print("🧪 Testing history stream parser...")
+    body = json.dumps([
+        [{'entity_id': 'sensor.a', 'state': '1', 'last_changed': 'x'}, {'state': 'ä€', 'last_changed': 'y'}],
+        [],
+        [{'entity_id': 'sensor.b', 'state': '3', 'last_changed': 'z'}],
+    ], ensure_ascii=False).encode('utf-8')
+    for chunk_size in (1, 3, 7, 1 << 16):
+        states = list(iter_history_states(io.BytesIO(body), chunk_size))
+        assert [(entity_id, state['state']) for entity_id, state in states] == \
+            [('sensor.a', '1'), ('sensor.a', 'ä€'), ('sensor.b', '3')]
+    assert list(iter_history_states(io.BytesIO(b'[]'))) == []
+
+
+def test_missing_days():
+    """Test that only days after the last complete day are requested"""
+    print("\n📅 Testing missing day ranges...")
+    history = DailyHistory(keep_days=30)
+    today = date(2025, 9, 23)
+    assert history.missing_range(today) == (date(2025, 8, 24), today)
+
+    history.add('today_consumption', '2025-08-01', 5.0)
+    history.add('today_consumption', '2025-09-20', 7.0)
+    history.add('today_consumption', '2025-09-20', 3.0)
+    history.mark_complete(date(2025, 9, 22), today)
+    assert history.missing_range(today) is None
+    assert history.missing_range(today + timedelta(days=2)) == (date(2025, 9, 23), date(2025, 9, 25))
+    assert history.days == {'2025-09-20': {'today_consumption': 7.0}}
+
+    restored = DailyHistory.from_json(json.loads(json.dumps(history.to_json())))
+    assert restored.days == history.days and restored.complete_until == '2025-09-22'
+
+    # Fetched again right after the day is over
+    assert history_ttl(datetime(2025, 9, 23, 23, 0)) == 3600 + HISTORY_DAY_OFFSET
+
+
+def test_refresh_fetches_only_the_tail():
+    """Test the first import and an incremental refresh against a local Home Assistant stand-in"""
+    print("\n📚 Testing history import...")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), HistoryHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    HistoryHandler.paths = []
+    try:
+        api = HomeAssistantAPI(f"http://127.0.0.1:{server.server_port}", "token")
+        history = DailyHistory(keep_days=10)
+        now = datetime(2025, 9, 23, 14, 0)
+
+        assert refresh_history(history, api, now)
+        assert len(HistoryHandler.paths) == 1
+        assert 'minimal_response' in HistoryHandler.paths[0] and 'skip_initial_state' in HistoryHandler.paths[0]
+        assert len(history.days) == 10
+        assert abs(history.days['2025-09-22']['today_consumption'] - 14.3) < 1e-9
+        assert abs(history.days['2025-09-22']['today_cost'] - 4.29) < 1e-9
+
+        # Same day: nothing to fetch
+        assert not refresh_history(history, api, now)
+        assert len(HistoryHandler.paths) == 1
+
+        # Two days later only the two new complete days are fetched
+        assert refresh_history(history, api, now + timedelta(days=2))
+        assert len(HistoryHandler.paths) == 2
+        start = urllib.parse.unquote(urllib.parse.urlsplit(HistoryHandler.paths[1]).path.rsplit('/', 1)[-1])
+        assert start.startswith("2025-09-23T00:00:00")
+        assert sorted(history.days)[-1] == '2025-09-24' and len(history.days) == 10
+        print(f"  {len(history.days)} days from {len(HistoryHandler.paths)} requests")
+
+        # Days without any states are not taken as complete and fetched again
+        HistoryHandler.recorded_until = date(2025, 9, 25)
+        assert refresh_history(history, api, now + timedelta(days=4))
+        assert history.complete_until == '2025-09-25'
+        HistoryHandler.recorded_until = date.max
+        assert refresh_history(history, api, now + timedelta(days=4))
+        start = urllib.parse.unquote(urllib.parse.urlsplit(HistoryHandler.paths[-1]).path.rsplit('/', 1)[-1])
+        assert start.startswith("2025-09-26T00:00:00") and history.complete_until == '2025-09-26'
+
+        chart = history_chart_data(history, {'today_consumption': '4.11', 'today_cost': 'unavailable'},
+                                   7, now + timedelta(days=2))
+        assert [day for day, _, _ in chart['days']][-2:] == ['2025-09-24', '2025-09-25']
+        assert chart['days'][-1] == ['2025-09-25', 4.11, None]
+        assert abs(chart['total_kwh'] - (6 * 14.3 + 4.11)) < 1e-9
+    finally:
+        HistoryHandler.recorded_until = date.max
+        server.shutdown()
+
+
+def main():
+    print("🚀 Home Assistant History Test Suite")
+    print("=" * 60)
+    test_stream_parser()
+    test_missing_days()
+    test_refresh_fetches_only_the_tail()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
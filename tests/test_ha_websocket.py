@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""Test script for pushed Home Assistant updates, against a local stand-in WebSocket server"""
+
+import json
+import socketserver
+import time
+from queue import Queue
+from threading import Thread
+
+from ha_websocket import (
+    EntityStore, HomeAssistantStream, OPCODE_TEXT, encode_frame, parse_frame, websocket_accept
+)
+
+POWER = 'sensor.tibber_pulse_power'
+PRICE = 'sensor.tibber_price'
+
+
+class StandInHandler(socketserver.BaseRequestHandler):
+    """Minimal Home Assistant WebSocket API: auth, subscribe_entities, then scripted events"""
+
+    def setup(self):
+        self.buffer = b''
+
+    def receive(self) -> dict:
+        while True:
+            frame = parse_frame(self.buffer)
+            if frame is not None:
+                self.buffer = self.buffer[frame[3]:]
+                return json.loads(frame[2])
+            self.buffer += self.request.recv(65536)
+
+    def send(self, message: dict) -> None:
+        self.request.sendall(encode_frame(OPCODE_TEXT, json.dumps(message).encode(), mask=False))
+
+    def handle(self):
+        while b'\r\n\r\n' not in self.buffer:
+            self.buffer += self.request.recv(65536)
+        head, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        key = next(line.split(':', 1)[1].strip() for line in head.decode().split('\r\n')
+                   if line.lower().startswith('sec-websocket-key'))
+        self.request.sendall((f"HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                              f"Connection: Upgrade\r\nSec-WebSocket-Accept: {websocket_accept(key)}\r\n\r\n").encode())
+
+        self.send({'type': 'auth_required'})
+        if self.receive().get('access_token') != 'token':
+            self.send({'type': 'auth_invalid', 'message': 'Invalid access token'})
+            return
+        self.send({'type': 'auth_ok'})
+
+        subscription = self.receive()
+        self.server.subscriptions.put(subscription)
+        self.send({'id': subscription['id'], 'type': 'result', 'success': True, 'result': None})
+        for event in self.server.events:
+            self.send({'id': subscription['id'], 'type': 'event', 'event': event})
+            time.sleep(0.05)
+        time.sleep(1)
+
+
+def start_server(events: list) -> socketserver.ThreadingTCPServer:
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', 0), StandInHandler)
+    server.daemon_threads = True
+    server.events = events
+    server.subscriptions = Queue()
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_entity_store():
+    """Test applying added, changed and removed entities"""
+    print("🧪 Testing entity store...")
+    store = EntityStore()
+    store.apply_event({'a': {POWER: {'s': '160', 'a': {'unit_of_measurement': 'W'}, 'lc': 1758612000.0}}})
+    before = store.get(POWER)
+
+    changed = store.apply_event({'c': {POWER: {'+': {'s': '180', 'lu': 1758612005.0, 'a': {'max': 900}}}}})
+    assert changed == {POWER}
+    state = store.get(POWER)
+    assert state['state'] == '180'
+    assert state['attributes'] == {'unit_of_measurement': 'W', 'max': 900}
+    assert state['last_updated'] > state['last_changed']
+    assert before['state'] == '160'  # Earlier snapshots are not mutated
+
+    store.apply_event({'c': {POWER: {'-': {'a': ['max']}}}})
+    assert store.get(POWER)['attributes'] == {'unit_of_measurement': 'W'}
+    store.apply_event({'r': [POWER]})
+    assert store.get(POWER) is None
+
+
+def test_stream_against_stand_in():
+    """Test subscribing and receiving pushed changes from a local WebSocket server"""
+    print("\n📡 Testing WebSocket subscription...")
+    events = [
+        {'a': {POWER: {'s': '160', 'a': {}, 'lc': 1758612000.0},
+               PRICE: {'s': '0.3243', 'a': {'price_level': 'NORMAL'}, 'lc': 1758610800.0}}},
+        {'c': {POWER: {'+': {'s': '175', 'lc': 1758612003.0}}}},
+        {'c': {POWER: {'+': {'s': '190', 'lc': 1758612006.0}}}},
+    ]
+    server = start_server(events)
+    changes = Queue()
+    stream = HomeAssistantStream(f"http://127.0.0.1:{server.server_address[1]}", 'token', [POWER, PRICE],
+                                 on_change=changes.put).start()
+    try:
+        assert server.subscriptions.get(timeout=5) == {
+            'id': 1, 'type': 'subscribe_entities', 'entity_ids': [POWER, PRICE]}
+
+        received = [changes.get(timeout=5) for _ in events]
+        print(f"  Changes pushed: {received}")
+        assert received[0] == {POWER, PRICE}
+        assert received[2] == {POWER}
+        assert stream.is_live()
+        assert stream.store.get(POWER)['state'] == '190'
+        assert stream.store.get(PRICE)['attributes']['price_level'] == 'NORMAL'
+    finally:
+        stream.stop()
+        server.shutdown()
+
+
+def test_auth_failure():
+    """Test that a rejected token does not mark the stream live"""
+    print("\n🔒 Testing rejected token...")
+    server = start_server([])
+    stream = HomeAssistantStream(f"http://127.0.0.1:{server.server_address[1]}", 'wrong', [POWER]).start()
+    try:
+        time.sleep(0.5)
+        assert not stream.is_live()
+    finally:
+        stream.stop()
+        server.shutdown()
+
+
+def main():
+    print("🚀 Home Assistant WebSocket Test Suite")
+    print("=" * 60)
+    test_entity_store()
+    test_stream_against_stand_in()
+    test_auth_failure()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+
+"""Test script for KVV departure parsing and local countdown calculation"""
+
+import io
+import json
+import time
+from functools import partial
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import kvv_api
+from acquisition import AcquisitionLoop
+from sources import DataSource, SourceRegistry
+from kvv_api import (
+    parse_departures, departures_to_lines, format_departure_time,
+    iter_departure_elements, parse_departure_stream
+)
+
+with open('mockdata.json') as f:
+    mock_data = json.load(f)
+
+# mockdata.json was recorded on the evening of 2022-10-03
+MOCK_NOW = datetime(2022, 10, 3, 20, 15)
+
+
+def test_parse_departures():
+    """Test parsing the recorded departure monitor response"""
+    print("🧪 Testing departure parsing...")
+    kvv_api.switch_direction("SOUTH")
+
+    departures = parse_departures(mock_data)
+
+    print(f"Parsed {len(departures)} departures for platform 2")
+    assert departures
+    assert all(d.platform == "2" for d in departures)
+    assert all(d.real_time == d.planned_time + d.delay * 60 for d in departures)
+    assert any(not d.is_realtime for d in departures)
+
+    # Compact record: no per-instance __dict__
+    assert not hasattr(departures[0], '__dict__')
+
+    for departure in departures[:5]:
+        print(f"  {departure.line:<5} {departure.destination:<25} {departure.planned:%H:%M} -> {departure.realtime:%H:%M}")
+
+
+def test_local_countdown():
+    """Test that countdowns are recomputed from cached departures as time passes"""
+    print("\n⏱️  Testing local countdown interpolation...")
+    kvv_api.switch_direction("SOUTH")
+    departures = parse_departures(mock_data)
+    first = departures[0]
+
+    # Countdown follows the real-time departure, not the fetch time
+    assert format_departure_time(first, first.realtime - timedelta(minutes=8)) == "8 min"
+    assert format_departure_time(first, first.realtime) == "jetzt"
+    assert format_departure_time(first, first.realtime + timedelta(seconds=59)) == "jetzt"
+    assert format_departure_time(first, first.realtime + timedelta(minutes=1)) is None
+
+    # Far-away departures show the planned clock time
+    late = first.realtime - timedelta(minutes=20)
+    assert format_departure_time(first, late) == f"{first.planned.hour}:{first.planned.minute:02d}"
+
+    # Departed trains drop off the board
+    later_lines = departures_to_lines(departures, first.realtime + timedelta(minutes=1))
+    assert len(later_lines) < len(departures_to_lines(departures, MOCK_NOW))
+
+    for offset in (0, 10, 20):
+        print(f"  +{offset:2d} min: {departures_to_lines(departures, MOCK_NOW + timedelta(minutes=offset))[:3]}")
+
+    # A stop's walk time travels with its departures and still applies when they are rendered later
+    walk = parse_departures(mock_data, stop={"id": "7001105", "platform": "2", "walk_minutes": 5})
+    assert all(d.walk_minutes == 5 for d in walk)
+    soon = first.realtime - timedelta(minutes=3)
+    assert departures_to_lines(departures, soon)[0][0] == "3 min"
+    assert all(time != "3 min" for time, _, _ in departures_to_lines(walk, soon))
+
+
+def test_streaming_parse():
+    """Test that the streaming parser matches the full parse and stops early"""
+    print("\n🌊 Testing streaming departure parser...")
+    kvv_api.switch_direction("NORTH")
+
+    with open('mockdata.json', 'rb') as f:
+        raw = f.read()
+
+    # Chunk boundaries must not matter, even inside multi-byte characters
+    full = list(mock_data['departureList'])
+    for chunk_size in (1, 13, 4096):
+        assert list(iter_departure_elements(io.BytesIO(raw), chunk_size)) == full
+
+    stream = io.BytesIO(raw)
+    departures = parse_departure_stream(stream, limit=6)
+    print(f"  Read {stream.tell()} of {len(raw)} bytes for 6 departures")
+    assert departures == parse_departures(mock_data)[:6]
+    assert stream.tell() < len(raw)
+
+    assert list(iter_departure_elements(io.BytesIO(b'{"dm": {}, "departureList": []}'))) == []
+
+
+def test_request_limits():
+    """Test that the request asks EFA for a limited, filtered departure list"""
+    print("\n📦 Testing server-side request limits...")
+    url = kvv_api.get_api_request_dep("SOUTH", when=MOCK_NOW)
+    print(f"  {url}")
+
+    # Both directions share the stop, so the limit covers both platforms
+    assert f"&limit={kvv_api.DEPARTURE_LIMIT * 2}" in url
+    assert "&itdDate=20221003&itdTime=2015" in url
+    assert "excludedMeans" not in url
+
+    kvv_api.STATION_CONFIG["SOUTH"]["means"] = [1, 4]
+    try:
+        url = kvv_api.get_api_request_dep("SOUTH", limit=6, when=MOCK_NOW)
+    finally:
+        del kvv_api.STATION_CONFIG["SOUTH"]["means"]
+    assert "&limit=6" in url
+    assert "&exclMOT_0=1" in url and "&exclMOT_5=1" in url
+    assert "&exclMOT_1=1" not in url and "&exclMOT_4=1" not in url
+
+
+class DelayedMockHandler(BaseHTTPRequestHandler):
+    """Serves mockdata.json after a delay of 0.3 s per request"""
+    paths = []
+
+    def do_GET(self):
+        DelayedMockHandler.paths.append(self.path)
+        time.sleep(0.3)
+        with open('mockdata.json', 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_multi_stop_merge():
+    """Test that each distinct stop is requested once, concurrently, and the boards are merged by departure time"""
+    print("\n🔀 Testing shared stop requests and multi-stop boards...")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), DelayedMockHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    DelayedMockHandler.paths = []
+
+    original_stop_url = kvv_api.get_api_request_stop
+    kvv_api.get_api_request_stop = lambda stop, *args: f"http://127.0.0.1:{server.server_port}/?stop={stop['id']}"
+    kvv_api.STATION_CONFIG["SOUTH"]["sources"] = [
+        {"id": "7001105", "platform": "1"},
+        {"id": "7001105", "platform": "2"},
+        {"id": "7000801", "platform": None},
+    ]
+    acquisition = AcquisitionLoop()
+    try:
+        requests = kvv_api.get_stop_requests()
+        assert sorted(requests) == ["7000801", "7001105"]
+        assert [direction for direction, _ in requests["7001105"]] == ["NORTH", "SOUTH", "SOUTH"]
+
+        # The stop sources as the app registers them
+        registry = SourceRegistry(acquisition)
+        for key, boards in requests.items():
+            registry.register(DataSource(key, 'kvv', partial(kvv_api.fetch_stop_departures, boards),
+                                         ttl=lambda _: 60))
+        start = time.monotonic()
+        registry.fetch()
+        elapsed = time.monotonic() - start
+        north = registry.value("7001105")["NORTH"]
+        departures = kvv_api.merge_departures(registry.value(key)["SOUTH"] for key in requests)
+    finally:
+        acquisition.stop()
+        del kvv_api.STATION_CONFIG["SOUTH"]["sources"]
+        kvv_api.get_api_request_stop = original_stop_url
+        server.shutdown()
+
+    print(f"  {len(DelayedMockHandler.paths)} requests x 0.3 s in {elapsed:.2f}s, {len(departures)} departures merged")
+    assert len(DelayedMockHandler.paths) == 2
+    assert elapsed < 0.5
+    assert len(departures) == kvv_api.DEPARTURE_LIMIT
+    assert [d.real_time for d in departures] == sorted(d.real_time for d in departures)
+    assert {d.platform for d in departures} == {"1", "2"}
+    assert north and all(d.platform == "1" for d in north)
+
+
+def test_explicit_direction():
+    """Test that a direction passed explicitly is not affected by a button press mid-fetch"""
+    print("\n🔀 Testing explicit direction...")
+    kvv_api.switch_direction("NORTH")
+    north = parse_departures(mock_data)
+
+    kvv_api.switch_direction("SOUTH")
+    assert parse_departures(mock_data, direction="NORTH") == north
+    assert kvv_api.get_current_direction_info("NORTH")['direction'] == "NORTH"
+
+    # Building a request no longer switches the global default
+    assert kvv_api.current_direction == "SOUTH"
+    print(f"  NORTH: {len(north)} departures while the default is {kvv_api.current_direction}")
+
+
+def main():
+    print("🚀 KVV Departure Test Suite")
+    print("=" * 60)
+    test_parse_departures()
+    test_local_countdown()
+    test_streaming_parse()
+    test_request_limits()
+    test_multi_stop_merge()
+    test_explicit_direction()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
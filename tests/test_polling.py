@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+"""Test script for the adaptive KVV/Tibber poll scheduler"""
+
+from datetime import datetime, timedelta
+
+from kvv_api import Departure
+from polling import (
+    PollScheduler, TRANSIT_MIN_INTERVAL, TRANSIT_STABLE_INTERVAL,
+    TRANSIT_VOLATILE_INTERVAL, TRANSIT_NIGHT_INTERVAL, TIBBER_INTERVAL, tibber_interval
+)
+
+DAY = datetime(2025, 9, 23)
+
+
+def make_timetable(delay_minutes: int = 0):
+    """Synthetic timetable: a train every 10 minutes from 05:00 to 00:30"""
+    departures = []
+    t = DAY.replace(hour=5)
+    while t <= DAY + timedelta(days=1, minutes=30):
+        real = t + timedelta(minutes=delay_minutes)
+        departures.append(Departure("S1", "Hochstetten", "2", t.timestamp(), real.timestamp(), delay_minutes, True))
+        t += timedelta(minutes=10)
+    return departures
+
+
+def upcoming(timetable, now, count: int = 10):
+    return [d for d in timetable if d.real_time >= now.timestamp()][:count]
+
+
+def test_transit_intervals():
+    """Test the interval rules for the different situations"""
+    print("🧪 Testing transit poll intervals...")
+    now = DAY.replace(hour=12, minute=3)
+
+    # Departure within the countdown window, stable delays
+    scheduler = PollScheduler()
+    delay = scheduler.schedule_after("SOUTH", scheduler.transit_ttl("SOUTH", upcoming(make_timetable(), now), now), now)
+    print(f"  Stable, departure in window:   {delay:.0f}s")
+    assert delay == TRANSIT_STABLE_INTERVAL
+    assert not scheduler.is_due("SOUTH", now + timedelta(seconds=delay - 1))
+    assert scheduler.is_due("SOUTH", now + timedelta(seconds=delay))
+
+    # Delays jumping between polls
+    scheduler.transit_ttl("SOUTH", upcoming(make_timetable(delay_minutes=4), now), now)
+    delay = scheduler.transit_ttl("SOUTH", upcoming(make_timetable(delay_minutes=4), now), now)
+    print(f"  Volatile delays:               {delay:.0f}s")
+    assert delay == TRANSIT_VOLATILE_INTERVAL
+
+    # First departure still far away: wait until it enters the countdown window
+    now = DAY.replace(hour=4, minute=0)
+    delay = PollScheduler().transit_ttl("SOUTH", upcoming(make_timetable(), now), now)
+    print(f"  Next train at 05:00, now 04:00: {delay:.0f}s")
+    assert delay == 45 * 60
+
+    # No departures known at night
+    now = DAY.replace(hour=2)
+    delay = PollScheduler().transit_ttl("SOUTH", [], now)
+    print(f"  Night, no departures:          {delay:.0f}s")
+    assert delay == TRANSIT_NIGHT_INTERVAL
+
+
+def test_tibber_interval():
+    """Test that Tibber fetches line up with the hourly price change"""
+    print("\n🔋 Testing Tibber poll interval...")
+    assert tibber_interval(DAY.replace(hour=10, minute=10)) == TIBBER_INTERVAL
+    assert tibber_interval(DAY.replace(hour=10, minute=58)) == 125
+
+
+def test_daily_call_volume():
+    """Simulate one day on the transit screen and compare API calls with fixed 60s polling"""
+    print("\n📉 Simulating one day of transit polling...")
+    timetable = make_timetable()
+    scheduler = PollScheduler()
+
+    calls = 0
+    now = DAY
+    while now < DAY + timedelta(days=1):
+        if scheduler.is_due("SOUTH", now):
+            scheduler.schedule_after("SOUTH", scheduler.transit_ttl("SOUTH", upcoming(timetable, now), now), now)
+            calls += 1
+        now += timedelta(seconds=TRANSIT_MIN_INTERVAL)
+
+    fixed_calls = 24 * 60 * 60 // 60
+    print(f"  Fixed 60s polling: {fixed_calls} calls")
+    print(f"  Adaptive polling:  {calls} calls ({calls / fixed_calls:.0%})")
+    assert calls <= fixed_calls / 2
+
+
+def main():
+    print("🚀 Poll Scheduler Test Suite")
+    print("=" * 60)
+    test_transit_intervals()
+    test_tibber_interval()
+    test_daily_call_volume()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""Test script for the power history ring buffers and sampler"""
+
+import time
+import tracemalloc
+
+from power_sampler import PowerHistory, PowerSampler, RingBuffer, power_watts
+
+
+def test_ring_buffer():
+    """Test that the ring keeps the newest values in order"""
+    print("🧪 Testing ring buffer...")
+    ring = RingBuffer(5)
+    assert len(ring) == 0 and ring.newest() is None and list(ring.last()) == []
+    for value in range(8):
+        ring.append(value)
+    assert len(ring) == 5 and ring.newest() == 7
+    assert list(ring.last()) == [3, 4, 5, 6, 7]
+    assert list(ring.last(2)) == [6, 7]
+
+
+def test_minute_buckets():
+    """Test raw samples and 1-minute averages, including gaps"""
+    print("\n📈 Testing downsampling...")
+    history = PowerHistory(raw_capacity=100, minute_buckets=10)
+    start = 1_700_000_040.0  # Start of a minute
+
+    # Minute 0: 100 and 300 W, minute 1: nothing, minute 2: 500 W
+    history.add(100, start)
+    history.add(300, start + 30)
+    history.add(500, start + 125)
+    assert not history.add(999, start + 60)  # Out of order: dropped
+
+    averages = history.minute_averages(4, now=start + 130)
+    assert averages == [None, 200, None, 500], averages
+    assert history.recent(100, now=start + 130) == [(start + 30, 300), (start + 125, 500)]
+
+    # A long silence leaves only empty minutes, the buffer size stays fixed
+    assert history.minute_averages(10, now=start + 3600) == [None] * 10
+    assert len(history.minutes.data) == 10
+
+
+def test_memory_is_constant():
+    """Test that a day of 2-second readings does not grow the history"""
+    print("\n💾 Testing memory for a day of readings...")
+    history = PowerHistory()
+    start = 1_700_000_000.0
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    began = time.perf_counter()
+    for i in range(43200):
+        history.add(200 + i % 50, start + 2 * i)
+    elapsed = time.perf_counter() - began
+    grown = sum(stat.size_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+    tracemalloc.stop()
+
+    averages = history.minute_averages(1440, now=start + 86400)
+    assert len(averages) == 1440 and all(value is not None for value in averages[1:])
+    print(f"  43200 readings in {elapsed * 1000:.0f} ms, {grown / 1024:.1f} KB allocated, "
+          f"{len(history.minutes.data) + 2 * len(history.raw_times.data)} doubles held")
+    assert grown < 16 * 1024
+
+
+def test_sampler_polls_without_pushes():
+    """Test that pushes are recorded and polling only starts when they stop"""
+    print("\n📡 Testing sampler push/poll...")
+    assert power_watts({'state': '176.5'}) == 176.5
+    assert power_watts({'state': 'unavailable'}) is None and power_watts(None) is None
+
+    polls = []
+    history = PowerHistory()
+    sampler = PowerSampler(history, lambda: polls.append(1) or 250.0, interval=0.2)
+    sampler.on_state({'state': '180'})
+    sampler.start()
+    time.sleep(0.1)
+    assert polls == []  # A push just came in
+    time.sleep(0.35)
+    sampler.stop()
+    assert 1 <= len(polls) <= 3, polls
+    assert [watts for _, watts in history.recent()][:2] == [180.0, 250.0]
+
+
+def main():
+    print("🚀 Power Sampler Test Suite")
+    print("=" * 60)
+    test_ring_buffer()
+    test_minute_buckets()
+    test_memory_is_constant()
+    test_sampler_polls_without_pushes()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""Test script for the array-backed price series"""
+
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from price_series import PriceSeries, QUARTER_HOURLY
+from snapshot import SnapshotStore
+
+CET = timezone(timedelta(hours=2))
+
+
+def points(day: str, prices: list, minutes: int = 60) -> list:
+    start = datetime.fromisoformat(f"{day}T00:00:00+02:00")
+    return [{'total': price, 'startsAt': (start + timedelta(minutes=minutes * i)).isoformat()}
+            for i, price in enumerate(prices)]
+
+
+def test_hourly_series():
+    """Test statistics, rank and lookups of an hourly day"""
+    print("🧪 Testing hourly price series...")
+    prices = [0.30 + (i % 7) / 100 for i in range(24)]
+    series = PriceSeries.from_points(points("2025-09-23", prices))
+    midnight = datetime(2025, 9, 23, tzinfo=CET).timestamp()
+
+    assert len(series) == 24 and series.resolution == 3600 and series.start == midnight
+    assert series.min == min(prices) and series.max == max(prices)
+    assert abs(series.avg - sum(prices) / 24) < 1e-12
+    for price in prices:
+        assert series.rank(price) == sorted(prices).index(price) + 1
+
+    assert series.index_at(midnight + 10.5 * 3600) == 10
+    assert series.price_at(midnight + 10.5 * 3600) == prices[10]
+    assert series.index_at(midnight - 1) == -1 and series.index_at(series.end) == -1
+
+    evening = series.slice(midnight + 18 * 3600, midnight + 21.5 * 3600)
+    assert list(evening.prices) == prices[18:22] and evening.start == midnight + 18 * 3600
+    assert not series.slice(series.end, series.end + 3600)
+
+
+def test_quarter_hourly_series():
+    """Test that 15-minute prices keep all 96 intervals of a day"""
+    print("\n⏱️  Testing 15-minute price series...")
+    today = PriceSeries.from_points(points("2025-10-01", [0.2 + i / 1000 for i in range(96)], 15))
+    tomorrow = PriceSeries.from_points(points("2025-10-02", [0.3] * 96, 15))
+    assert today.resolution == QUARTER_HOURLY and len(today) == 96
+
+    both = today.concat(tomorrow)
+    assert len(both) == 192 and both.max == 0.3 and both.time_at(96) == tomorrow.start
+    assert both.index_at(datetime(2025, 10, 1, 10, 20, tzinfo=CET).timestamp()) == 41
+    assert today.concat(PriceSeries(0.0)) is today
+
+    try:
+        tomorrow.concat(today)
+        assert False, "non-adjoining series must not be concatenated"
+    except ValueError:
+        pass
+
+
+def test_cheapest_windows():
+    """Test the sliding-window search against a brute-force search"""
+    print("\n🔌 Testing cheapest windows...")
+    prices = [0.2 + ((i * 37) % 101) / 1000 for i in range(192)]
+    series = PriceSeries(0.0, QUARTER_HOURLY, prices)
+
+    for hours in (1, 2, 3, 4.5):
+        count = int(hours * 4)
+        for after_index in (0, 40, 150):
+            sums = [sum(prices[i:i + count]) for i in range(after_index, len(prices) - count + 1)]
+            best = after_index + sums.index(min(sums))
+            start, price = series.cheapest_window(hours * 3600, after_index * QUARTER_HOURLY + 60)
+            assert start == best * QUARTER_HOURLY and abs(price - min(sums) / count) < 1e-9
+            print(f"  {hours}h from interval {after_index}: start interval {best}, avg {price:.4f}")
+
+    # Cached per series until a new series replaces it
+    assert series.cheapest_window(7200, 600) is series.cheapest_window(7200, 0)
+    assert series.cheapest_window(49 * 3600) is None
+    assert series.cheapest_window(3600, series.end) is None
+    assert list(series.cheapest_windows([3600, 49 * 3600])) == [3600]
+
+
+def test_snapshot_roundtrip():
+    """Test that price series survive the JSON snapshot"""
+    print("\n💾 Testing price series in the snapshot...")
+    series = PriceSeries.from_points(points("2025-09-23", [0.31, 0.29, 0.35]))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'snapshot.json')
+        SnapshotStore(path).save_tibber({'price_data': {'today': series, 'tomorrow': PriceSeries(0.0)}})
+        restored = SnapshotStore(path).get_tibber()[1]['price_data']
+        assert restored['today'] == series and restored['today'].rank(0.31) == 2
+        assert not restored['tomorrow']
+
+
+def test_benchmark():
+    """Compare rank/statistics against the old list-of-dicts approach"""
+    print("\n⏱️  Benchmarking 10k rank lookups on 192 prices...")
+    prices = [0.2 + ((i * 37) % 101) / 1000 for i in range(192)]
+    series = PriceSeries(0.0, QUARTER_HOURLY, prices)
+    dicts = [{'hour': i // 4, 'price': price} for i, price in enumerate(prices)]
+
+    start = time.perf_counter()
+    for i in range(10000):
+        values = [p['price'] for p in dicts]
+        sorted(values).index(prices[i % 192])
+        min(values), max(values), sum(values) / len(values)
+    lists_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(10000):
+        series.rank(prices[i % 192])
+        series.min, series.max, series.avg
+    series_time = time.perf_counter() - start
+    print(f"  lists: {lists_time * 1000:.1f} ms, PriceSeries: {series_time * 1000:.1f} ms")
+
+
+def main():
+    print("🚀 Price Series Test Suite")
+    print("=" * 60)
+    test_hourly_series()
+    test_quarter_hourly_series()
+    test_cheapest_windows()
+    test_snapshot_roundtrip()
+    test_benchmark()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+"""Test script for the local KVV replay server"""
+
+import time
+import urllib.error
+from datetime import datetime
+
+import kvv_api
+from replay_server import ReplayConfig, ReplayServer
+from upstream import get_breaker
+
+
+def fetch_south(server: ReplayServer):
+    original_base_url = kvv_api.KVV_BASE_URL
+    kvv_api.KVV_BASE_URL = server.base_url
+    try:
+        return kvv_api.fetch_stop_departures(kvv_api.get_stop_requests()["7001105"])["SOUTH"]
+    finally:
+        kvv_api.KVV_BASE_URL = original_base_url
+
+
+def test_time_shifted_replay():
+    """Test that the recorded departures are served relative to the current time"""
+    print("🧪 Testing time-shifted replay...")
+    with ReplayServer() as server:
+        departures = fetch_south(server)
+
+    now = datetime.now().replace(second=0, microsecond=0).timestamp()
+    lines = kvv_api.departures_to_lines(departures)
+    print(f"  {len(departures)} departures, first rows: {lines[:3]}")
+    assert len(departures) == kvv_api.DEPARTURE_LIMIT
+    assert all(d.platform == "2" for d in departures)
+    assert now - 60 <= departures[0].real_time < now + 3600
+    assert lines
+
+
+def test_latency_and_errors():
+    """Test configurable latency and simulated upstream errors"""
+    print("\n⏱️  Testing latency and error injection...")
+    config = ReplayConfig(latency=0.3, jitter=0.05, seed=1)
+    with ReplayServer(config) as server:
+        start = time.monotonic()
+        fetch_south(server)
+        elapsed = time.monotonic() - start
+        print(f"  Fetch with 0.3 s +- 0.05 s latency took {elapsed:.2f}s")
+        assert 0.25 <= elapsed < 1.0
+
+        config.latency = config.jitter = 0
+        config.error_rate = 1.0
+        try:
+            fetch_south(server)
+            assert False, "expected an HTTP error"
+        except urllib.error.HTTPError as e:
+            print(f"  Simulated error: {e.code}")
+            assert e.code == 503
+        finally:
+            get_breaker('kvv').record_success()
+
+        assert server.requests == 2
+        assert server.errors == 1
+
+
+def main():
+    print("🚀 Replay Server Test Suite")
+    print("=" * 60)
+    test_time_shifted_replay()
+    test_latency_and_errors()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
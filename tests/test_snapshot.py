@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+"""Test script for the last-known-good snapshot file"""
+
+import os
+import tempfile
+
+from kvv_api import Departure
+from snapshot import SnapshotStore
+
+
+def test_snapshot_roundtrip():
+    """Test that departures and Tibber data survive a restart"""
+    print("🧪 Testing snapshot save/load...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'snapshot.json')
+        departures = [
+            Departure("S1", "Hochstetten", "2", 1758612000.0, 1758612120.0, 2, True),
+            Departure("S11", "Ittersbach", "2", 1758612600.0),
+        ]
+        tibber = {'price_data': {'current': {'price': 0.3243, 'hour': 10}}, 'current_power': '176 W'}
+
+        store = SnapshotStore(path)
+        assert store.get_transit("KVV:7001105") is None
+        store.save_transit("KVV:7001105", {"NORTH": [], "SOUTH": departures})
+        store.save_tibber(tibber)
+        print(f"  Snapshot size: {os.path.getsize(path)} bytes")
+
+        # A fresh store (as after a reboot) sees the same data
+        restored = SnapshotStore(path)
+        saved_at, boards = restored.get_transit("KVV:7001105")
+        assert boards == {"NORTH": [], "SOUTH": departures}
+        assert restored.get_tibber()[1] == tibber
+        assert restored.get_transit("KVV:7000801") is None
+
+        # No temporary files are left behind
+        assert os.listdir(tmp) == ['snapshot.json']
+
+
+def test_corrupt_snapshot():
+    """Test that an unreadable snapshot is ignored instead of crashing the app"""
+    print("\n💥 Testing corrupt snapshot...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'snapshot.json')
+        with open(path, 'w') as f:
+            f.write('{"version": 1, "transit": {"SOU')
+
+        store = SnapshotStore(path)
+        assert store.get_transit("KVV:7001105") is None
+        assert store.get_tibber() is None
+
+
+def main():
+    print("🚀 Snapshot Test Suite")
+    print("=" * 60)
+    test_snapshot_roundtrip()
+    test_corrupt_snapshot()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
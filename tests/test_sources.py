@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+"""Test script for the data-source registry and its TTL scheduling"""
+
+import time
+from threading import Event
+
+from acquisition import AcquisitionLoop
+from sources import DataSource, SourceRegistry
+from upstream import CircuitOpenError
+
+
+def counting_fetch(calls: list, name: str, value=None, delay: float = 0.0):
+    def fetch():
+        calls.append(name)
+        time.sleep(delay)
+        if isinstance(value, BaseException):
+            raise value
+        return value if value is not None else len(calls)
+    return fetch
+
+
+def test_only_due_sources_are_fetched():
+    """Test that fresh sources are skipped and due ones are fetched concurrently in the background"""
+    print("🧪 Testing TTL-driven refresh...")
+    acquisition = AcquisitionLoop()
+    try:
+        calls = []
+        registry = SourceRegistry(acquisition)
+        saved = []
+        registry.register(DataSource("FAST", 'kvv', counting_fetch(calls, "FAST", delay=0.2), ttl=lambda _: 0.3,
+                                     on_update=saved.append))
+        registry.register(DataSource("SLOW", 'rmv', counting_fetch(calls, "SLOW", delay=0.2), ttl=lambda _: 3600))
+
+        started = time.perf_counter()
+        assert sorted(registry.refresh()) == ["FAST", "SLOW"]
+        assert registry.refresh() == []      # In flight: not started twice
+        assert registry.is_waiting(["FAST"])
+        updated = set()
+        while len(updated) < 2:
+            updated |= registry.collect(timeout=1)
+        elapsed = time.perf_counter() - started
+        assert elapsed < 0.35, elapsed       # Concurrently, not one after the other
+        assert saved and registry.value("SLOW") is not None
+
+        assert registry.refresh() == []      # Both fresh
+        assert 0 < registry.seconds_until_due() <= 0.3
+        time.sleep(0.35)
+        assert registry.fetch() == {"FAST"}  # Only the expired one
+        assert calls.count("SLOW") == 1 and calls.count("FAST") == 2
+        print(f"  2 sources in {elapsed * 1000:.0f} ms, {len(calls)} fetches")
+    finally:
+        acquisition.stop()
+
+
+def test_failures_keep_the_value():
+    """Test that a failed refresh keeps the old value (stale) and retries after the retry interval"""
+    print("\n💥 Testing failed refreshes...")
+    acquisition = AcquisitionLoop()
+    try:
+        registry = SourceRegistry(acquisition)
+        source = registry.register(DataSource("NORTH", 'kvv', counting_fetch([], "NORTH", OSError("offline")),
+                                              ttl=lambda _: 60, retry_interval=30))
+        registry.load("NORTH", ["departure"], saved_at=time.time() - 120)
+        assert source.stale and registry.value("NORTH") == ["departure"]
+
+        registry.fetch()
+        assert source.stale and registry.value("NORTH") == ["departure"] and isinstance(source.error, OSError)
+        assert 29 < registry.seconds_until_due() <= 30
+
+        source.fetch = counting_fetch([], "NORTH", CircuitOpenError('kvv', 120))
+        registry.scheduler.schedule_after("NORTH", 0)
+        registry.fetch()
+        assert 119 < registry.seconds_until_due() <= 120
+
+        status = registry.status()[0]
+        assert status.fetches == 2 and status.failures == 2 and status.stale and status.age >= 120
+        assert status.mean_elapsed is not None
+    finally:
+        acquisition.stop()
+
+
+def test_pushed_values():
+    """Test that pushed values keep a source fresh and only run on_update when its TTL ran out"""
+    print("\n📡 Testing pushed values...")
+    acquisition = AcquisitionLoop()
+    try:
+        calls, saved = [], []
+        registry = SourceRegistry(acquisition)
+        registry.register(DataSource("TIBBER", 'home_assistant', counting_fetch(calls, "TIBBER"), ttl=lambda _: 300,
+                                     on_update=saved.append))
+        registry.put("TIBBER", {'current_power': "180 W"})
+        registry.put("TIBBER", {'current_power': "190 W"})
+        assert saved == [{'current_power': "180 W"}]
+        assert registry.value("TIBBER") == {'current_power': "190 W"}
+        assert registry.refresh() == [] and calls == []
+    finally:
+        acquisition.stop()
+
+
+def test_finished_fetch_wakes_the_loop():
+    """Test that a finished fetch sets the wake event, so the display loop can block instead of polling"""
+    print("\n⏰ Testing wakeup on finished fetches...")
+    acquisition = AcquisitionLoop()
+    try:
+        wake = Event()
+        registry = SourceRegistry(acquisition, wake=wake)
+        registry.register(DataSource("SOUTH", 'kvv', counting_fetch([], "SOUTH", delay=0.1), ttl=lambda _: 60))
+        registry.refresh()
+        assert registry.seconds_until_due() == float('inf')  # Only the fetch in flight to wait for
+        started = time.perf_counter()
+        assert wake.wait(2)
+        print(f"  woken {(time.perf_counter() - started) * 1000:.0f} ms after the fetch started")
+        assert registry.collect() == {"SOUTH"}
+    finally:
+        acquisition.stop()
+
+
+def main():
+    print("🚀 Data Source Test Suite")
+    print("=" * 60)
+    test_only_due_sources_are_fetched()
+    test_failures_keep_the_value()
+    test_pushed_values()
+    test_finished_fetch_wakes_the_loop()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
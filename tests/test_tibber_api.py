@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+"""Test script for the direct Tibber GraphQL source against a local stand-in server"""
+
+import json
+from functools import partial
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import home_assistant_api
+import tibber_api
+from acquisition import AcquisitionLoop
+from sources import DataSource, SourceRegistry
+from tibber_api import TibberAPIError, fetch_energy_data, graph_data_from_home, query_tibber, select_home
+from upstream import get_breaker
+
+DAY = datetime(2025, 9, 23).astimezone()  # Local midnight
+
+
+def price_points(day: datetime, base: float) -> list:
+    return [{'total': round(base + (hour % 6) / 100, 4), 'startsAt': (day + timedelta(hours=hour)).isoformat()}
+            for hour in range(24)]
+
+
+HOME = {
+    'id': 'home-1',
+    'currentSubscription': {
+        'priceInfo': {
+            'current': {'total': 0.3243, 'startsAt': (DAY + timedelta(hours=10)).isoformat(), 'level': 'CHEAP'},
+            'today': price_points(DAY, 0.30),
+            'tomorrow': price_points(DAY + timedelta(days=1), 0.25),
+        }
+    },
+    'consumption': {'nodes': [
+        {'from': (DAY - timedelta(hours=2)).isoformat(), 'consumption': 0.5, 'cost': 0.15},   # Yesterday
+        {'from': DAY.isoformat(), 'consumption': 0.2, 'cost': 0.06},
+        {'from': (DAY + timedelta(hours=1)).isoformat(), 'consumption': 0.3, 'cost': None},
+    ]},
+}
+
+
+class GraphQLHandler(BaseHTTPRequestHandler):
+    requests = []
+    response = {'data': {'viewer': {'homes': [{'id': 'home-0', 'currentSubscription': None}, HOME]}}}
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        GraphQLHandler.requests.append((self.headers['Authorization'], body['query']))
+        data = json.dumps(GraphQLHandler.response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server() -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GraphQLHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    GraphQLHandler.requests = []
+    return server
+
+
+def test_mapping():
+    """Test that a home maps into the same display data as the Home Assistant source"""
+    print("🧪 Testing GraphQL result mapping...")
+    home_assistant_api._price_series_cache.clear()
+    data = graph_data_from_home(HOME, 176.4, now=DAY + timedelta(hours=10, minutes=5))
+    print(f"  {data['current_power']}, {data['today_cost']}, {data['today_consumption']}, {data['price_level']}")
+    assert data['current_power'] == "176 W"
+    assert data['today_consumption'] == "0.50 kWh" and data['today_cost'] == "0.06 €"
+    assert data['price_level'] == 'CHEAP'
+
+    price_data = data['price_data']
+    assert price_data['current']['price'] == 0.3243 and price_data['current']['hour'] == 10
+    assert len(price_data['today']) == 24 and len(price_data['tomorrow']) == 24
+    assert price_data['stats']['min'] == 0.30 and price_data['windows']
+
+    assert graph_data_from_home(dict(HOME, consumption=None))['today_cost'] == "N/A €"
+
+
+def test_single_request():
+    """Test the whole screen's data from one request to the stand-in server"""
+    print("\n📡 Testing single GraphQL request...")
+    home_assistant_api._price_series_cache.clear()
+    server = start_server()
+    acquisition = AcquisitionLoop()
+    tibber_api.TIBBER_API_URL = f"http://127.0.0.1:{server.server_port}/v1-beta/gql"
+    tibber_api.TIBBER_API_TOKEN = "secret"
+    tibber_api.TIBBER_DIRECT = True
+    try:
+        # The energy source as the app registers it
+        registry = SourceRegistry(acquisition)
+        registry.register(DataSource("TIBBER", tibber_api.tibber_source(), partial(fetch_energy_data, 250.0),
+                                     ttl=lambda _: 300))
+        registry.fetch()
+        data = registry.value("TIBBER")
+        assert len(GraphQLHandler.requests) == 1
+        authorization, query = GraphQLHandler.requests[0]
+        assert authorization == "Bearer secret" and 'priceInfo' in query and 'consumption' in query
+        assert data['current_power'] == "250 W" and len(data['price_data']['today']) == 24
+        assert tibber_api.tibber_source() == 'tibber'
+        print(f"  1 request, {len(data['price_data']['today'])} + {len(data['price_data']['tomorrow'])} prices")
+    finally:
+        tibber_api.TIBBER_DIRECT = False
+        acquisition.stop()
+        server.shutdown()
+
+
+def test_graphql_errors():
+    """Test that GraphQL errors and missing homes raise and count against the breaker"""
+    print("\n💥 Testing GraphQL errors...")
+    server = start_server()
+    url = f"http://127.0.0.1:{server.server_port}/v1-beta/gql"
+    saved = GraphQLHandler.response
+    GraphQLHandler.response = {'errors': [{'message': "invalid token"}], 'data': None}
+    try:
+        failures = get_breaker('tibber').failures
+        try:
+            query_tibber("{ viewer { name } }", url, "wrong")
+            assert False, "GraphQL errors must raise"
+        except TibberAPIError as e:
+            assert "invalid token" in str(e)
+        assert get_breaker('tibber').failures == failures + 1
+        get_breaker('tibber').record_success()
+
+        try:
+            select_home({'viewer': {'homes': [HOME]}}, 'home-9')
+            assert False, "unknown home must raise"
+        except TibberAPIError:
+            pass
+    finally:
+        GraphQLHandler.response = saved
+        server.shutdown()
+
+
+def main():
+    print("🚀 Tibber API Test Suite")
+    print("=" * 60)
+    test_mapping()
+    test_single_request()
+    test_graphql_errors()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,9 @@
 """Test script for the new Tibber graph display"""
 
 import json
+import time
+from datetime import datetime, timedelta
+import home_assistant_api
 from home_assistant_api import get_tibber_graph_data, parse_tibber_price_data
 
 # Test data matching the example provided
@@ -45,6 +48,7 @@ def test_parse_data():
     print("🧪 Testing price data parsing...")
     print("=" * 60)
 
+    home_assistant_api._price_series_cache.clear()
     parsed = parse_tibber_price_data(test_data)
 
     print(f"Current Price: {parsed['current']['price']:.3f} EUR/kWh")
@@ -61,13 +65,12 @@ def test_parse_data():
 
     # Show price curve
     print("\nPrice Curve (visual):")
-    prices = [p['price'] for p in parsed['today']]
-    min_p = min(prices)
-    max_p = max(prices)
+    series = parsed['today']
+    min_p = series.min
+    max_p = series.max
     range_p = max_p - min_p
 
-    for hour, price_data in enumerate(parsed['today']):
-        price = price_data['price']
+    for hour, price in enumerate(series.prices):
         normalized = (price - min_p) / range_p if range_p > 0 else 0.5
         bar_length = int(normalized * 40)
         bar = "█" * bar_length
@@ -77,6 +80,56 @@ def test_parse_data():
 
     return parsed
 
+def test_price_series_cache():
+    """Test that the price series are parsed once per delivery day"""
+    print("\n💾 Testing day-keyed price series cache...")
+    home_assistant_api._price_series_cache.clear()
+    first = parse_tibber_price_data(test_data, "2025-09-23T10:00:01+00:00")
+
+    # Next hour: only the current price moves, the series are reused
+    next_hour = dict(test_data, current={"total": 0.3143, "startsAt": "2025-09-23T11:00:00.000+02:00"})
+    second = parse_tibber_price_data(next_hour, "2025-09-23T11:00:01+00:00")
+    assert second['today'] is first['today']
+    assert second['current']['price'] == 0.3143 and second['current']['hour'] == 11
+    assert second['stats']['current_rank'] != first['stats']['current_rank']
+
+    # Tomorrow's prices arrive: parsed once, today's series still reused
+    tomorrow = [dict(point, startsAt=point['startsAt'].replace("09-23", "09-24")) for point in test_data['today']]
+    third = parse_tibber_price_data(dict(next_hour, tomorrow=tomorrow), "2025-09-23T13:00:01+00:00")
+    assert third['today'] is first['today']
+    assert len(third['tomorrow']) == 24
+
+    # Cheapest 2h/3h windows from the current hour over today and tomorrow
+    hours = [hours for hours, _, _ in third['windows']]
+    assert hours == [2, 3]
+    for hours, start, price in third['windows']:
+        assert start >= third['current']['time']
+        print(f"  Cheapest {hours:g}h: {datetime.fromtimestamp(start):%a %H:%M}, avg {price:.4f} EUR/kWh")
+
+    # Corrected prices for today (same number of points): today is parsed again
+    corrected = [dict(point, total=round(point['total'] + 0.1, 4)) for point in test_data['today']]
+    fourth = parse_tibber_price_data(dict(next_hour, today=corrected, tomorrow=tomorrow), "2025-09-23T13:30:01+00:00")
+    assert fourth['today'] is not first['today'] and fourth['stats']['max'] == 0.5176
+    assert fourth['tomorrow'] is third['tomorrow']
+
+    # Same last_updated: nothing is looked at
+    start = time.perf_counter()
+    for _ in range(1000):
+        parse_tibber_price_data(dict(next_hour, tomorrow=tomorrow), "2025-09-23T13:00:01+00:00")
+    cached_time = time.perf_counter() - start
+
+    # Reference: a new delivery day on every refresh, i.e. a full parse each time
+    days = []
+    for i in range(1000):
+        day = (datetime(2020, 1, 1) + timedelta(days=i)).strftime("%Y-%m-%d")
+        days.append(dict(test_data, today=[dict(point, startsAt=day + point['startsAt'][10:])
+                                           for point in test_data['today']]))
+    start = time.perf_counter()
+    for data in days:
+        parse_tibber_price_data(data)
+    print(f"  1000 refreshes: {cached_time * 1000:.1f} ms cached vs {(time.perf_counter() - start) * 1000:.1f} ms reparsed")
+
+
 def test_display_simulation():
     """Simulate what would be shown on the display"""
     print("\n📺 Display Simulation")
@@ -131,6 +184,9 @@ def main():
     # Test data parsing
     parsed_data = test_parse_data()
 
+    # Test the price series cache
+    test_price_series_cache()
+
     # Test display simulation
     test_display_simulation()
 
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+
+"""Test script for the shared timestamp parsers"""
+
+import time
+from datetime import datetime
+
+from timeparse import efa_timestamp, iso_datetime, iso_hour, rmv_datetime
+
+
+def test_formats():
+    """Test every upstream format against the standard library"""
+    print("🧪 Testing timestamp formats...")
+    fields = {'year': '2022', 'month': '10', 'day': '3', 'weekday': '2', 'hour': '20', 'minute': '24'}
+    assert efa_timestamp(fields) == datetime(2022, 10, 3, 20, 24).timestamp()
+
+    assert rmv_datetime("2022-10-03", "20:15:00") == datetime(2022, 10, 3, 20, 15)
+    assert rmv_datetime("2022-10-03", "20:15") == datetime(2022, 10, 3, 20, 15)
+
+    for text in ("2025-09-23T10:00:00.000+02:00", "2025-09-23T08:00:00Z", "2025-09-23 23:00:00+01:00"):
+        expected = datetime.fromisoformat(text.replace('Z', '+00:00'))
+        assert iso_datetime(text) == expected
+        assert iso_hour(text) == expected.hour
+        print(f"  {text:<32} -> hour {iso_hour(text)}")
+
+
+def test_benchmark():
+    """Compare RMV parsing against dateutil (if installed)"""
+    print("\n⏱️  Benchmarking 10k RMV timestamps...")
+    stamps = [("2022-10-03", f"{hour:02d}:{minute:02d}:00") for hour in range(24) for minute in range(60)] * 7
+
+    start = time.perf_counter()
+    fast = [rmv_datetime(date, clock) for date, clock in stamps]
+    fast_time = time.perf_counter() - start
+    print(f"  timeparse: {fast_time * 1000:.1f} ms")
+
+    try:
+        from dateutil import parser
+    except ImportError:
+        print("  dateutil not installed, skipping comparison")
+        return
+
+    start = time.perf_counter()
+    reference = [parser.parse(f"{date} {clock}") for date, clock in stamps]
+    print(f"  dateutil:  {(time.perf_counter() - start) * 1000:.1f} ms")
+    assert fast == reference
+
+
+def main():
+    print("🚀 Time Parsing Test Suite")
+    print("=" * 60)
+    test_formats()
+    test_benchmark()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+
+"""Test script for capturing and replaying upstream traffic"""
+
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import kvv_api
+import traffic
+from replay_server import ReplayServer, time_shift_response
+from traffic import CaptureLog, TrafficReplay, read_log, replay_day
+
+
+def test_capture_and_replay():
+    """Test that captured responses are served back without the network"""
+    print("🧪 Testing capture and replay...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'capture.jsonl.gz')
+        original_base_url = kvv_api.KVV_BASE_URL
+
+        traffic.enable_capture(path)
+        try:
+            with ReplayServer() as server:
+                kvv_api.KVV_BASE_URL = server.base_url
+                captured = kvv_api.fetch_stop_departures(kvv_api.get_stop_requests()["7001105"])["SOUTH"]
+        finally:
+            traffic.enable_capture(None)
+
+        records = list(read_log(path))
+        print(f"  Captured {len(records)} response(s), {os.path.getsize(path)} bytes compressed, "
+              f"{records[0]['latency'] * 1000:.0f} ms")
+        assert len(records) == 1
+        assert records[0]['source'] == 'kvv' and records[0]['status'] == 200
+        # The whole body is captured although the streaming parser stopped early
+        assert len(json.loads(records[0]['body'])['departureList']) == 2 * kvv_api.DEPARTURE_LIMIT
+
+        # Server is gone: the same request is answered from the log
+        traffic.enable_replay(path, speed=0)
+        try:
+            replayed = kvv_api.fetch_stop_departures(kvv_api.get_stop_requests()["7001105"])["SOUTH"]
+        finally:
+            traffic.enable_replay(None)
+            kvv_api.KVV_BASE_URL = original_base_url
+        assert replayed == captured
+
+
+def test_truncated_log():
+    """Test that a log cut off mid-write (power loss) is read up to the last complete record"""
+    print("\n✂️  Testing truncated capture log...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'capture.jsonl.gz')
+        log = CaptureLog(path)
+        for i in range(3):
+            log.record('kvv', f"http://localhost/?n={i}", 1000.0 + i, 0.1, 200, b'{}')
+        log.close()
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        with open(path, 'wb') as f:
+            f.write(data[:-6])  # Lose the gzip trailer
+
+        assert [record['url'][-1] for record in read_log(path)] == ['0', '1', '2']
+
+
+def test_masked_credentials():
+    """Test that the RMV access id is not written to the log and replay still finds the request"""
+    print("\n🔒 Testing credential masking...")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'capture.jsonl.gz')
+        url = "https://www.rmv.de/hapi/trip?originId=1&destId=2&accessId=secret-token&format=json"
+        log = CaptureLog(path)
+        log.record('rmv', url, 1000.0, 0.1, 200, b'{"Trip": []}')
+        log.close()
+
+        with gzip.open(path, 'rb') as f:
+            assert b'secret-token' not in f.read()
+        assert "accessId=***" in next(read_log(path))['url']
+        assert TrafficReplay(path, speed=0).lookup('rmv', url)['body'] == '{"Trip": []}'
+
+
+def test_replay_day():
+    """Test a recorded hour replayed through the app's sources on a virtual clock"""
+    print("\n🔁 Testing accelerated replay...")
+    with open('mockdata.json') as f:
+        recording = f.read()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'capture.jsonl.gz')
+        log = CaptureLog(path)
+        start = datetime(2022, 10, 3, 18, 0)
+        url = kvv_api.get_api_request_stop(kvv_api.STATION_CONFIG["SOUTH"])
+        for minute in range(0, 60, 5):
+            when = start + timedelta(minutes=minute)
+            body = json.dumps(time_shift_response(json.loads(recording), when)).encode()
+            log.record('kvv', url, when.timestamp(), 0.2, 200, body)
+        log.close()
+
+        stats = replay_day(path, speed=0, directions=["SOUTH"], tibber=False)
+
+    print(f"  {stats}")
+    assert stats['misses'] == 0
+    assert stats['errors'] == 0
+    assert 1 <= stats['fetches'] < stats['minutes']
+    assert stats['empty_minutes'] == 0
+
+
+def main():
+    print("🚀 Traffic Capture Test Suite")
+    print("=" * 60)
+    test_capture_and_replay()
+    test_truncated_log()
+    test_masked_credentials()
+    test_replay_day()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
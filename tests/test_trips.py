@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""Test script for the RMV next connections screen"""
+
+import json
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import kvv_api
+import trips
+from acquisition import AcquisitionLoop
+from sources import SourceRegistry, trip_sources
+from trips import parse_trips, rank_trips, trip_ttl, trips_to_lines
+
+NOW = datetime(2022, 10, 3, 20, 15)
+
+
+def hafas_leg(line: str, start: datetime, end: datetime, kind: str = 'JNY') -> dict:
+    return {
+        'type': kind, 'direction': f"Richtung {line}",
+        'Product': {'line': line, 'name': f" {line}"},
+        'Origin': {'date': f"{start:%Y-%m-%d}", 'time': f"{start:%H:%M:%S}"},
+        'Destination': {'date': f"{end:%Y-%m-%d}", 'time': f"{end:%H:%M:%S}"},
+    }
+
+
+def hafas_response(start: datetime, line: str) -> dict:
+    """Three trips: direct, with one change (arrives first), and a later one"""
+    minute = timedelta(minutes=1)
+    return {'Trip': [
+        {'LegList': {'Leg': [hafas_leg(line, start + 5 * minute, start + 40 * minute)]}},
+        {'LegList': {'Leg': [hafas_leg(line, start + 8 * minute, start + 20 * minute),
+                             hafas_leg('', start + 20 * minute, start + 24 * minute, 'WALK'),
+                             hafas_leg('S1', start + 25 * minute, start + 35 * minute)]}},
+        {'LegList': {'Leg': [hafas_leg(line, start + 20 * minute, start + 55 * minute)]}},
+    ]}
+
+
+class TripHandler(BaseHTTPRequestHandler):
+    requests = 0
+
+    def do_GET(self):
+        TripHandler.requests += 1
+        time.sleep(0.3)
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        body = json.dumps(hafas_response(datetime.now(), f"U{query['destId'][0]}")).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_parse_and_rank():
+    """Test parsing, arrival-time ranking and local re-ranking as time passes"""
+    print("🧪 Testing trip parsing and ranking...")
+    parsed = parse_trips(hafas_response(NOW, "U4"), "Hbf")
+    assert [trip.changes for trip in parsed] == [0, 1, 0]
+    assert parsed[1].line == "U4"
+
+    now = NOW.timestamp()
+    ranked = rank_trips(parsed, now)
+    assert ranked[0] is parsed[1]  # One change, but arrives first
+
+    # 10 minutes later the two earlier connections have left
+    assert rank_trips(parsed, now + 600) == [parsed[2]]
+    for offset in (0, 6, 10):
+        print(f"  +{offset:2d} min: {trips_to_lines(parsed, NOW + timedelta(minutes=offset))}")
+
+
+def test_ttl():
+    """Test that the cache lifetime follows the first departure"""
+    print("\n⏲️  Testing trip cache lifetime...")
+    parsed = parse_trips(hafas_response(NOW, "U4"), "Hbf")
+    now = NOW.timestamp()
+    assert trip_ttl(parsed, now) == 300
+    assert trip_ttl(parsed, now + 290) == trips.TRIP_MIN_TTL
+    assert trip_ttl([], now) == trips.TRIP_MIN_TTL
+
+
+def test_concurrent_refresh():
+    """Test that destinations are queried concurrently and stay fresh afterwards"""
+    print("\n🧭 Testing concurrent trip queries...")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TripHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    original_base_url = kvv_api.RMV_BASE_URL
+    kvv_api.RMV_BASE_URL = f"http://127.0.0.1:{server.server_port}"
+    destinations = [{"id": str(i), "name": f"Ziel {i}"} for i in range(3)]
+
+    loop = AcquisitionLoop()
+    registry = SourceRegistry(loop)
+    for source in trip_sources(destinations):
+        registry.register(source)
+    try:
+        start = time.monotonic()
+        registry.fetch()
+        elapsed = time.monotonic() - start
+
+        assert not any(status.failures for status in registry.status())
+        assert TripHandler.requests == 3
+        print(f"  3 destinations x 0.3 s queried in {elapsed:.2f}s")
+        assert elapsed < 0.8
+
+        # Within the TTL nothing is queried again
+        assert registry.fetch() == set()
+        assert TripHandler.requests == 3
+        all_trips = [trip for name in registry.sources for trip in registry.value(name)]
+        assert len(all_trips) == 9
+        print(f"  {trips_to_lines(all_trips)[:3]}")
+    finally:
+        loop.stop()
+        server.shutdown()
+        kvv_api.RMV_BASE_URL = original_base_url
+
+
+def main():
+    print("🚀 Trip Planning Test Suite")
+    print("=" * 60)
+    test_parse_and_rank()
+    test_ttl()
+    test_concurrent_refresh()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
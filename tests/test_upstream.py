@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+
+"""Test script for upstream timeouts and circuit breakers"""
+
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import upstream
+from upstream import CircuitBreaker, CircuitOpenError, Timeouts, fetch_bytes, get_breaker
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Sends headers right away, then stalls the body"""
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '100')
+        self.end_headers()
+        self.wfile.write(b'x' * 10)
+        self.wfile.flush()
+        time.sleep(2)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_circuit_breaker():
+    """Test that the breaker opens, backs off and closes again"""
+    print("🧪 Testing circuit breaker...")
+    breaker = CircuitBreaker('test', failure_threshold=3, backoff_base=10, backoff_max=100)
+
+    for _ in range(2):
+        breaker.before_call(now=0)
+        breaker.record_failure(now=0)
+    assert not breaker.is_open
+
+    breaker.before_call(now=0)
+    breaker.record_failure(now=0)
+    assert breaker.is_open
+    retry_in = breaker.seconds_until_retry(now=0)
+    print(f"  Open after 3 failures, retry in {retry_in:.1f}s")
+    assert 5 <= retry_in <= 10
+
+    try:
+        breaker.before_call(now=1)
+        assert False, "call should have been rejected"
+    except CircuitOpenError as e:
+        print(f"  Rejected: {e}")
+
+    # Half-open trial fails again: the open period grows
+    breaker.before_call(now=20)
+    breaker.record_failure(now=20)
+    assert 5 <= breaker.seconds_until_retry(now=20) <= 20
+
+    breaker.before_call(now=50)
+    breaker.record_success()
+    assert not breaker.is_open
+
+
+def test_read_deadline():
+    """Test that a stalled response body fails within the configured deadline"""
+    print("\n⏱️  Testing read deadline against a stalled server...")
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowHandler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    upstream.SOURCE_TIMEOUTS['test-slow'] = Timeouts(connect=0.5, read=0.5)
+
+    try:
+        start = time.monotonic()
+        try:
+            fetch_bytes(f"http://127.0.0.1:{server.server_port}/", 'test-slow')
+            assert False, "stalled read should have timed out"
+        except (TimeoutError, OSError) as e:
+            elapsed = time.monotonic() - start
+            print(f"  Failed after {elapsed:.2f}s: {e!r}")
+            assert elapsed < 1.5
+        assert get_breaker('test-slow').failures == 1
+    finally:
+        server.shutdown()
+        del upstream.SOURCE_TIMEOUTS['test-slow']
+
+
+def main():
+    print("🚀 Upstream Resilience Test Suite")
+    print("=" * 60)
+    test_circuit_breaker()
+    test_read_deadline()
+    print("\n✅ Test suite complete!")
+
+
+if __name__ == "__main__":
+    main()
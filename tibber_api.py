@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""Direct Tibber GraphQL source for the energy screen
+
+Optional alternative to the Home Assistant sensors: with TIBBER_TOKEN set,
+current price and level, the today/tomorrow price series and today's
+consumption and cost come from one GraphQL query to the Tibber API and are
+mapped into the same display data as get_tibber_graph_data.
+
+Current power is only available from Tibber's real-time subscription, so it
+still comes from Home Assistant (if configured).
+"""
+
+import json
+import os
+import urllib.request
+from datetime import datetime
+from typing import *
+
+from home_assistant_api import build_tibber_graph_data, get_tibber_graph_data, parse_tibber_price_data
+from timeparse import iso_datetime
+from upstream import open_url
+
+TIBBER_API_URL = os.getenv("TIBBER_API_URL", "https://api.tibber.com/v1-beta/gql")
+TIBBER_API_TOKEN = os.getenv("TIBBER_TOKEN")
+TIBBER_HOME_ID = os.getenv("TIBBER_HOME_ID")  # First home with a subscription if unset
+
+# Use the Tibber API instead of the Home Assistant sensors for prices, cost and consumption
+TIBBER_DIRECT = bool(TIBBER_API_TOKEN)
+
+ENERGY_QUERY = """
+{
+  viewer {
+    homes {
+      id
+      currentSubscription {
+        priceInfo {
+          current { total startsAt level }
+          today { total startsAt }
+          tomorrow { total startsAt }
+        }
+      }
+      consumption(resolution: HOURLY, last: 24) {
+        nodes { from consumption cost }
+      }
+    }
+  }
+}
+"""
+
+
+class TibberAPIError(Exception):
+    """The Tibber API answered with GraphQL errors or without a usable home"""
+
+
+def tibber_source() -> str:
+    """Upstream source (and circuit breaker) the energy screen data comes from"""
+    return 'tibber' if TIBBER_DIRECT else 'home_assistant'
+
+
+def query_tibber(query: str, url: str = None, token: str = None) -> dict:
+    """Run a GraphQL query and return its 'data'"""
+    headers = {
+        'Authorization': f'Bearer {token or TIBBER_API_TOKEN}',
+        'Content-Type': 'application/json',
+    }
+    request = urllib.request.Request(url or TIBBER_API_URL, data=json.dumps({'query': query}).encode(),
+                                     headers=headers, method='POST')
+    with open_url(request, 'tibber') as response:
+        body = json.loads(response.read())
+        if body.get('errors'):
+            raise TibberAPIError("; ".join(error.get('message', '?') for error in body['errors']))
+    return body['data']
+
+
+def select_home(data: dict, home_id: str = None) -> dict:
+    home_id = home_id or TIBBER_HOME_ID
+    homes = data['viewer']['homes']
+    for home in homes:
+        if (home['id'] == home_id) if home_id else home.get('currentSubscription'):
+            return home
+    raise TibberAPIError(f"no Tibber home {home_id or 'with a subscription'} among {len(homes)}")
+
+
+def today_totals(nodes: List[dict], now: datetime = None) -> Tuple[Optional[float], Optional[float]]:
+    """(consumption in kWh, cost) of the completed hours since local midnight, None without any data"""
+    if not nodes:
+        return None, None
+    midnight = (now or datetime.now()).astimezone().replace(hour=0, minute=0, second=0, microsecond=0)
+    today = [node for node in nodes if node.get('from') and iso_datetime(node['from']) >= midnight]
+    consumption = sum(node.get('consumption') or 0 for node in today)
+    cost = sum(node.get('cost') or 0 for node in today)
+    return consumption, cost
+
+
+def graph_data_from_home(home: dict, current_power: Any = 'N/A', now: datetime = None) -> Dict[str, Any]:
+    """Map a home of the energy query into the display data of the Tibber graph screen; raises without prices"""
+    price_info = home['currentSubscription']['priceInfo']
+    consumption, cost = today_totals(((home.get('consumption') or {}).get('nodes') or []), now)
+    current = price_info.get('current') or {}
+    return build_tibber_graph_data(parse_tibber_price_data(price_info, strict=True), current.get('level', 'NORMAL'),
+                                   current_power,
+                                   'N/A' if cost is None else cost, 'N/A' if consumption is None else consumption)
+
+
+def get_tibber_direct_graph_data(current_power: Any = 'N/A') -> Dict[str, Any]:
+    """Energy screen data from a single Tibber API request"""
+    return graph_data_from_home(select_home(query_tibber(ENERGY_QUERY)), current_power)
+
+
+def fetch_energy_data(current_power: Any = 'N/A') -> Dict[str, Any]:
+    """Energy screen data from tibber_source() for the registry; raises on fetch or parse errors
+
+    current_power is only used with the Tibber API, Home Assistant has its own.
+    """
+    if TIBBER_DIRECT:
+        return get_tibber_direct_graph_data(current_power)
+    # Strict: a failed request, a missing entity or unparsable prices fail the fetch (the old data stays)
+    return get_tibber_graph_data(strict=True)
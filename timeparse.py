@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""Fast timestamp parsing for the upstream formats (KVV EFA, RMV, Tibber)
+
+Each format has a fast path that slices the fixed-width fields directly and
+falls back to the standard library for anything unusual. Results are
+memoized: the same departures and price points come back on every poll, so
+most lookups never parse at all.
+"""
+
+from datetime import datetime
+from functools import lru_cache
+from typing import *
+
+CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _efa_epoch(year: str, month: str, day: str, hour: str, minute: str) -> float:
+    return datetime(int(year), int(month), int(day), int(hour), int(minute)).timestamp()
+
+
+def efa_timestamp(fields: dict) -> float:
+    """EFA split date/time dict (local time, e.g. 'dateTime' of a departure) to epoch seconds"""
+    return _efa_epoch(fields['year'], fields['month'], fields['day'], fields['hour'], fields['minute'])
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def rmv_datetime(date: str, time: str) -> datetime:
+    """RMV HAFAS date ('2022-10-03') and time ('20:15:00' or '20:15') to a naive local datetime"""
+    if len(date) == 10 and date[4] == '-' and date[7] == '-' and len(time) in (5, 8) and time[2] == ':':
+        try:
+            return datetime(int(date[0:4]), int(date[5:7]), int(date[8:10]),
+                            int(time[0:2]), int(time[3:5]), int(time[6:8]) if len(time) == 8 else 0)
+        except ValueError:
+            pass
+    return datetime.fromisoformat(f"{date}T{time}")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def iso_datetime(text: str) -> datetime:
+    """ISO 8601 timestamp as sent by Tibber/Home Assistant ('2025-09-23T10:00:00.000+02:00', '...Z')"""
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    return datetime.fromisoformat(text)
+
+
+def iso_hour(text: str) -> int:
+    """Hour of an ISO 8601 timestamp in its own UTC offset (no conversion, like iso_datetime(text).hour)"""
+    if len(text) >= 13 and text[10] in 'T ' and text[4] == '-':
+        hour = text[11:13]
+        if hour.isdigit():
+            return int(hour)
+    return iso_datetime(text).hour
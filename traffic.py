@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+
+"""Record-and-replay of upstream HTTP traffic
+
+Capture mode (UPSTREAM_CAPTURE=capture.jsonl.gz) appends every upstream
+response that passes through upstream.open_url to a gzip-compressed JSON
+lines log: wall-clock timestamp, source, URL (credentials masked), status,
+latency and body.
+
+Replay answers upstream requests from such a log instead of the network.
+For each request the most recent recorded response at the current replay
+time is returned, so a day of traffic can be fed back through the app's
+data sources and their TTLs on an accelerated virtual clock. Replay is
+offline-only: the app itself ranks departures by the real clock, so it is
+not run against a replayed log.
+
+    python traffic.py stats capture.jsonl.gz
+    python traffic.py replay capture.jsonl.gz --speed 600
+"""
+
+import argparse
+import base64
+import gzip
+import io
+import json
+import os
+import urllib.error
+import urllib.parse
+import urllib.request
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime
+from email.message import Message
+from threading import Lock
+from time import sleep, time
+from typing import *
+
+# Query parameters that change with the request time and are ignored when matching requests
+VOLATILE_PARAMS = {'itdDate', 'itdTime'}
+# Query parameters with credentials: masked in the log and ignored when matching requests
+SECRET_PARAMS = {'accessId'}
+
+
+def request_url(request: Union[str, urllib.request.Request]) -> str:
+    return request.full_url if isinstance(request, urllib.request.Request) else request
+
+
+def request_key(source: str, url: str) -> str:
+    """Key that identifies the same request across captures (without host, time and credential parameters)"""
+    parts = urllib.parse.urlsplit(url)
+    query = [(name, value) for name, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+             if name not in VOLATILE_PARAMS and name not in SECRET_PARAMS]
+    return f"{source} {parts.path}?{urllib.parse.urlencode(sorted(query))}"
+
+
+def mask_url(url: str) -> str:
+    """URL with the values of credential parameters replaced, for writing to the log"""
+    parts = urllib.parse.urlsplit(url)
+    query = urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+    if not any(name in SECRET_PARAMS for name, _ in query):
+        return url
+    masked = [(name, '***' if name in SECRET_PARAMS else value) for name, value in query]
+    return urllib.parse.urlunsplit(parts._replace(query=urllib.parse.urlencode(masked, safe='[]*')))
+
+
+class CaptureLog:
+    """Append-only gzip JSON lines log of upstream responses"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = Lock()
+        self.file = gzip.open(path, 'ab')
+
+    def record(self, source: str, request, started: float, latency: float,
+               status: Optional[int], body: Optional[bytes] = None, error: BaseException = None) -> None:
+        entry = {'t': round(started, 3), 'source': source, 'url': mask_url(request_url(request)),
+                 'status': status, 'latency': round(latency, 4)}
+        if body is not None:
+            try:
+                entry['body'] = body.decode('utf-8')
+            except UnicodeDecodeError:
+                entry['body_b64'] = base64.b64encode(body).decode('ascii')
+        if error is not None:
+            entry['error'] = f"{type(error).__name__}: {error}"
+
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b'\n'
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()  # Sync flush: everything but the gzip trailer is on disk
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+def read_log(path: str) -> Iterator[dict]:
+    """Read all records of a capture log, tolerating a log cut off by a crash or power loss"""
+    with gzip.open(path, 'rb') as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return  # Partially written last line
+        except (EOFError, OSError):
+            return
+
+
+class CaptureReader:
+    """Wraps a response and keeps a copy of everything read from it"""
+
+    def __init__(self, response):
+        self.response = response
+        self.chunks = []
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.response.read(size)
+        self.chunks.append(data)
+        return data
+
+    def drain(self) -> bytes:
+        """Read what the caller left unread (e.g. after an early-stopping parser) and return the whole body"""
+        self.read()
+        return b''.join(self.chunks)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+class ReplayClock:
+    """Virtual wall clock for replays
+
+    Time moves through sleep(), which advances the virtual time by the full
+    amount but sleeps only 1/speed of it in real time.
+    """
+
+    def __init__(self, start: float, speed: float = 60.0):
+        self.current = start
+        self.speed = speed
+
+    def time(self) -> float:
+        return self.current
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self.time())
+
+    def sleep(self, seconds: float) -> None:
+        if self.speed and seconds > 0:
+            sleep(seconds / self.speed)
+        self.current += max(0.0, seconds)
+
+
+class TrafficReplay:
+    """Answers upstream requests from a capture log"""
+
+    def __init__(self, path: str, clock: ReplayClock = None, speed: float = 60.0):
+        self.records: Dict[str, List[dict]] = {}
+        for record in read_log(path):
+            self.records.setdefault(request_key(record['source'], record['url']), []).append(record)
+        for records in self.records.values():
+            records.sort(key=lambda record: record['t'])
+        self.times = {key: [record['t'] for record in records] for key, records in self.records.items()}
+
+        self.start = min((times[0] for times in self.times.values()), default=time())
+        self.end = max((times[-1] for times in self.times.values()), default=self.start)
+        self.clock = clock or ReplayClock(self.start, speed)
+        self.lock = Lock()
+        self.served = 0
+        self.misses = 0
+
+    def lookup(self, source: str, request) -> Optional[dict]:
+        """Latest record of this request at the current replay time (or the first one before it was captured)"""
+        key = request_key(source, request_url(request))
+        records = self.records.get(key)
+        if not records:
+            return None
+        index = bisect_right(self.times[key], self.clock.time())
+        return records[max(0, index - 1)]
+
+    @contextmanager
+    def open(self, request, source: str) -> Iterator[io.BytesIO]:
+        """Replay the recorded response of a request like urllib.request.urlopen would return it"""
+        url = request_url(request)
+        record = self.lookup(source, request)
+        with self.lock:
+            self.served += record is not None
+            self.misses += record is None
+        if record is None:
+            raise urllib.error.URLError(f"no recorded response for {request_key(source, url)}")
+
+        if self.clock.speed:
+            sleep(record['latency'] / self.clock.speed)
+        if 'error' in record and record.get('status') is None:
+            raise urllib.error.URLError(f"replayed: {record['error']}")
+        if record.get('status') and record['status'] >= 400:
+            raise urllib.error.HTTPError(url, record['status'], record.get('error', 'replayed error'), Message(), None)
+
+        if 'body_b64' in record:
+            body = base64.b64decode(record['body_b64'])
+        else:
+            body = record.get('body', '').encode('utf-8')
+        response = io.BytesIO(body)
+        response.status = record.get('status') or 200
+        yield response
+
+
+_capture: Optional[CaptureLog] = None
+_replay: Optional[TrafficReplay] = None
+
+
+def get_capture() -> Optional[CaptureLog]:
+    return _capture
+
+
+def get_replay() -> Optional[TrafficReplay]:
+    return _replay
+
+
+def enable_capture(path: Optional[str]) -> Optional[CaptureLog]:
+    """Start (or with None, stop) capturing upstream responses to path"""
+    global _capture
+    if _capture is not None:
+        _capture.close()
+    _capture = CaptureLog(path) if path else None
+    return _capture
+
+
+def enable_replay(path: Optional[str], clock: ReplayClock = None, speed: float = 60.0) -> Optional[TrafficReplay]:
+    """Answer upstream requests from the capture log at path (None switches back to the network)"""
+    global _replay
+    _replay = TrafficReplay(path, clock, speed) if path else None
+    return _replay
+
+
+def print_stats(path: str) -> None:
+    """Per-source request counts, errors, latency and body size of a capture log"""
+    by_source: Dict[str, List[dict]] = {}
+    for record in read_log(path):
+        by_source.setdefault(record['source'], []).append(record)
+
+    for source, records in sorted(by_source.items()):
+        latencies = sorted(record['latency'] for record in records)
+        errors = sum(1 for record in records if 'error' in record)
+        size = sum(len(record.get('body', '')) for record in records)
+        span = (records[-1]['t'] - records[0]['t']) / 3600
+        print(f"📡 {source}: {len(records)} requests over {span:.1f} h, {errors} errors, "
+              f"{size / max(1, len(records)) / 1024:.1f} KB avg")
+        print(f"   latency p50 {latencies[len(latencies) // 2] * 1000:.0f} ms, "
+              f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms")
+
+
+def replay_day(path: str, speed: float = 600.0, directions: Iterable[str] = ("NORTH", "SOUTH"),
+               tibber: bool = True) -> Dict[str, Any]:
+    """Drive the app's data sources through a capture log on an accelerated clock
+
+    The same sources, TTLs and fetches as in the app run on a SourceRegistry
+    whose clock is the replay clock. Returns counters for fetches, errors and
+    minutes the board was empty.
+    """
+    from acquisition import AcquisitionLoop
+    from kvv_api import departures_to_lines
+    from polling import PollScheduler, tibber_interval
+    from sources import DataSource, SourceRegistry, board_departures, stop_sources
+    from tibber_api import fetch_energy_data, tibber_source
+
+    replay = enable_replay(path, speed=speed)
+    clock = replay.clock
+    scheduler = PollScheduler()
+    acquisition = AcquisitionLoop()
+    registry = SourceRegistry(acquisition, scheduler, clock=clock.time)
+    transit_sources, direction_sources = stop_sources(scheduler, clock=clock.time)
+    for source in transit_sources:
+        registry.register(source)
+    if tibber:
+        registry.register(DataSource("TIBBER", tibber_source(), fetch_energy_data,
+                                     ttl=lambda _: tibber_interval(clock.now())))
+    stats = {'empty_minutes': 0, 'minutes': 0}
+
+    try:
+        while clock.time() <= replay.end:
+            registry.fetch()
+            now = clock.now()
+            for direction in directions:
+                departures = board_departures(registry, direction_sources[direction], direction)
+                if not departures_to_lines(departures or [], now):
+                    stats['empty_minutes'] += 1
+                stats['minutes'] += 1
+            clock.sleep(60 - now.second)
+    finally:
+        acquisition.stop()
+        enable_replay(None)
+
+    status = registry.status()
+    stats.update(fetches=sum(source.fetches for source in status), errors=sum(source.failures for source in status),
+                 served=replay.served, misses=replay.misses)
+    return stats
+
+
+def main():
+    # Run through the imported module, whose replay state upstream.open_url sees
+    from traffic import print_stats, replay_day
+
+    parser = argparse.ArgumentParser(description="Inspect or replay captured upstream traffic")
+    parser.add_argument('command', choices=['stats', 'replay'])
+    parser.add_argument('log', help="Capture log written with UPSTREAM_CAPTURE")
+    parser.add_argument('--speed', type=float, default=600.0, help="Replay clock speed-up (0 = no waiting)")
+    args = parser.parse_args()
+
+    if args.command == 'stats':
+        print_stats(args.log)
+    else:
+        stats = replay_day(args.log, args.speed)
+        print(f"🔁 Replayed {stats['minutes']} board minutes: {stats['fetches']} fetches, "
+              f"{stats['errors']} errors, {stats['empty_minutes']} minutes with an empty board")
+        print(f"   {stats['served']} responses served from the log, {stats['misses']} requests not recorded")
+
+
+enable_capture(os.getenv("UPSTREAM_CAPTURE"))
+
+if __name__ == "__main__":
+    main()
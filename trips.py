@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+
+"""Next connections to several destinations via the RMV HAFAS trip API
+
+Each configured destination is a data source of its own, so the trips to
+all destinations are queried concurrently on the acquisition loop. A
+destination's trips stay fresh until its earliest connection has left
+(within TRIP_MIN_TTL..TRIP_MAX_TTL), and in between they are re-ranked
+locally by arrival time as the clock moves on.
+"""
+
+import json
+from datetime import datetime
+from typing import *
+
+from kvv_api import COUNTDOWN_WINDOW_MINUTES, get_api_request_trip, API_TOKEN, ORIGIN_ID
+from timeparse import rmv_datetime
+from upstream import fetch_bytes
+
+# Destinations of the connections screen, e.g. [{"id": "3000010", "name": "Hbf"}]
+TRIP_DESTINATIONS: List[dict] = []
+
+# Cache lifetime of a destination's trips (seconds)
+TRIP_MIN_TTL = 60     # Never query a destination more often
+TRIP_MAX_TTL = 900    # Refresh at least this often for real-time updates
+
+TRIP_ROWS = 6
+
+
+def trips_available() -> bool:
+    """Connections screen needs RMV credentials and at least one destination"""
+    return API_TOKEN != "TODO" and ORIGIN_ID != "TODO" and bool(TRIP_DESTINATIONS)
+
+
+class Trip:
+    """One connection to a destination, reduced to the fields the display needs"""
+
+    __slots__ = ('destination', 'line', 'direction', 'departure_time', 'arrival_time', 'changes')
+
+    def __init__(self, destination: str, line: str, direction: str,
+                 departure_time: float, arrival_time: float, changes: int = 0):
+        self.destination = destination        # Configured destination name
+        self.line = line                      # Line of the first ride
+        self.direction = direction            # Direction of the first ride
+        self.departure_time = departure_time  # First leg, epoch seconds (real-time if known)
+        self.arrival_time = arrival_time      # Last leg, epoch seconds (real-time if known)
+        self.changes = changes
+
+    def __repr__(self):
+        return (f"Trip({self.destination!r}, {self.line!r}, "
+                f"{datetime.fromtimestamp(self.departure_time):%H:%M}-"
+                f"{datetime.fromtimestamp(self.arrival_time):%H:%M}, changes={self.changes})")
+
+
+def _stop_time(stop: dict) -> float:
+    """Real-time date/time of a leg origin or destination, planned if there is none"""
+    return rmv_datetime(stop.get('rtDate', stop['date']), stop.get('rtTime', stop['time'])).timestamp()
+
+
+def _product_line(leg: dict) -> str:
+    product = leg.get('Product', {})
+    if isinstance(product, list):
+        product = product[0] if product else {}
+    return product.get('line') or product.get('name', '').strip() or '-'
+
+
+def parse_trips(data: dict, destination: str) -> List[Trip]:
+    """Parse a HAFAS trip response into Trip records"""
+    trips = []
+    for element in data.get('Trip', []):
+        legs = element['LegList']['Leg']
+        if isinstance(legs, dict):
+            legs = [legs]
+        rides = [leg for leg in legs if leg.get('type', 'JNY') == 'JNY'] or legs
+        trips.append(Trip(destination, _product_line(rides[0]), rides[0].get('direction', ''),
+                          _stop_time(legs[0]['Origin']), _stop_time(legs[-1]['Destination']),
+                          max(0, len(rides) - 1)))
+    return trips
+
+
+def fetch_trips(destination: dict) -> List[Trip]:
+    """Query the trips from the origin to one destination"""
+    body = fetch_bytes(get_api_request_trip(destination_id=destination["id"]), 'rmv')
+    return parse_trips(json.loads(body), destination["name"])
+
+
+def trip_ttl(trips: List[Trip], now: float) -> float:
+    """Seconds the trips stay valid: until the first connection leaves"""
+    upcoming = [trip.departure_time for trip in trips if trip.departure_time >= now]
+    if not upcoming:
+        return TRIP_MIN_TTL
+    return min(TRIP_MAX_TTL, max(TRIP_MIN_TTL, min(upcoming) - now))
+
+
+def rank_trips(trips: Iterable[Trip], now: float) -> List[Trip]:
+    """Connections that have not left yet, earliest arrival first"""
+    return sorted((trip for trip in trips if trip.departure_time >= now),
+                  key=lambda trip: (trip.arrival_time, trip.departure_time))
+
+
+def format_trip_time(trip: Trip, now: float) -> str:
+    countdown = int((trip.departure_time - now) // 60)
+    if countdown <= 0:
+        return "jetzt"
+    if countdown < COUNTDOWN_WINDOW_MINUTES:
+        return f"{countdown} min"
+    departure = datetime.fromtimestamp(trip.departure_time)
+    return f"{departure.hour}:{departure.minute:02d}"
+
+
+def trips_to_lines(trips: Iterable[Trip], now: datetime = None, rows: int = TRIP_ROWS) -> List[Tuple[str, str, str]]:
+    """(departure, line, destination and arrival) display rows of the best connections"""
+    if now is None:
+        now = datetime.now()
+    now_time = now.replace(second=0, microsecond=0).timestamp()
+
+    lines = []
+    for trip in rank_trips(trips, now_time)[:rows]:
+        arrival = datetime.fromtimestamp(trip.arrival_time)
+        lines.append((format_trip_time(trip, now_time), trip.line,
+                      f"{trip.destination} an {arrival.hour}:{arrival.minute:02d}"))
+    return lines
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+
+"""Resilient HTTP access to upstream APIs (KVV EFA, RMV, Home Assistant)
+
+Every request gets a connect timeout and a total read deadline, and each
+upstream source has a circuit breaker: after a few consecutive failures the
+source is skipped (callers serve their cached data) until an exponentially
+growing, jittered backoff has passed.
+
+All responses can be captured to, or replayed from, a log (see traffic.py).
+"""
+
+import random
+import urllib.request
+from contextlib import contextmanager
+from threading import Lock
+from time import monotonic, time
+from typing import *
+
+import traffic
+from traffic import CaptureReader
+
+
+class Timeouts(NamedTuple):
+    connect: float  # Connect timeout, also the limit for each single socket read
+    read: float     # Total time allowed for reading the response body
+
+    @property
+    def worst_case(self) -> float:
+        """Longest a request can take: connect, the read deadline and one last blocking read"""
+        return self.connect + self.read + self.connect
+
+
+SOURCE_TIMEOUTS = {
+    'kvv': Timeouts(connect=5, read=10),
+    'home_assistant': Timeouts(connect=3, read=5),
+    'rmv': Timeouts(connect=5, read=10),
+    'ha_history': Timeouts(connect=5, read=120),  # Days of sensor states in one response
+    'tibber': Timeouts(connect=5, read=10),
+}
+DEFAULT_TIMEOUTS = Timeouts(connect=5, read=10)
+
+# Circuit breaker settings
+FAILURE_THRESHOLD = 3    # Consecutive failures before the breaker opens
+BACKOFF_BASE = 30        # Seconds the breaker stays open after the first trip
+BACKOFF_MAX = 900        # Upper bound for the open period
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream source whose circuit breaker is open"""
+
+    def __init__(self, source: str, retry_in: float):
+        super().__init__(f"{source} unavailable, retry in {int(retry_in)}s")
+        self.source = source
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with jittered exponential backoff"""
+
+    def __init__(self, name: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 backoff_base: float = BACKOFF_BASE, backoff_max: float = BACKOFF_MAX):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.failures = 0
+        self.retry_at = 0.0
+        self._lock = Lock()
+
+    @property
+    def is_open(self) -> bool:
+        return self.failures >= self.failure_threshold
+
+    def seconds_until_retry(self, now: float = None) -> float:
+        """Seconds until the next call is let through (0 if closed or a trial is due)"""
+        if not self.is_open:
+            return 0.0
+        now = monotonic() if now is None else now
+        return max(0.0, self.retry_at - now)
+
+    def before_call(self, now: float = None) -> None:
+        """Raise CircuitOpenError if the source must not be called right now"""
+        with self._lock:
+            retry_in = self.seconds_until_retry(now)
+            if retry_in > 0:
+                raise CircuitOpenError(self.name, retry_in)
+            if self.is_open:
+                # Half-open: let this trial call through, block others until it reports back
+                now = monotonic() if now is None else now
+                self.retry_at = now + self.backoff_base
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.is_open:
+                print(f"✅ {self.name} is reachable again")
+            self.failures = 0
+            self.retry_at = 0.0
+
+    def record_failure(self, now: float = None) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.is_open:
+                now = monotonic() if now is None else now
+                self.retry_at = now + self.backoff_delay()
+                print(f"⚠️  {self.name} circuit open after {self.failures} failures, "
+                      f"retry in {int(self.retry_at - now)}s")
+
+    def backoff_delay(self) -> float:
+        """Open period for the current failure count, randomized to spread out retries"""
+        exponent = self.failures - self.failure_threshold
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** exponent)
+        return random.uniform(self.backoff_base / 2, max(self.backoff_base / 2, ceiling))
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = Lock()
+
+
+def get_breaker(source: str) -> CircuitBreaker:
+    """Get the (shared) circuit breaker of an upstream source"""
+    with _breakers_lock:
+        if source not in _breakers:
+            _breakers[source] = CircuitBreaker(source)
+        return _breakers[source]
+
+
+class DeadlineReader:
+    """File-like wrapper that fails reads once the total read deadline has passed"""
+
+    def __init__(self, response, deadline: float, source: str):
+        self.response = response
+        self.deadline = deadline
+        self.source = source
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            chunks = []
+            while True:
+                chunk = self.read(64 * 1024)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+        if monotonic() > self.deadline:
+            raise TimeoutError(f"{self.source}: read deadline exceeded")
+        return self.response.read(size)
+
+    def __getattr__(self, name):
+        return getattr(self.response, name)
+
+
+@contextmanager
+def open_url(request: Union[str, urllib.request.Request], source: str, context=None) -> Iterator[DeadlineReader]:
+    """Open an upstream URL with the source's timeouts and circuit breaker
+
+    Any exception raised while the response is open (network error, timeout,
+    unparseable body) counts as a failure of the source.
+    """
+    breaker = get_breaker(source)
+    breaker.before_call()
+    timeouts = SOURCE_TIMEOUTS.get(source, DEFAULT_TIMEOUTS)
+    capture = traffic.get_capture()
+    replay = traffic.get_replay()
+    started_at, start = time(), monotonic()
+
+    try:
+        if replay is not None:
+            opened = replay.open(request, source)
+        else:
+            opened = urllib.request.urlopen(request, timeout=timeouts.connect, context=context)
+        with opened as response:
+            reader = DeadlineReader(response, monotonic() + timeouts.read, source)
+            if capture is None:
+                yield reader
+            else:
+                reader = CaptureReader(reader)
+                yield reader
+                body = reader.drain()
+                capture.record(source, request, started_at, monotonic() - start, response.status, body)
+    except Exception as e:
+        breaker.record_failure()
+        if capture is not None:
+            capture.record(source, request, started_at, monotonic() - start, getattr(e, 'code', None), error=e)
+        raise
+    breaker.record_success()
+
+
+def fetch_bytes(request: Union[str, urllib.request.Request], source: str, context=None) -> bytes:
+    """Fetch a complete response body from an upstream source"""
+    with open_url(request, source, context) as response:
+        return response.read()